@@ -26,6 +26,61 @@ def _get_firestore_db():
         return None
 
 
+# in 句に一度に渡す概念IDの件数（Firestore の上限）
+IN_QUERY_CHUNK = 30
+
+
+def _resolve_concept_id(concepts_ref, name: str) -> str | None:
+    """概念名を概念IDに解決（API の EndpointResolver と同じ照合順）
+
+    表示名（name）→ 英語名・日本語名の順に照合し、同じ段階で複数の概念に
+    一致する名前は解決しない。
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    from api.db.adjacency import EndpointResolver
+
+    for fields in EndpointResolver.NAME_TIERS:
+        ids = {
+            doc.id
+            for field in fields
+            for doc in concepts_ref.where(filter=FieldFilter(field, "==", name)).limit(2).stream()
+        }
+        if ids:
+            return ids.pop() if len(ids) == 1 else None
+    return None
+
+
+def _write_graph_document(db, collection: str, data: dict[str, Any]) -> None:
+    """概念・関係性を書き込み、同じバッチでグラフのバージョンを上げる
+
+    API の FirestoreClient はバージョン文書でグラフのキャッシュを無効にし、
+    スナップショット以降の差分を更新時刻で読むため、エージェントの書き込みにも
+    内容ハッシュと更新時刻を付けてバージョンを上げる。端点を概念IDに解決できない
+    関係は、API が次の近傍探索の前に移行し直せるよう移行状態のカウンタも増やす。
+    """
+    from google.cloud import firestore
+
+    from api.db.adjacency import RELATION_IDS_STATE, count_unresolved
+    from api.db.graph_snapshot import UPDATED_AT_FIELD
+    from api.db.hashing import with_content_hash
+
+    user_ref = db.collection("users").document(_current_user_id)
+    batch = db.batch()
+    batch.set(
+        user_ref.collection(collection).document(data["id"]),
+        {**with_content_hash(data), UPDATED_AT_FIELD: firestore.SERVER_TIMESTAMP},
+    )
+    batch.set(user_ref.collection("meta").document("graph"), {"version": firestore.Increment(1)}, merge=True)
+    if collection == "relations" and count_unresolved([data]):
+        batch.set(
+            user_ref.collection("meta").document(RELATION_IDS_STATE),
+            {"pending": firestore.Increment(1)},
+            merge=True,
+        )
+    batch.commit()
+
+
 def add_concept(
     name: str,
     definition: str,
@@ -65,8 +120,7 @@ def add_concept(
     db = _get_firestore_db()
     if db:
         try:
-            doc_ref = db.collection("users").document(_current_user_id).collection("concepts").document(concept_id)
-            doc_ref.set(concept_data)
+            _write_graph_document(db, "concepts", concept_data)
             return {
                 "concept_id": concept_id,
                 "name": name,
@@ -117,8 +171,11 @@ def add_relation(
     db = _get_firestore_db()
     if db:
         try:
-            doc_ref = db.collection("users").document(_current_user_id).collection("relations").document(relation_id)
-            doc_ref.set(relation_data)
+            user_ref = db.collection("users").document(_current_user_id)
+            concepts_ref = user_ref.collection("concepts")
+            relation_data["source_id"] = _resolve_concept_id(concepts_ref, source_concept)
+            relation_data["target_id"] = _resolve_concept_id(concepts_ref, target_concept)
+            _write_graph_document(db, "relations", relation_data)
             return {
                 "relation_id": relation_id,
                 "status": "saved",
@@ -204,21 +261,44 @@ def get_related_concepts(concept_id: str, depth: int = 1) -> dict[str, Any]:
         concept_data = concept_doc.to_dict()
         concept_name = concept_data.get("name", "")
 
-        # 関係性を検索
-        related_names = set()
-        for doc in relations_ref.stream():
-            rel = doc.to_dict()
-            if rel.get("source") == concept_name:
-                related_names.add(rel.get("target", ""))
-            elif rel.get("target") == concept_name:
-                related_names.add(rel.get("source", ""))
-
-        # 関連概念の詳細を取得
-        related = []
-        for doc in concepts_ref.stream():
-            data = doc.to_dict()
-            if data.get("name") in related_names:
-                related.append(data)
+        # 関係の source_id / target_id で隣接する概念を幅優先でたどる。
+        # ID を持たない既存の関係は、概念名（source / target）で照合する
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        visited = {concept_id}
+        frontier = {concept_id: concept_name}
+        related: list[dict[str, Any]] = []
+        for _ in range(depth):
+            next_ids: list[str] = []
+            ids, names = list(frontier), [name for name in frontier.values() if name]
+            for start in range(0, len(ids), IN_QUERY_CHUNK):
+                chunk = ids[start:start + IN_QUERY_CHUNK]
+                for field, other in (("source_id", "target_id"), ("target_id", "source_id")):
+                    query = relations_ref.where(filter=FieldFilter(field, "in", chunk)).select([other])
+                    for doc in query.stream():
+                        next_ids.append(doc.to_dict().get(other))
+            for start in range(0, len(names), IN_QUERY_CHUNK):
+                chunk = names[start:start + IN_QUERY_CHUNK]
+                for field, other in (("source", "target"), ("target", "source")):
+                    query = relations_ref.where(filter=FieldFilter(field, "in", chunk))
+                    for doc in query.select([f"{field}_id", other, f"{other}_id"]).stream():
+                        data = doc.to_dict()
+                        if data.get(f"{field}_id"):
+                            continue  # ID で照合済み
+                        neighbor = data.get(f"{other}_id")
+                        if not neighbor and data.get(other):
+                            neighbor = _resolve_concept_id(concepts_ref, data[other])
+                        next_ids.append(neighbor)
+
+            next_ids = [cid for cid in dict.fromkeys(next_ids) if cid and cid not in visited]
+            visited.update(next_ids)
+            # 関連概念の詳細をIDで取得（次のホップの名前による照合にも使う）
+            refs = [concepts_ref.document(cid) for cid in next_ids]
+            docs = [doc for doc in db.get_all(refs) if doc.exists] if refs else []
+            related.extend(doc.to_dict() for doc in docs)
+            frontier = {doc.id: doc.to_dict().get("name", "") for doc in docs}
+            if not frontier:
+                break
 
         return {
             "related_concepts": related,
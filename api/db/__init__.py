@@ -1,11 +1,18 @@
 """Database utilities for PaperForge"""
 
-from api.db.firestore import get_firestore_client, FirestoreClient
-from api.db.vectors import get_vector_client, VectorSearchClient
+from api.db.embedding_backends import EmbeddingBackend
+from api.db.firestore import FirestoreClient, get_firestore_client
+from api.db.store import GraphStore, get_graph_store
+from api.db.vector_index import VectorIndex
+from api.db.vectors import VectorSearchClient, get_vector_client
 
 __all__ = [
     "get_firestore_client",
     "FirestoreClient",
+    "get_graph_store",
+    "GraphStore",
     "get_vector_client",
     "VectorSearchClient",
+    "EmbeddingBackend",
+    "VectorIndex",
 ]
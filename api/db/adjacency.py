@@ -0,0 +1,234 @@
+"""概念IDによる関係の隣接リスト
+
+関係は表示用の source / target（概念名）に加えて、概念IDに解決した
+source_id / target_id を持つ。名前は複数の概念で重複しうるため、近傍の探索は
+IDだけを使う。隣接リスト（概念ID → 関係ID → 隣接する概念ID）をたどるので、
+近傍・k ホップの探索は関係の総数ではなく次数に比例する。
+"""
+
+from typing import Any, Protocol
+
+# 関係の端点を概念IDに解決したフィールド名（解決できなければ None）
+SOURCE_ID_FIELD = "source_id"
+TARGET_ID_FIELD = "target_id"
+
+# 関係の端点の移行状態を保存する meta のドキュメントID
+#   graph_version: 移行を始めたときのグラフのバージョン
+#   unresolved: 移行後も解決できなかった端点の数
+#   pending: 端点を解決できない関係を書き込むたびに書き込み側が増やすカウンタ
+#   pending_seen: 移行を始めたときの pending
+RELATION_IDS_STATE = "relation_ids"
+
+
+class EndpointResolver:
+    """関係の端点（概念ID または概念名）を概念IDに解決する
+
+    概念ID → 表示名（name）→ 英語名・日本語名の順に照合する。同じ段階で
+    複数の概念に一致する名前は、誤った概念につながないよう解決しない。
+
+    Args:
+        concepts: 概念のリスト（id と各名前のフィールドがあればよい）
+    """
+
+    NAME_TIERS = (("name",), ("name_en", "name_ja"))
+
+    def __init__(self, concepts: list[dict[str, Any]]):
+        self.ids = {c["id"] for c in concepts}
+        # 名前 → 概念ID（重複する名前は None）
+        self._tiers: list[dict[str, str | None]] = []
+        for fields in self.NAME_TIERS:
+            tier: dict[str, str | None] = {}
+            for concept in concepts:
+                for name in {concept.get(field) for field in fields} - {None, ""}:
+                    tier[name] = concept["id"] if tier.get(name, concept["id"]) == concept["id"] else None
+            self._tiers.append(tier)
+
+    def resolve(self, endpoint: str | None) -> str | None:
+        """端点を概念IDに解決（見つからない・曖昧な場合は None）"""
+        if endpoint in self.ids:
+            return endpoint
+        for tier in self._tiers:
+            if endpoint in tier:
+                return tier[endpoint]
+        return None
+
+    def is_ambiguous(self, endpoint: str | None) -> bool:
+        """端点の名前が複数の概念に一致するか"""
+        if endpoint in self.ids:
+            return False
+        for tier in self._tiers:
+            if endpoint in tier:
+                return tier[endpoint] is None
+        return False
+
+    def resolve_relation(self, relation: dict[str, Any]) -> dict[str, Any]:
+        """source_id / target_id を付けた関係（既存の概念を指すIDはそのまま使う）"""
+        ids = {}
+        for id_field, name_field in ((SOURCE_ID_FIELD, "source"), (TARGET_ID_FIELD, "target")):
+            current = relation.get(id_field)
+            ids[id_field] = current if current in self.ids else self.resolve(relation.get(name_field))
+        if all(relation.get(field) == value for field, value in ids.items()):
+            return relation
+        return {**relation, **ids}
+
+
+def count_unresolved(relations: list[dict[str, Any]]) -> int:
+    """端点のどちらかを概念IDに解決できていない関係の数"""
+    return sum(
+        1 for r in relations if r.get(SOURCE_ID_FIELD) is None or r.get(TARGET_ID_FIELD) is None
+    )
+
+
+def resolve_relations(
+    relations: list[dict[str, Any]],
+    concepts: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """関係の端点を概念IDに解決したリスト"""
+    resolver = EndpointResolver(concepts)
+    return [resolver.resolve_relation(r) for r in relations]
+
+
+def graph_concepts_after_sync(
+    existing: dict[str, dict[str, Any]],
+    incoming: list[dict[str, Any]],
+    deleted_ids: list[str],
+) -> list[dict[str, Any]]:
+    """同期後の概念（保存済み → 送られたもので上書き → 削除分を除く）
+
+    関係の端点の解決に使う。existing は名前のフィールドだけを射影したものでよい。
+    """
+    merged = {**existing, **{c["id"]: c for c in incoming}}
+    for concept_id in deleted_ids:
+        merged.pop(concept_id, None)
+    return [{"id": concept_id, **concept} for concept_id, concept in merged.items()]
+
+
+class AdjacencyList:
+    """概念ID → 関係ID → 隣接する概念ID（向きを問わない）"""
+
+    def __init__(self):
+        self._edges: dict[str, dict[str, str]] = {}
+
+    @classmethod
+    def from_relations(cls, relations: list[dict[str, Any]]) -> "AdjacencyList":
+        adjacency = cls()
+        for relation in relations:
+            adjacency.add(relation)
+        return adjacency
+
+    def add(self, relation: dict[str, Any]) -> None:
+        """関係を追加（端点のどちらかが未解決なら何もしない）"""
+        source, target = relation.get(SOURCE_ID_FIELD), relation.get(TARGET_ID_FIELD)
+        if source is None or target is None:
+            return
+        self._edges.setdefault(source, {})[relation["id"]] = target
+        self._edges.setdefault(target, {})[relation["id"]] = source
+
+    def remove(self, relation: dict[str, Any]) -> None:
+        """関係を削除"""
+        for endpoint in (relation.get(SOURCE_ID_FIELD), relation.get(TARGET_ID_FIELD)):
+            edges = self._edges.get(endpoint)
+            if edges is None:
+                continue
+            edges.pop(relation["id"], None)
+            if not edges:
+                del self._edges[endpoint]
+
+    def neighbors(self, concept_id: str) -> list[str]:
+        """隣接する概念ID（重複なし）"""
+        return list(dict.fromkeys(self._edges.get(concept_id, {}).values()))
+
+    def degree(self, concept_id: str) -> int:
+        return len(self._edges.get(concept_id, {}))
+
+
+class NeighborSource(Protocol):
+    async def get_neighbors(self, user_id: str, concept_ids: list[str]) -> dict[str, list[str]]:
+        ...
+
+
+async def k_hop(
+    store: NeighborSource,
+    user_id: str,
+    concept_id: str,
+    depth: int = 1,
+) -> dict[str, int]:
+    """concept_id から depth ホップ以内の概念を幅優先で探す
+
+    各ホップではフロンティアの概念の隣接リストだけを読む。
+
+    Returns:
+        概念ID → ホップ数（起点の概念は含まない、近い順）
+    """
+    hops = {concept_id: 0}
+    frontier = [concept_id]
+    for hop in range(1, depth + 1):
+        if not frontier:
+            break
+        neighbors = await store.get_neighbors(user_id, frontier)
+        frontier = []
+        for concept_ids in neighbors.values():
+            for neighbor in concept_ids:
+                if neighbor not in hops:
+                    hops[neighbor] = hop
+                    frontier.append(neighbor)
+    del hops[concept_id]
+    return hops
+
+
+async def migrate_relation_ids(store: Any, user_id: str) -> dict[str, int]:
+    """概念名だけを持つ既存の関係を概念IDに解決して保存し直す
+
+    Returns:
+        関係の件数、解決して書き直した件数、名前が重複して解決できなかった件数、
+        一致する概念がなく解決できなかった件数
+    """
+    # 移行中に書き込まれた概念・関係は次の探索で拾えるよう、読む前の状態を記録する
+    version = await store.get_graph_version(user_id)
+    state = await store.get_relation_ids_state(user_id) or {}
+    concepts = await store.get_all_concepts(user_id, fields=["id", "name", "name_en", "name_ja"])
+    relations = await store.get_all_relations(user_id)
+    resolver = EndpointResolver(concepts)
+
+    updated: list[dict[str, Any]] = []
+    ambiguous = unresolved = 0
+    for relation in relations:
+        resolved = resolver.resolve_relation(relation)
+        if resolved is not relation:
+            updated.append(resolved)
+        for id_field, name_field in ((SOURCE_ID_FIELD, "source"), (TARGET_ID_FIELD, "target")):
+            if resolved.get(id_field) is None:
+                if resolver.is_ambiguous(relation.get(name_field)):
+                    ambiguous += 1
+                else:
+                    unresolved += 1
+
+    if updated:
+        await store.add_relations_batch(user_id, updated)
+    await store.set_relation_ids_state(user_id, {
+        "graph_version": version,
+        "unresolved": ambiguous + unresolved,
+        "pending_seen": state.get("pending", 0),
+    })
+    print(f"Migrated {len(updated)} relations to concept ids for {user_id}")
+    return {
+        "relations": len(relations),
+        "migrated": len(updated),
+        "ambiguous_endpoints": ambiguous,
+        "unresolved_endpoints": unresolved,
+    }
+
+
+async def ensure_relation_ids(store: Any, user_id: str) -> None:
+    """IDで探索する前に、名前だけを持つ既存の関係を概念IDに解決しておく
+
+    ID を付ける前に保存された関係や、エージェントが概念より先に書いた関係は
+    隣接リストに載らず、近傍の探索から漏れる。移行状態はストアに保存し、
+    未移行のとき、端点を解決できない関係が書き込まれたとき、未解決の端点が残っていて
+    グラフが変わったときだけ移行し直す。解決済みの関係は書き直さない。
+    """
+    state = await store.get_relation_ids_state(user_id)
+    if state is not None and "graph_version" in state and state.get("pending", 0) == state["pending_seen"]:
+        if not state["unresolved"] or state["graph_version"] == await store.get_graph_version(user_id):
+            return
+    await migrate_relation_ids(store, user_id)
@@ -0,0 +1,251 @@
+"""近似最近傍（IVF-Flat）インデックス
+
+大規模なナレッジグラフ向けに、ベクトル空間を k-means で nlist 個の
+セルに分割し、クエリに近い nprobe 個のセルだけを走査する
+"""
+
+import io
+import json
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+from api.db.vector_index import VectorIndex, normalize_rows
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 4096) -> np.ndarray:
+    """各ベクトルに最も近いセントロイド番号を返す"""
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_size):
+        block = vectors[start:start + block_size]
+        assign[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    sample_size: int = 50_000,
+    seed: int = 0,
+) -> np.ndarray:
+    """正規化済みベクトルから球面 k-means でセントロイドを学習"""
+    rng = np.random.default_rng(seed)
+    if vectors.shape[0] > sample_size:
+        vectors = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+    nlist = min(nlist, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+        # 空セルは元のセントロイドを維持
+        empty = counts == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize_rows(sums)
+
+    return centroids.astype(np.float32)
+
+
+class IVFFlatIndex:
+    """IVF-Flat 近似最近傍インデックス
+
+    Args:
+        nlist: セル数（省略時は学習データ数から 4√N を目安に決定）
+        nprobe: 検索時に走査するセル数（大きいほど高再現率・高レイテンシ）
+        storage: 各セルのベクトル保存形式（float32 / float16 / int8）
+    """
+
+    def __init__(self, nlist: int | None = None, nprobe: int = 8, storage: str = "float32"):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.storage = storage
+        self.centroids: np.ndarray | None = None
+        self._lists: list[VectorIndex] = []
+        self._list_of: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._list_of)
+
+    def __contains__(self, concept_id: object) -> bool:
+        return concept_id in self._list_of
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @classmethod
+    def build(
+        cls,
+        ids: list[str],
+        vectors: np.ndarray,
+        nlist: int | None = None,
+        nprobe: int = 8,
+        storage: str = "float32",
+    ) -> "IVFFlatIndex":
+        """ベクトル群からセントロイドを学習してインデックスを構築"""
+        index = cls(nlist=nlist, nprobe=nprobe, storage=storage)
+        index.train(vectors)
+        index.add(ids, vectors)
+        return index
+
+    def train(self, vectors: np.ndarray) -> None:
+        """セントロイドを学習（登録済みのベクトルは再割り当て）"""
+        rows = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        nlist = self.nlist or max(1, int(4 * np.sqrt(rows.shape[0])))
+        self.centroids = train_centroids(rows, nlist)
+        self.nlist = self.centroids.shape[0]
+
+        existing = [(cid, lst.vector(cid)) for lst in self._lists for cid in lst.ids]
+        self._lists = [VectorIndex(rows.shape[1], storage=self.storage) for _ in range(self.nlist)]
+        self._list_of = {}
+        if existing:
+            self.add([cid for cid, _ in existing], np.stack([v for _, v in existing]))
+
+    def add(self, ids: list[str], vectors: np.ndarray | list[list[float]]) -> None:
+        """ベクトルを追加（既存IDは上書き、学習済みセルへ逐次割り当て）"""
+        if not ids:
+            return
+        if self.centroids is None:
+            raise RuntimeError("IVFFlatIndex は train() 後に追加してください")
+        self.remove([cid for cid in ids if cid in self._list_of])
+
+        rows = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        assign = _nearest_centroids(rows, self.centroids)
+        for list_no in np.unique(assign):
+            members = np.flatnonzero(assign == list_no)
+            list_ids = [ids[i] for i in members]
+            self._lists[list_no].add(list_ids, rows[members])
+            for cid in list_ids:
+                self._list_of[cid] = int(list_no)
+
+    def vector(self, concept_id: str) -> np.ndarray | None:
+        """登録済みの正規化ベクトル"""
+        list_no = self._list_of.get(concept_id)
+        return self._lists[list_no].vector(concept_id) if list_no is not None else None
+
+    def sync(self, ids: list[str], vectors: np.ndarray, tolerance: float = 1e-2) -> int:
+        """登録内容を ids / vectors に合わせる（保存済みのインデックスを読み込んだ後に使う）
+
+        なくなったIDは削除し、新規のIDと、ベクトルが tolerance より大きく変わったIDは
+        セルに割り当て直す。セントロイドは学習し直さない。
+
+        Returns:
+            削除・割り当て直した件数
+        """
+        rows = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        current = set(ids)
+        removed = self.remove([cid for cid in list(self._list_of) if cid not in current])
+
+        changed = []
+        for row, concept_id in enumerate(ids):
+            stored = self.vector(concept_id)
+            if stored is None or float(np.max(np.abs(stored - rows[row]))) > tolerance:
+                changed.append(row)
+        if changed:
+            self.add([ids[row] for row in changed], rows[changed])
+        return removed + len(changed)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """ベクトルを削除"""
+        removed = 0
+        for concept_id in ids:
+            list_no = self._list_of.pop(concept_id, None)
+            if list_no is not None:
+                removed += self._lists[list_no].remove([concept_id])
+        return removed
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        exclude: Iterable[str] = (),
+        nprobe: int | None = None,
+        rescore: Callable[[list[str]], list[np.ndarray | None]] | None = None,
+    ) -> list[tuple[str, float]]:
+        """クエリに近いセルだけを走査して類似概念を検索
+
+        Returns:
+            (概念ID, コサイン類似度) のリスト（類似度降順）
+        """
+        if self.centroids is None or not self._list_of:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+        q = q / norm
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ q
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        exclude = list(exclude)
+        results: list[tuple[str, float]] = []
+        for list_no in probe:
+            results.extend(self._lists[list_no].search(q, top_k, threshold, exclude, rescore))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    def search_batch(
+        self,
+        queries: np.ndarray | list[list[float]],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        nprobe: int | None = None,
+        rescore: Callable[[list[str]], list[np.ndarray | None]] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """複数クエリを検索（走査するセルはクエリごとに異なるため、クエリ単位で探索）"""
+        rows = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        return [self.search(q, top_k, threshold, nprobe=nprobe, rescore=rescore) for q in rows]
+
+    def to_bytes(self) -> bytes:
+        """インデックスをバイト列にシリアライズ（pickle 不使用）"""
+        if self.centroids is None:
+            raise RuntimeError("未学習のインデックスはシリアライズできません")
+        ids = [cid for lst in self._lists for cid in lst.ids]
+        sizes = np.array([len(lst) for lst in self._lists], dtype=np.int64)
+        vectors = (
+            np.concatenate([lst.matrix for lst in self._lists])
+            if ids else np.empty((0, self.centroids.shape[1]), dtype=np.float32)
+        )
+        params = json.dumps({"nprobe": self.nprobe, "storage": self.storage}).encode("utf-8")
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            params=np.frombuffer(params, dtype=np.uint8),
+            centroids=self.centroids,
+            sizes=sizes,
+            vectors=vectors,
+            ids=np.array(ids, dtype=np.str_),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IVFFlatIndex":
+        """to_bytes() の出力からインデックスを復元"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            params = json.loads(arrays["params"].tobytes().decode("utf-8"))
+            centroids = arrays["centroids"]
+            sizes = arrays["sizes"]
+            vectors = arrays["vectors"]
+            ids = arrays["ids"].tolist()
+
+        index = cls(
+            nlist=centroids.shape[0],
+            nprobe=params["nprobe"],
+            storage=params.get("storage", "float32"),
+        )
+        index.centroids = centroids
+        index._lists = [VectorIndex(centroids.shape[1], storage=index.storage) for _ in range(index.nlist)]
+        offset = 0
+        for list_no, size in enumerate(sizes):
+            list_ids = ids[offset:offset + size]
+            index._lists[list_no].add(list_ids, vectors[offset:offset + size])
+            for cid in list_ids:
+                index._list_of[cid] = list_no
+            offset += size
+        return index
@@ -0,0 +1,174 @@
+"""埋め込みの次元削減
+
+text-embedding-004 は Matryoshka 表現学習で訓練されており、先頭の次元ほど
+情報量が多い。そのため先頭 dim 次元への切り詰め（truncate）で大きな劣化なく
+次元を減らせる。ユーザーごとの分布に合わせたい場合は PCA 射影（pca）を学習する。
+次元を半分にすればインデックスのメモリと類似度計算の行列積のコストも半分になる。
+"""
+
+import io
+import json
+from typing import Any
+
+import numpy as np
+
+from api.db.vector_index import normalize_rows, top_k_indices
+
+# 対応する削減方式
+REDUCTION_METHODS = ("truncate", "pca")
+
+# PCA を学習するのに必要な最小サンプル数（これ未満の間は全次元のまま保持）
+PCA_MIN_SAMPLES = 1_000
+
+# PCA の学習に使う最大サンプル数
+PCA_MAX_SAMPLES = 50_000
+
+
+class DimensionReducer:
+    """埋め込みを dim 次元に射影する
+
+    Args:
+        method: 削減方式（truncate / pca）
+        dim: 削減後の次元数
+    """
+
+    def __init__(self, method: str, dim: int):
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"未対応の次元削減方式です: {method}")
+        if dim <= 0:
+            raise ValueError(f"次元数は正の整数で指定してください: {dim}")
+        self.method = method
+        self.dim = dim
+        self.input_dim: int | None = None
+        self.mean: np.ndarray | None = None
+        self.components: np.ndarray | None = None
+
+    @property
+    def fitted(self) -> bool:
+        """射影が使える状態か（truncate は常に使える）"""
+        return self.method == "truncate" or self.components is not None
+
+    def fit(self, vectors: np.ndarray, seed: int = 0) -> "DimensionReducer":
+        """射影を学習（truncate は入力次元の記録のみ）"""
+        rows = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        self.input_dim = rows.shape[1]
+        if self.method == "truncate":
+            return self
+
+        if rows.shape[0] < max(self.dim, 2):
+            raise ValueError(f"PCA の学習には {self.dim} 件以上のベクトルが必要です")
+        if rows.shape[0] > PCA_MAX_SAMPLES:
+            rng = np.random.default_rng(seed)
+            rows = rows[rng.choice(rows.shape[0], PCA_MAX_SAMPLES, replace=False)]
+
+        self.mean = rows.mean(axis=0)
+        # 共分散行列（D × D）の固有分解で主成分を求める
+        centered = rows - self.mean
+        covariance = centered.T @ centered / (rows.shape[0] - 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:self.dim]
+        self.components = eigenvectors[:, order].T.astype(np.float32)
+        return self
+
+    @property
+    def output_dim(self) -> int:
+        """射影後の実際の次元数（入力次元以上を指定した場合は入力次元）"""
+        return min(self.dim, self.input_dim) if self.input_dim else self.dim
+
+    def applies_to(self, vectors: np.ndarray) -> bool:
+        """入力次元のベクトルか（射影済みのベクトルには再適用しない）"""
+        if not self.fitted:
+            return False
+        input_dim = self.input_dim or vectors.shape[-1]
+        return vectors.shape[-1] == input_dim and input_dim > self.dim
+
+    def transform(self, vectors: np.ndarray | list[list[float]]) -> np.ndarray:
+        """正規化済みの削減ベクトルを返す（1次元入力も可）"""
+        array = np.asarray(vectors, dtype=np.float32)
+        rows = normalize_rows(np.atleast_2d(array))
+        if not self.fitted:
+            raise RuntimeError("PCA 射影は fit() 後に使ってください")
+        if self.input_dim is None:
+            self.input_dim = rows.shape[1]
+        if rows.shape[1] != self.input_dim:
+            raise ValueError(f"次元が一致しません: {rows.shape[1]} != {self.input_dim}")
+
+        if self.method == "truncate":
+            reduced = rows[:, :self.dim]
+        else:
+            reduced = (rows - self.mean) @ self.components.T
+        reduced = normalize_rows(reduced).astype(np.float32)
+        return reduced[0] if array.ndim == 1 else reduced
+
+    def to_bytes(self) -> bytes:
+        """射影をバイト列にシリアライズ（pickle 不使用）"""
+        params = json.dumps({
+            "method": self.method, "dim": self.dim, "input_dim": self.input_dim,
+        }).encode("utf-8")
+        arrays: dict[str, np.ndarray] = {"params": np.frombuffer(params, dtype=np.uint8)}
+        if self.components is not None:
+            arrays["mean"] = self.mean
+            arrays["components"] = self.components
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DimensionReducer":
+        """to_bytes() の出力から射影を復元"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            params = json.loads(arrays["params"].tobytes().decode("utf-8"))
+            reducer = cls(params["method"], params["dim"])
+            reducer.input_dim = params["input_dim"]
+            if "components" in arrays:
+                reducer.mean = arrays["mean"]
+                reducer.components = arrays["components"]
+        return reducer
+
+
+def evaluate_reduction_recall(
+    vectors: np.ndarray,
+    reducer: DimensionReducer,
+    top_k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """全次元の厳密検索に対して、削減後の検索がどれだけ近傍を取りこぼすかを計測
+
+    データ中のベクトルをクエリにして、自分自身を除いた recall@k を求める。
+    pca は同じデータで学習するため、未学習データでの再現率よりやや楽観的になる。
+
+    Returns:
+        次元数、recall@k、インデックスのメモリ比などの評価結果
+    """
+    full = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    n = full.shape[0]
+    if n < 2:
+        raise ValueError("評価には2件以上のベクトルが必要です")
+    if not reducer.fitted:
+        reducer.fit(full, seed=seed)
+    reduced = reducer.transform(full)
+
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(n, min(n_queries, n), replace=False)
+    k = min(top_k, n - 1)
+
+    recalls = []
+    for q in queries:
+        exact_scores = full @ full[q]
+        reduced_scores = reduced @ reduced[q]
+        exact_scores[q] = reduced_scores[q] = -np.inf
+        exact = set(top_k_indices(exact_scores, k).tolist())
+        found = set(top_k_indices(reduced_scores, k).tolist())
+        recalls.append(len(exact & found) / k)
+
+    return {
+        "method": reducer.method,
+        "input_dim": full.shape[1],
+        "dim": reducer.dim,
+        "vectors": n,
+        "queries": len(queries),
+        "top_k": k,
+        "recall": round(float(np.mean(recalls)), 4),
+        "memory_ratio": round(reducer.dim / full.shape[1], 4),
+    }
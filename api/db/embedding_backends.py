@@ -0,0 +1,157 @@
+"""埋め込みバックエンド
+
+VectorSearchClient はテキストをベクトルに変換する処理を EmbeddingBackend に委ねる。
+本番では Gemini / Vertex AI の text-embedding-004 を使い、オフラインのベンチマークや
+CI ではネットワーク不要の決定的なローカル実装（文字 n-gram のハッシュ埋め込み）を使う。
+どちらも同じインデックスに流せるが、モデルが違うベクトルは混在させない
+（永続ストアの内容ハッシュにモデル名を含めているため、切り替えると再埋め込みされる）。
+"""
+
+import os
+import zlib
+from typing import Protocol, runtime_checkable
+
+import numpy as np
+
+from api.db.lexical_index import normalize_text
+
+# Gemini の埋め込みモデル
+EMBEDDING_MODEL = "text-embedding-004"
+
+# 使用するバックエンド（gemini / local）
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+
+# ローカルバックエンドの次元数（Gemini と同じ 768 次元）
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "768"))
+
+
+@runtime_checkable
+class EmbeddingBackend(Protocol):
+    """テキストを埋め込みベクトルに変換するバックエンド
+
+    embed / aembed は入力と同じ順序のベクトルを返し、失敗時は例外を送出する
+    （再試行やバックオフは呼び出し側の VectorSearchClient が行う）。
+    """
+
+    # 内容ハッシュに含めるモデル名
+    model: str
+
+    @property
+    def available(self) -> bool:
+        """埋め込みを生成できる状態か（認証情報が未設定なら False）"""
+        ...
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """テキストのリストを埋め込む"""
+        ...
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """テキストのリストを非同期で埋め込む"""
+        ...
+
+
+class GeminiEmbeddingBackend:
+    """Gemini / Vertex AI の埋め込み API を使うバックエンド"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self._client = None
+
+    def _get_client(self):
+        """Gemini/Vertex AI クライアントを取得"""
+        if self._client is None:
+            from google import genai
+
+            api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+            if api_key:
+                self._client = genai.Client(api_key=api_key)
+            else:
+                project = os.getenv("GOOGLE_CLOUD_PROJECT")
+                if project:
+                    location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
+                    self._client = genai.Client(
+                        vertexai=True, project=project, location=location
+                    )
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return self._get_client() is not None
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        response = self._get_client().models.embed_content(
+            model=self.model,
+            contents=texts,
+        )
+        return [embedding.values for embedding in response.embeddings or []]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        response = await self._get_client().aio.models.embed_content(
+            model=self.model,
+            contents=texts,
+        )
+        return [embedding.values for embedding in response.embeddings or []]
+
+
+class LocalHashingEmbeddingBackend:
+    """文字 n-gram のハッシュ埋め込みによる CPU のみのバックエンド
+
+    NFKC 正規化したテキストの文字 n-gram を CRC32 で dim 個のバケットに符号付きで
+    振り分け（feature hashing）、対数スケールの出現回数を長い n-gram ほど重く足し込む。
+    IDF はコーパスに依存して結果が変わるため使わず、同じテキストは常に同じベクトルになる。
+    意味的な類似度の精度は Gemini に及ばないが、表記の近い概念は近いベクトルになる。
+
+    Args:
+        dim: 埋め込みの次元数
+        ngram_range: 使う n-gram の長さ（最小, 最大）
+    """
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, ngram_range: tuple[int, int] = (1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.model = f"local-char-ngram-hash-{dim}"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        """1テキストを埋め込む"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = normalize_text(text).split()
+        if not words:
+            # 前後に補う空白だけの n-gram で、空のテキスト同士が一致しないようにする
+            return vector
+        normalized = f" {' '.join(words)} "
+        counts: dict[str, int] = {}
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(normalized) - n + 1):
+                gram = normalized[i:i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+
+        hashes = np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) for gram in counts), dtype=np.uint32, count=len(counts)
+        )
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        lengths = np.fromiter(map(len, counts), dtype=np.float32, count=len(counts))
+        weights = (1.0 + np.log(tf)) * lengths
+        # 最上位ビットを符号に使い、ハッシュ衝突による偏りを打ち消す
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % self.dim).astype(np.int64), signs * weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts)
+
+
+def create_embedding_backend(name: str = EMBEDDING_BACKEND) -> EmbeddingBackend:
+    """設定名からバックエンドを生成"""
+    if name == "gemini":
+        return GeminiEmbeddingBackend()
+    if name == "local":
+        return LocalHashingEmbeddingBackend()
+    raise ValueError(f"未対応の埋め込みバックエンドです: {name}")
@@ -0,0 +1,116 @@
+"""サイズ上限付き LRU 埋め込みキャッシュ
+
+埋め込みを float32 配列で保持し、エントリ数またはバイト数の上限を
+超えたら最も古く使われたものから追い出す。TTL を指定すると、
+登録から一定時間が経ったエントリは参照時に期限切れとして破棄する
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """テキスト → 埋め込みベクトルの LRU キャッシュ
+
+    Args:
+        max_entries: 保持する最大エントリ数（None で無制限）
+        max_bytes: 保持する最大バイト数（None で無制限）
+        ttl: エントリの有効期間（秒、None で無期限）
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._expires: dict[str, float] = {}
+        self._resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    @staticmethod
+    def _entry_bytes(key: str, vector: np.ndarray) -> int:
+        return sys.getsizeof(key) + vector.nbytes
+
+    def get(self, key: str) -> np.ndarray | None:
+        """キャッシュを参照（ヒット時は最新として扱う）"""
+        vector = self._entries.get(key)
+        if vector is not None and self.ttl is not None and self._expires[key] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            vector = None
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, key: str, vector: np.ndarray | list[float]) -> np.ndarray:
+        """埋め込みを登録し、上限を超えた分を追い出す"""
+        array = np.asarray(vector, dtype=np.float32)
+        self._remove(key)
+
+        self._entries[key] = array
+        self._resident_bytes += self._entry_bytes(key, array)
+        if self.ttl is not None:
+            self._expires[key] = time.monotonic() + self.ttl
+        self._evict()
+        return array
+
+    def _remove(self, key: str) -> None:
+        """エントリを取り除く（存在しなければ何もしない）"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._resident_bytes -= self._entry_bytes(key, old)
+            self._expires.pop(key, None)
+
+    def _evict(self) -> None:
+        """上限を超えている間、最も古いエントリを追い出す"""
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._resident_bytes > self.max_bytes)
+        ):
+            key, vector = self._entries.popitem(last=False)
+            self._resident_bytes -= self._entry_bytes(key, vector)
+            self._expires.pop(key, None)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """全エントリを破棄（統計は維持）"""
+        self._entries.clear()
+        self._expires.clear()
+        self._resident_bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        """ヒット率などの統計を取得"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "resident_bytes": self._resident_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
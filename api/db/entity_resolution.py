@@ -0,0 +1,247 @@
+"""概念のエンティティ解決
+
+論文ごとに抽出された概念には、同じものを指す重複（"Transformer" が論文の数だけ
+作られるなど）が含まれる。英語名の正規化キーが一致するもの、または埋め込みの
+類似度が閾値以上で種類も同じものを同一概念とみなし、正準ノードに統合する。
+名前の一致でも種類が異なる概念は統合しない。統合された概念は別名テーブルに記録し、
+以降の論文や同期でも同じ正準ノードに寄せる。
+"""
+
+import os
+import re
+import unicodedata
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+
+from api.db.vector_index import normalize_rows, similar_pairs
+
+# 埋め込みで同一概念とみなすコサイン類似度の閾値
+ENTITY_SIMILARITY_THRESHOLD = float(os.getenv("ENTITY_SIMILARITY_THRESHOLD", "0.92"))
+
+# 統合時、正準ノードで空なら重複側の値で補うフィールド
+MERGE_FIELDS = ("name_en", "name_ja", "definition", "definition_ja", "source_paper")
+
+_PAREN_RE = re.compile(r"[(（][^)）]*[)）]")
+_SEPARATOR_RE = re.compile(r"[\W_]+")
+
+# 複数形の s で終わるとみなさない語尾（bias, analysis, corpus, chaos など）と、単複同形の語
+_SINGULAR_ENDINGS = ("ss", "is", "us", "as", "os")
+_SINGULAR_WORDS = frozenset({"series", "species", "news", "lens"})
+
+
+def normalize_concept_name(name: str) -> str:
+    """概念名を照合用に正規化
+
+    NFKC・小文字化のうえ括弧内の補足と記号を除き、英単語の規則的な複数形を単数形に戻す。
+    照合キーにだけ使い、表示名には使わない。
+    """
+    text = _PAREN_RE.sub(" ", unicodedata.normalize("NFKC", name or "").lower())
+    words = []
+    for word in _SEPARATOR_RE.split(text):
+        if not word:
+            continue
+        if word.isascii():
+            word = _singular(word)
+        words.append(word)
+    return " ".join(words)
+
+
+def _singular(word: str) -> str:
+    """英単語の規則的な複数形（-ies / -sses・-xes / -s）を単数形に戻す
+
+    cache(s) のように -es で終わる単数形があるため、-ches / -shes は s だけを落とす。
+    """
+    if len(word) <= 3 or not word.endswith("s") or word in _SINGULAR_WORDS:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes")):
+        return word[:-2]
+    if word.endswith(_SINGULAR_ENDINGS):
+        return word
+    return word[:-1]
+
+
+def concept_keys(concept: dict[str, Any]) -> set[str]:
+    """概念の照合キー（英語名と表示名の正規化形）"""
+    keys = {
+        normalize_concept_name(concept.get(field) or "")
+        for field in ("name_en", "name")
+    }
+    keys.discard("")
+    return keys
+
+
+class _UnionFind:
+    """重複候補のペアから連結成分（同一概念のクラスタ）を求める"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            # 番号の小さい側を根にして、先に現れた概念を代表にする
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def name_pairs(concepts: list[dict[str, Any]]) -> list[tuple[int, int]]:
+    """照合キーが一致し、種類が同じ概念のペア"""
+    first_by_key: dict[tuple[Any, str], int] = {}
+    pairs = []
+    for i, concept in enumerate(concepts):
+        for key in concept_keys(concept):
+            j = first_by_key.setdefault((concept.get("concept_type"), key), i)
+            if j != i:
+                pairs.append((j, i))
+    return pairs
+
+
+def embedding_pairs(
+    concepts: list[dict[str, Any]],
+    vectors: list[np.ndarray | None],
+    threshold: float = ENTITY_SIMILARITY_THRESHOLD,
+    top_k_per_concept: int = 5,
+) -> list[tuple[int, int]]:
+    """埋め込みの類似度が閾値以上で、種類が同じ概念のペア"""
+    rows = [i for i, v in enumerate(vectors) if v is not None]
+    if len(rows) < 2:
+        return []
+    matrix = normalize_rows(np.stack([vectors[i] for i in rows]).astype(np.float32))
+    return [
+        (rows[i], rows[j])
+        for i, j, _ in similar_pairs(matrix, threshold, top_k_per_row=top_k_per_concept)
+        if concepts[rows[i]].get("concept_type") == concepts[rows[j]].get("concept_type")
+    ]
+
+
+def cluster_pairs(size: int, pairs: Iterable[tuple[int, int]]) -> list[list[int]]:
+    """ペアを連結して2件以上のクラスタを返す（各クラスタは番号順）"""
+    union_find = _UnionFind(size)
+    for i, j in pairs:
+        union_find.union(i, j)
+    clusters: dict[int, list[int]] = {}
+    for i in range(size):
+        clusters.setdefault(union_find.find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def merge_concept_fields(canonical: dict[str, Any], duplicates: list[dict[str, Any]]) -> dict[str, Any]:
+    """正準ノードの空フィールドを重複側の値で補う"""
+    merged = dict(canonical)
+    for duplicate in duplicates:
+        for field in MERGE_FIELDS:
+            if not merged.get(field) and duplicate.get(field):
+                merged[field] = duplicate[field]
+    return merged
+
+
+def alias_record(duplicate: dict[str, Any], canonical: dict[str, Any]) -> dict[str, Any]:
+    """別名テーブルのレコード（重複側の概念IDをキーに保存する）"""
+    return {
+        "alias_id": duplicate.get("id"),
+        "alias_name": duplicate.get("name", ""),
+        "alias_name_en": duplicate.get("name_en", ""),
+        "keys": sorted(concept_keys(duplicate)),
+        "canonical_id": canonical["id"],
+        "canonical_name": canonical.get("name", ""),
+    }
+
+
+def rewire_relations(
+    relations: list[dict[str, Any]],
+    id_map: dict[str, str],
+    name_map: dict[str, str],
+) -> list[dict[str, Any]]:
+    """関係の端点（概念ID または概念名）を正準ノードに付け替える
+
+    source_id / target_id も正準ノードのIDに付け替える。統合で生じた自己ループと、
+    端点・種類が同じ重複した関係は除く（IDがあればIDで、なければ名前で比べる）。
+    """
+    rewired = []
+    seen: set[tuple[str, str, str]] = set()
+    for relation in relations:
+        source = id_map.get(relation["source"]) or name_map.get(relation["source"], relation["source"])
+        target = id_map.get(relation["target"]) or name_map.get(relation["target"], relation["target"])
+        source_id = relation.get("source_id")
+        target_id = relation.get("target_id")
+        source_id = id_map.get(source_id, source_id)
+        target_id = id_map.get(target_id, target_id)
+        source_key = source_id or source
+        target_key = target_id or target
+        if source_key == target_key:
+            continue
+        key = (source_key, target_key, relation.get("relation_type", ""))
+        if key in seen:
+            continue
+        seen.add(key)
+        changes = {
+            field: value
+            for field, value in (
+                ("source", source), ("target", target), ("source_id", source_id), ("target_id", target_id)
+            )
+            if relation.get(field) != value
+        }
+        rewired.append({**relation, **changes} if changes else relation)
+    return rewired
+
+
+def cluster_canonicals(
+    concepts: list[dict[str, Any]],
+    clusters: list[list[int]],
+    weights: list[float] | None = None,
+) -> dict[int, dict[str, Any]]:
+    """各クラスタの正準ノードを選び、重複側のフィールドで補う
+
+    重み（関係の次数など）が最大の概念を正準ノードにし、同点なら先に現れた概念を選ぶ。
+
+    Returns:
+        概念の番号 → 統合先の正準概念
+    """
+    canonical_for: dict[int, dict[str, Any]] = {}
+    for members in clusters:
+        head = max(members, key=lambda i: (weights[i] if weights else 0, -i))
+        merged = merge_concept_fields(concepts[head], [concepts[i] for i in members if i != head])
+        for i in members:
+            canonical_for[i] = merged
+    return canonical_for
+
+
+def apply_resolution(
+    concepts: list[dict[str, Any]],
+    canonical_for: dict[int, dict[str, Any]],
+) -> tuple[list[dict[str, Any]], dict[str, str], dict[str, str], dict[str, dict[str, Any]]]:
+    """重複と正準ノードの対応から統合後のグラフを組み立てる
+
+    Args:
+        concepts: 概念リスト
+        canonical_for: 概念の番号 → 統合先の正準概念（統合しない概念は含めない）
+
+    Returns:
+        (統合後の概念リスト, 概念IDの付け替え表, 概念名の付け替え表, 別名レコード)
+    """
+    resolved: list[dict[str, Any]] = []
+    emitted: set[str] = set()
+    id_map: dict[str, str] = {}
+    name_map: dict[str, str] = {}
+    aliases: dict[str, dict[str, Any]] = {}
+    for i, concept in enumerate(concepts):
+        canonical = canonical_for.get(i, concept)
+        if canonical["id"] not in emitted:
+            emitted.add(canonical["id"])
+            resolved.append(canonical)
+        if canonical["id"] == concept["id"]:
+            continue
+        id_map[concept["id"]] = canonical["id"]
+        if concept.get("name") and concept["name"] != canonical.get("name"):
+            name_map[concept["name"]] = canonical.get("name", "")
+        aliases[concept["id"]] = alias_record(concept, canonical)
+    return resolved, id_map, name_map, aliases
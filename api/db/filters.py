@@ -0,0 +1,223 @@
+"""ベクトル検索の属性フィルタ
+
+概念の種類（concept_type）・出典論文（source_paper）・発表年（year）ごとに、
+インデックスの行に対応する真偽値マスク（ビットマップ）を事前に作っておき、
+top-k 選択の前にスコアへ適用する。後から絞り込む方式と違い、条件に合う概念が
+top_k 件に満たないことがなく、結果は厳密なまま Python での全件走査も不要になる。
+"""
+
+from collections.abc import Iterable
+from typing import Any, Protocol
+
+import numpy as np
+
+# フィルタに使える属性
+FILTER_FIELDS = ("concept_type", "source_paper", "year")
+
+
+class RowAddressable(Protocol):
+    """行番号で概念を参照できるインデックス（VectorIndex / SegmentView）"""
+
+    version: int
+
+    @property
+    def row_count(self) -> int: ...
+
+    def row_positions(self, ids: Iterable[str]) -> np.ndarray: ...
+
+
+class FilterIndex:
+    """ユーザーごとの 属性 → 値 → 概念IDの集合（書き込みのたびに差分で更新）
+
+    concept_type は概念が変わるたびにその概念の所属だけを付け替える。論文への所属と
+    発表年は、概念の source_paper と保存済み論文の conceptIds の両方から求める
+    （統合された正準ノードは複数の論文に属する）ため、どちらかが変わったときだけ
+    次の読み出しで組み直す。属性ごとの versions は所属が変わるたびに増え、
+    FilterBitmaps はこれでマスクを作り直すかを判定する（中身をハッシュしない）。
+    """
+
+    def __init__(self):
+        self.versions = dict.fromkeys(FILTER_FIELDS, 0)
+        # 保存済み論文を最後に読み込んだ時刻（未読み込みなら None）
+        self.papers_loaded_at: float | None = None
+        self._types: dict[str, str] = {}
+        self._sources: dict[str, str] = {}
+        # 論文ID → (発表年, 所属する概念ID)
+        self._papers: dict[str, tuple[str, frozenset[str]]] = {}
+        self._memberships: dict[str, dict[str, set[str]]] = {field: {} for field in FILTER_FIELDS}
+        self._papers_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def update_concepts(self, concepts: list[dict[str, Any]], removed_ids: Iterable[str] = ()) -> None:
+        """追加・変更された概念と削除された概念IDを反映"""
+        types = self._memberships["concept_type"]
+        for concept in concepts:
+            concept_id = concept["id"]
+            concept_type = concept.get("concept_type") or "concept"
+            previous = self._types.get(concept_id)
+            if previous != concept_type:
+                if previous is not None:
+                    self._discard(types, previous, concept_id)
+                types.setdefault(concept_type, set()).add(concept_id)
+                self._types[concept_id] = concept_type
+                self.versions["concept_type"] += 1
+            source = concept.get("source_paper") or None
+            if self._sources.get(concept_id) != source:
+                if source is None:
+                    del self._sources[concept_id]
+                else:
+                    self._sources[concept_id] = source
+                self._mark_papers_dirty()
+
+        for concept_id in removed_ids:
+            previous = self._types.pop(concept_id, None)
+            if previous is not None:
+                self._discard(types, previous, concept_id)
+                self.versions["concept_type"] += 1
+            if self._sources.pop(concept_id, None) is not None:
+                self._mark_papers_dirty()
+
+    def sync_concepts(self, concepts: list[dict[str, Any]]) -> None:
+        """概念リスト全体と同期（変わった概念だけを付け替え、なくなった概念を削除）"""
+        self.update_concepts(concepts)
+        if len(self._types) > len(concepts):
+            current_ids = {c["id"] for c in concepts}
+            self.update_concepts([], [cid for cid in self._types if cid not in current_ids])
+
+    def set_papers(self, papers: list[dict[str, Any]], loaded_at: float | None = None) -> None:
+        """保存済み論文を全件で置き換える"""
+        self._papers = {}
+        self.update_papers(papers)
+        self.papers_loaded_at = loaded_at
+        self._mark_papers_dirty()
+
+    def update_papers(self, papers: list[dict[str, Any]], removed_ids: Iterable[str] = ()) -> None:
+        """追加・変更された論文と削除された論文IDを反映"""
+        for paper in papers:
+            entry = (
+                str((paper.get("summary") or {}).get("year") or ""),
+                frozenset(paper.get("conceptIds", [])),
+            )
+            if self._papers.get(paper["id"]) != entry:
+                self._papers[paper["id"]] = entry
+                self._mark_papers_dirty()
+        for paper_id in removed_ids:
+            if self._papers.pop(paper_id, None) is not None:
+                self._mark_papers_dirty()
+
+    def memberships(self) -> dict[str, dict[str, set[str]]]:
+        """属性 → 値 → 概念IDの集合（論文への所属が変わっていればここで組み直す）"""
+        if self._papers_dirty:
+            papers_of: dict[str, set[str]] = {}
+            for concept_id, paper_id in self._sources.items():
+                papers_of.setdefault(concept_id, set()).add(paper_id)
+            for paper_id, (_, concept_ids) in self._papers.items():
+                for concept_id in concept_ids:
+                    papers_of.setdefault(concept_id, set()).add(paper_id)
+
+            by_paper: dict[str, set[str]] = {}
+            by_year: dict[str, set[str]] = {}
+            for concept_id, paper_ids in papers_of.items():
+                for paper_id in paper_ids:
+                    by_paper.setdefault(paper_id, set()).add(concept_id)
+                    year = self._papers[paper_id][0] if paper_id in self._papers else ""
+                    if year:
+                        by_year.setdefault(year, set()).add(concept_id)
+            self._memberships["source_paper"] = by_paper
+            self._memberships["year"] = by_year
+            self._papers_dirty = False
+        return self._memberships
+
+    def _mark_papers_dirty(self) -> None:
+        self._papers_dirty = True
+        self.versions["source_paper"] += 1
+        self.versions["year"] += 1
+
+    @staticmethod
+    def _discard(membership: dict[str, set[str]], value: str, concept_id: str) -> None:
+        ids = membership.get(value)
+        if ids is None:
+            return
+        ids.discard(concept_id)
+        if not ids:
+            del membership[value]
+
+
+def matching_ids(
+    memberships: dict[str, dict[str, set[str]]],
+    selected: dict[str, list[str]],
+) -> set[str] | None:
+    """選択された条件に合う概念IDの集合（字句検索など行番号を持たない検索用）
+
+    Returns:
+        概念IDの集合（条件がなければ None）
+    """
+    matched: set[str] | None = None
+    for field, values in selected.items():
+        if not values:
+            continue
+        field_ids = {
+            cid
+            for value in values
+            for cid in memberships.get(field, {}).get(value, [])
+        }
+        matched = field_ids if matched is None else matched & field_ids
+    return matched
+
+
+class FilterBitmaps:
+    """インデックスの行 × 属性値の真偽値マスク
+
+    属性ごとに、所属のバージョン（FilterIndex.versions）が同じでインデックスの行も
+    動いていなければ前回のマスクを再利用する。
+
+    Args:
+        index: マスクを作る対象のインデックス
+    """
+
+    def __init__(self, index: RowAddressable):
+        self.index = index
+        self.version = index.version
+        self._masks: dict[str, tuple[int, dict[str, np.ndarray]]] = {}
+
+    def is_current(self, index: RowAddressable) -> bool:
+        """インデックスの行配置が変わっていないか"""
+        return index is self.index and index.version == self.version
+
+    def field_masks(self, field: str, membership: dict[str, set[str]], version: int) -> dict[str, np.ndarray]:
+        """属性値ごとのマスク（所属のバージョンが変わっていればその属性だけ作り直す）"""
+        cached = self._masks.get(field)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        masks = {}
+        for value, ids in membership.items():
+            mask = np.zeros(self.index.row_count, dtype=bool)
+            mask[self.index.row_positions(ids)] = True
+            masks[value] = mask
+        self._masks[field] = (version, masks)
+        return masks
+
+    def mask(self, filter_index: FilterIndex, selected: dict[str, list[str]]) -> np.ndarray | None:
+        """選択された条件のマスク（属性内は OR、属性間は AND）
+
+        Args:
+            filter_index: 概念の所属表
+            selected: 属性 → 選択された値のリスト（空の属性は条件なし）
+
+        Returns:
+            行ごとの真偽値マスク（条件がなければ None）
+        """
+        combined: np.ndarray | None = None
+        for field, values in selected.items():
+            if not values:
+                continue
+            masks = self.field_masks(field, filter_index.memberships()[field], filter_index.versions[field])
+            field_mask = np.zeros(self.index.row_count, dtype=bool)
+            for value in values:
+                if value in masks:
+                    field_mask |= masks[value]
+            combined = field_mask if combined is None else combined & field_mask
+        return combined
@@ -1,13 +1,83 @@
-"""Firestore クライアントユーティリティ"""
+"""Firestore クライアントユーティリティ
 
+非同期クライアント（AsyncClient）を使い、読み書き中もイベントループを止めない。
+"""
+
+import asyncio
 import os
+import random
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
 from typing import Any
+
 from google.cloud import firestore
-from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from api.db.adjacency import (
+    RELATION_IDS_STATE,
+    SOURCE_ID_FIELD,
+    TARGET_ID_FIELD,
+    count_unresolved,
+    graph_concepts_after_sync,
+    resolve_relations,
+)
+from api.db.graph_cache import GraphCache
+from api.db.graph_snapshot import (
+    UPDATED_AT_FIELD,
+    apply_delta,
+    decode_snapshot,
+    encode_snapshot,
+    strip_internal_fields,
+)
+from api.db.hashing import (
+    CONCEPT_CONTENT_FIELDS,
+    CONTENT_HASH_FIELD,
+    plan_sync,
+    summarize_sync,
+    with_content_hash,
+)
+from api.db.pagination import decode_page_token, encode_page_token
+
+# 1つの WriteBatch に入れられる操作数の上限
+FIRESTORE_BATCH_SIZE = 500
+
+# 一括書き込みで同時にコミットするバッチ数と、失敗したドキュメントの再試行設定
+FIRESTORE_WRITE_CONCURRENCY = int(os.getenv("FIRESTORE_WRITE_CONCURRENCY", "8"))
+FIRESTORE_WRITE_MAX_RETRIES = 4
+FIRESTORE_BACKOFF_BASE = 0.5
+FIRESTORE_BACKOFF_MAX = 8.0
+
+# 一括削除で1回に読むドキュメント参照の件数
+FIRESTORE_DELETE_PAGE_SIZE = int(os.getenv("FIRESTORE_DELETE_PAGE_SIZE", "2000"))
+
+# グラフのキャッシュに使うメモリの上限（MB、全ユーザー合計）
+GRAPH_CACHE_MAX_MB = int(os.getenv("GRAPH_CACHE_MAX_MB", "128"))
+
+# 書き込むとグラフのバージョンが上がるサブコレクション
+GRAPH_COLLECTIONS = ("concepts", "relations")
+
+# 隣接する概念を引くクエリの in 句に一度に渡す概念IDの件数（Firestore の上限）
+NEIGHBOR_QUERY_CHUNK = 30
+
+# グラフのスナップショットのチャンクと、削除の墓標を置くサブコレクション
+SNAPSHOT_CHUNK_COLLECTION = "graph_snapshot_chunks"
+TOMBSTONE_COLLECTION = "graph_tombstones"
+
+# 全件読み込みでこの件数以上の概念・関係性があれば、スナップショットを作成する
+GRAPH_SNAPSHOT_MIN_DOCUMENTS = int(os.getenv("GRAPH_SNAPSHOT_MIN_DOCUMENTS", "1000"))
+# スナップショット以降の変更がこの件数以上たまったら、バックグラウンドで作り直す
+GRAPH_SNAPSHOT_REBUILD_CHANGES = int(os.getenv("GRAPH_SNAPSHOT_REBUILD_CHANGES", "500"))
+# サーバーとの時計のずれを見込んで、スナップショットの基準時刻を早める幅
+GRAPH_SNAPSHOT_CLOCK_SKEW = timedelta(minutes=5)
 
 
 class FirestoreClient:
-    """Firestore操作をラップするクライアント"""
+    """Firestore操作をラップするクライアント（GraphStore の実装）"""
+
+    name = "firestore"
+    durable = True
 
     def __init__(self, project_id: str | None = None):
         """
@@ -17,180 +87,716 @@ class FirestoreClient:
             project_id: Google Cloud Project ID（省略時は環境変数から取得）
         """
         self.project_id = project_id or os.getenv("GOOGLE_CLOUD_PROJECT")
-        self._client: firestore.Client | None = None
+        self._client: firestore.AsyncClient | None = None
+        # 一括書き込みの同時コミット数を制限
+        self._write_semaphore = asyncio.Semaphore(FIRESTORE_WRITE_CONCURRENCY)
+        # ユーザーごとのグラフのキャッシュ（バージョン文書で無効化）
+        self._graph_cache = GraphCache(max_bytes=GRAPH_CACHE_MAX_MB * 1024 * 1024)
+        # 実行中のスナップショット作成タスク（ユーザーIDごとに1つ）
+        self._snapshot_tasks: dict[str, asyncio.Task] = {}
+        self._snapshot_stats = {"snapshot_loads": 0, "full_loads": 0, "delta_documents": 0, "rebuilds": 0}
 
     @property
-    def client(self) -> firestore.Client:
-        """Firestoreクライアントを取得（遅延初期化）"""
+    def client(self) -> firestore.AsyncClient:
+        """Firestore非同期クライアントを取得（遅延初期化）"""
         if self._client is None:
             if self.project_id:
-                self._client = firestore.Client(project=self.project_id)
+                self._client = firestore.AsyncClient(project=self.project_id)
             else:
                 # ローカル開発用: エミュレータまたはデフォルト認証を使用
-                self._client = firestore.Client()
+                self._client = firestore.AsyncClient()
         return self._client
 
-    def collection(self, name: str) -> firestore.CollectionReference:
+    def collection(self, name: str) -> firestore.AsyncCollectionReference:
         """コレクション参照を取得"""
         return self.client.collection(name)
 
+    def user_collection(self, user_id: str, name: str) -> firestore.AsyncCollectionReference:
+        """ユーザー配下のサブコレクション参照を取得"""
+        return self.collection("users").document(user_id).collection(name)
+
+    async def _stream_dicts(
+        self,
+        user_id: str,
+        name: str,
+        fields: list[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        """サブコレクションの全ドキュメントを dict のリストで取得（fields 指定時は射影）"""
+        query = self.user_collection(user_id, name)
+        if fields:
+            query = query.select(fields)
+        return [strip_internal_fields(doc.to_dict()) async for doc in query.stream()]
+
+    async def list_page(
+        self,
+        user_id: str,
+        name: str,
+        page_size: int,
+        page_token: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """サブコレクションをドキュメントID順に1ページ分取得
+
+        次ページの有無を判定するため page_size + 1 件を読み、カーソルは
+        直前のページの最後のドキュメントIDから再開する（オフセットの読み飛ばしはしない）。
+
+        Args:
+            user_id: ユーザーID
+            name: サブコレクション名
+            page_size: 1ページの件数
+            page_token: 前回のレスポンスの next_page_token
+            fields: 取得するフィールド（省略時は全フィールド）
+
+        Returns:
+            (ページ内のドキュメント, 次ページのトークン。最後のページなら None)
+        """
+        query = self.user_collection(user_id, name).order_by(FieldPath.document_id())
+        if fields:
+            query = query.select(fields)
+        if page_token:
+            query = query.start_after({FieldPath.document_id(): decode_page_token(page_token)})
+
+        docs = [doc async for doc in query.limit(page_size + 1).stream()]
+        next_token = encode_page_token(docs[page_size - 1].id) if len(docs) > page_size else None
+        return [strip_internal_fields(doc.to_dict()) for doc in docs[:page_size]], next_token
+
+    async def _clear_collection(
+        self,
+        user_id: str,
+        name: str,
+        progress: Callable[[str, int], None] | None = None,
+    ) -> int:
+        """サブコレクションの全ドキュメントを一括削除
+
+        ドキュメントIDだけを射影したクエリで FIRESTORE_DELETE_PAGE_SIZE 件ずつ参照を読み、
+        bulk_write() の並行バッチで削除する（1件ずつの往復をしない）。
+        全件削除なので墓標は残さず、概念・関係性の場合はスナップショットの見出しを削除の前後で消す。
+
+        Args:
+            user_id: ユーザーID
+            name: サブコレクション名
+            progress: ページを削除するたびに (サブコレクション名, 累計削除件数) で呼ばれる
+
+        Returns:
+            削除した件数
+        """
+        query = (
+            self.user_collection(user_id, name)
+            .select([FieldPath.document_id()])
+            .order_by(FieldPath.document_id())
+            .limit(FIRESTORE_DELETE_PAGE_SIZE)
+        )
+        if name in GRAPH_COLLECTIONS:
+            await self._snapshot_header_ref(user_id).delete()
+        count = 0
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc is not None else query
+            docs = [doc async for doc in page.stream()]
+            if not docs:
+                break
+            result = await self.bulk_write(
+                user_id, name, dict.fromkeys(doc.id for doc in docs), tombstones=False
+            )
+            count += len(result["written"])
+            if progress:
+                progress(name, count)
+            if len(docs) < FIRESTORE_DELETE_PAGE_SIZE:
+                break
+            last_doc = docs[-1]
+        if name in GRAPH_COLLECTIONS:
+            # 削除中に作り直されたスナップショットを使わせない
+            await self._snapshot_header_ref(user_id).delete()
+        return count
+
+    # ========== グラフのバージョン ==========
+
+    async def get_graph_version(self, user_id: str) -> int:
+        """グラフのバージョン番号を取得（概念・関係性を書き込むたびに増える）"""
+        doc = await self.user_collection(user_id, "meta").document("graph").get()
+        return (doc.to_dict() or {}).get("version", 0) if doc.exists else 0
+
+    async def bump_graph_version(self, user_id: str) -> None:
+        """グラフのバージョンを上げ、他のインスタンスを含むキャッシュを無効にする
+
+        書き込みの後に呼ぶ。バージョンを読んでからコレクションを読む get_graph() と
+        組み合わせると、キャッシュが書き込み前の内容を新しいバージョンで保持することはない。
+        """
+        self._graph_cache.invalidate(user_id)
+        await self.user_collection(user_id, "meta").document("graph").set(
+            {"version": firestore.Increment(1)}, merge=True
+        )
+
+    # ========== ジョブ ==========
+
+    async def get_relation_ids_state(self, user_id: str) -> dict[str, Any] | None:
+        """関係の端点の移行状態（users/{uid}/meta/relation_ids）"""
+        doc = await self.user_collection(user_id, "meta").document(RELATION_IDS_STATE).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def set_relation_ids_state(self, user_id: str, state: dict[str, Any]) -> None:
+        """移行の結果を既存の状態にマージして保存"""
+        await self.user_collection(user_id, "meta").document(RELATION_IDS_STATE).set(state, merge=True)
+
+    async def mark_unresolved_relations(self, user_id: str, count: int) -> None:
+        """端点を解決できない関係を書き込んだことを記録（エージェントも同じカウンタを増やす）"""
+        await self.user_collection(user_id, "meta").document(RELATION_IDS_STATE).set(
+            {"pending": firestore.Increment(count)}, merge=True
+        )
+
+    async def get_clear_job(self, user_id: str) -> dict[str, Any] | None:
+        """最後に開始したグラフ削除ジョブの状態（users/{uid}/meta/clear_job）"""
+        doc = await self.user_collection(user_id, "meta").document("clear_job").get()
+        return doc.to_dict() if doc.exists else None
+
+    async def set_clear_job(self, user_id: str, job: dict[str, Any]) -> None:
+        """グラフ削除ジョブの状態を保存（どのインスタンスからも進捗を確認できる）"""
+        await self.user_collection(user_id, "meta").document("clear_job").set(job)
+
+    def graph_cache_stats(self) -> dict[str, Any]:
+        """グラフのキャッシュとスナップショットの統計を取得"""
+        return {
+            **self._graph_cache.stats(),
+            "snapshot": {**self._snapshot_stats, "rebuilding": len(self._snapshot_tasks)},
+        }
+
+    # ========== 一括書き込み ==========
+
+    async def bulk_write(
+        self,
+        user_id: str,
+        collection: str,
+        writes: dict[str, dict[str, Any] | None],
+        merge: bool = False,
+        tombstones: bool = True,
+    ) -> dict[str, Any]:
+        """サブコレクションへの一括書き込み
+
+        FIRESTORE_BATCH_SIZE 件ごとの WriteBatch に分け、FIRESTORE_WRITE_CONCURRENCY 件まで
+        並行してコミットする。WriteBatch は全件成功か全件失敗のため、失敗したバッチの
+        ドキュメントだけを、バッチを 1/8 ずつ小さくしながらバックオフ付きで再試行し、
+        最後は1件ずつ書いて失敗したドキュメントを特定する。
+
+        概念・関係性には更新時刻を付け、削除したものには同じバッチで墓標を書く
+        （スナップショット以降の差分の読み出しに使う）。
+
+        Args:
+            user_id: ユーザーID
+            collection: サブコレクション名
+            writes: ドキュメントID → 書き込む内容（None なら削除）
+            merge: 既存ドキュメントにマージするか
+            tombstones: 概念・関係性を削除したときに墓標を書くか
+
+        Returns:
+            書き込めたドキュメントIDのリスト（written）と、失敗したドキュメントID → エラー（failed）
+        """
+        collection_ref = self.user_collection(user_id, collection)
+        pending = list(writes)
+        written: list[str] = []
+        failed: dict[str, str] = {}
+        stamp = collection in GRAPH_COLLECTIONS
+        tombstone_ref = self.user_collection(user_id, TOMBSTONE_COLLECTION) if stamp and tombstones else None
+        # 削除1件が墓標と合わせて2操作になるため、墓標を書く場合はバッチを半分にする
+        chunk_size = FIRESTORE_BATCH_SIZE // 2 if tombstone_ref is not None else FIRESTORE_BATCH_SIZE
+
+        for attempt in range(FIRESTORE_WRITE_MAX_RETRIES + 1):
+            if attempt:
+                delay = min(FIRESTORE_BACKOFF_MAX, FIRESTORE_BACKOFF_BASE * 2 ** (attempt - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                chunk_size = max(1, chunk_size // 8)
+
+            chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+            errors = await asyncio.gather(
+                *(
+                    self._commit_chunk(collection_ref, chunk, writes, merge, stamp, tombstone_ref)
+                    for chunk in chunks
+                )
+            )
+            pending = []
+            for chunk, error in zip(chunks, errors):
+                if error is None:
+                    written.extend(chunk)
+                    for doc_id in chunk:
+                        failed.pop(doc_id, None)
+                else:
+                    pending.extend(chunk)
+                    for doc_id in chunk:
+                        failed[doc_id] = error
+            if not pending:
+                break
+
+        if failed:
+            print(f"Firestore bulk write to {collection} failed for {len(failed)} documents")
+        if written and collection in GRAPH_COLLECTIONS:
+            await self.bump_graph_version(user_id)
+        return {"written": written, "failed": failed}
+
+    async def _commit_chunk(
+        self,
+        collection_ref: firestore.AsyncCollectionReference,
+        doc_ids: list[str],
+        writes: dict[str, dict[str, Any] | None],
+        merge: bool,
+        stamp: bool = False,
+        tombstone_ref: firestore.AsyncCollectionReference | None = None,
+    ) -> str | None:
+        """1バッチをコミット（失敗時はエラーメッセージを返す）"""
+        async with self._write_semaphore:
+            batch = self.client.batch()
+            for doc_id in doc_ids:
+                doc_ref = collection_ref.document(doc_id)
+                if writes[doc_id] is None:
+                    batch.delete(doc_ref)
+                    if tombstone_ref is not None:
+                        self._add_tombstone(batch, tombstone_ref, collection_ref.id, doc_id)
+                elif stamp:
+                    batch.set(doc_ref, {**writes[doc_id], UPDATED_AT_FIELD: firestore.SERVER_TIMESTAMP}, merge=merge)
+                else:
+                    batch.set(doc_ref, writes[doc_id], merge=merge)
+            try:
+                await batch.commit()
+            except Exception as e:
+                return str(e) or type(e).__name__
+        return None
+
+    @staticmethod
+    def _add_tombstone(
+        batch: firestore.AsyncWriteBatch,
+        tombstone_ref: firestore.AsyncCollectionReference,
+        collection: str,
+        doc_id: str,
+    ) -> None:
+        """削除の墓標をバッチに追加（同じドキュメントの墓標は上書き）"""
+        batch.set(
+            tombstone_ref.document(f"{collection}:{doc_id}"),
+            {"collection": collection, "id": doc_id, "deleted_at": firestore.SERVER_TIMESTAMP},
+        )
+
     # ========== 概念（Concepts）操作 ==========
 
     async def add_concept(self, user_id: str, concept: dict[str, Any]) -> str:
         """概念を追加"""
-        doc_ref = self.collection("users").document(user_id).collection("concepts").document(concept["id"])
-        doc_ref.set(concept)
+        doc_ref = self.user_collection(user_id, "concepts").document(concept["id"])
+        await doc_ref.set({**concept, UPDATED_AT_FIELD: firestore.SERVER_TIMESTAMP})
+        await self.bump_graph_version(user_id)
         return concept["id"]
 
-    async def add_concepts_batch(self, user_id: str, concepts: list[dict[str, Any]]) -> list[str]:
-        """複数の概念を一括追加"""
-        batch = self.client.batch()
-        concept_ids = []
-
-        for concept in concepts:
-            doc_ref = self.collection("users").document(user_id).collection("concepts").document(concept["id"])
-            batch.set(doc_ref, concept, merge=True)
-            concept_ids.append(concept["id"])
-
-        batch.commit()
-        return concept_ids
+    async def add_concepts_batch(self, user_id: str, concepts: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の概念を一括追加（内容ハッシュを付与、結果は bulk_write() と同じ形式）"""
+        return await self.bulk_write(
+            user_id, "concepts", {c["id"]: with_content_hash(c) for c in concepts}, merge=True
+        )
 
     async def get_concept(self, user_id: str, concept_id: str) -> dict[str, Any] | None:
         """概念を取得"""
-        doc_ref = self.collection("users").document(user_id).collection("concepts").document(concept_id)
-        doc = doc_ref.get()
+        doc_ref = self.user_collection(user_id, "concepts").document(concept_id)
+        doc = await doc_ref.get()
         if doc.exists:
-            return doc.to_dict()
+            return strip_internal_fields(doc.to_dict())
         return None
 
-    async def get_all_concepts(self, user_id: str) -> list[dict[str, Any]]:
+    async def get_all_concepts(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
         """ユーザーの全概念を取得"""
-        concepts_ref = self.collection("users").document(user_id).collection("concepts")
-        docs = concepts_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await self._stream_dicts(user_id, "concepts", fields)
 
     async def delete_concept(self, user_id: str, concept_id: str) -> bool:
         """概念を削除"""
-        doc_ref = self.collection("users").document(user_id).collection("concepts").document(concept_id)
-        doc_ref.delete()
+        batch = self.client.batch()
+        batch.delete(self.user_collection(user_id, "concepts").document(concept_id))
+        self._add_tombstone(batch, self.user_collection(user_id, TOMBSTONE_COLLECTION), "concepts", concept_id)
+        await batch.commit()
+        await self.bump_graph_version(user_id)
         return True
 
-    async def clear_concepts(self, user_id: str) -> int:
+    async def clear_concepts(self, user_id: str, progress: Callable[[str, int], None] | None = None) -> int:
         """ユーザーの全概念を削除"""
-        concepts_ref = self.collection("users").document(user_id).collection("concepts")
-        docs = concepts_ref.stream()
-        count = 0
-        for doc in docs:
-            doc.reference.delete()
-            count += 1
-        return count
+        return await self._clear_collection(user_id, "concepts", progress)
 
     # ========== 関係性（Relations）操作 ==========
 
     async def add_relation(self, user_id: str, relation: dict[str, Any]) -> str:
         """関係性を追加"""
-        doc_ref = self.collection("users").document(user_id).collection("relations").document(relation["id"])
-        doc_ref.set(relation)
+        doc_ref = self.user_collection(user_id, "relations").document(relation["id"])
+        await doc_ref.set({**relation, UPDATED_AT_FIELD: firestore.SERVER_TIMESTAMP})
+        await self.bump_graph_version(user_id)
         return relation["id"]
 
-    async def add_relations_batch(self, user_id: str, relations: list[dict[str, Any]]) -> list[str]:
-        """複数の関係性を一括追加"""
-        batch = self.client.batch()
-        relation_ids = []
-
-        for relation in relations:
-            doc_ref = self.collection("users").document(user_id).collection("relations").document(relation["id"])
-            batch.set(doc_ref, relation, merge=True)
-            relation_ids.append(relation["id"])
+    async def add_relations_batch(self, user_id: str, relations: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の関係性を一括追加（内容ハッシュを付与、結果は bulk_write() と同じ形式）"""
+        return await self.bulk_write(
+            user_id, "relations", {r["id"]: with_content_hash(r) for r in relations}, merge=True
+        )
 
-        batch.commit()
-        return relation_ids
-
-    async def get_all_relations(self, user_id: str) -> list[dict[str, Any]]:
+    async def get_all_relations(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
         """ユーザーの全関係性を取得"""
-        relations_ref = self.collection("users").document(user_id).collection("relations")
-        docs = relations_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await self._stream_dicts(user_id, "relations", fields)
+
+    async def get_neighbors(self, user_id: str, concept_ids: list[str]) -> dict[str, list[str]]:
+        """概念ごとの隣接する概念ID
 
-    async def clear_relations(self, user_id: str) -> int:
+        端点の概念IDで絞り込むクエリ（単一フィールドの自動索引）で、該当する関係の
+        端点だけを読む。読み取り件数は関係の総数ではなく次数に比例する。
+        """
+        relations_ref = self.user_collection(user_id, "relations")
+        queries = [
+            relations_ref.where(filter=FieldFilter(field, "in", concept_ids[start:start + NEIGHBOR_QUERY_CHUNK]))
+            .select([SOURCE_ID_FIELD, TARGET_ID_FIELD])
+            for field in (SOURCE_ID_FIELD, TARGET_ID_FIELD)
+            for start in range(0, len(concept_ids), NEIGHBOR_QUERY_CHUNK)
+        ]
+
+        async def endpoints(query) -> list[tuple[str, str]]:
+            pairs = []
+            async for doc in query.stream():
+                data = doc.to_dict()
+                pairs.append((data.get(SOURCE_ID_FIELD), data.get(TARGET_ID_FIELD)))
+            return pairs
+
+        neighbors: dict[str, dict[str, None]] = {concept_id: {} for concept_id in concept_ids}
+        for pairs in await asyncio.gather(*(endpoints(query) for query in queries)):
+            for source, target in pairs:
+                if source in neighbors and target is not None:
+                    neighbors[source][target] = None
+                if target in neighbors and source is not None:
+                    neighbors[target][source] = None
+        return {concept_id: list(ids) for concept_id, ids in neighbors.items()}
+
+    async def clear_relations(self, user_id: str, progress: Callable[[str, int], None] | None = None) -> int:
         """ユーザーの全関係性を削除"""
-        relations_ref = self.collection("users").document(user_id).collection("relations")
-        docs = relations_ref.stream()
-        count = 0
-        for doc in docs:
-            doc.reference.delete()
-            count += 1
-        return count
+        return await self._clear_collection(user_id, "relations", progress)
+
+    # ========== 埋め込み（Embeddings）操作 ==========
+
+    async def get_all_embeddings(self, user_id: str) -> dict[str, dict[str, Any]]:
+        """ユーザーの全概念埋め込みを取得（概念ID → レコード）"""
+        embeddings_ref = self.user_collection(user_id, "concept_embeddings")
+        return {doc.id: doc.to_dict() async for doc in embeddings_ref.stream()}
+
+    async def get_embeddings(self, user_id: str, concept_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """指定した概念の埋め込みだけをドキュメントIDで一括取得（読み取りは指定件数分）"""
+        embeddings_ref = self.user_collection(user_id, "concept_embeddings")
+
+        async def read(chunk: list[str]) -> dict[str, dict[str, Any]]:
+            refs = [embeddings_ref.document(concept_id) for concept_id in chunk]
+            return {doc.id: doc.to_dict() async for doc in self.client.get_all(refs) if doc.exists}
+
+        records: dict[str, dict[str, Any]] = {}
+        chunks = [concept_ids[start:start + FIRESTORE_BATCH_SIZE] for start in range(0, len(concept_ids), FIRESTORE_BATCH_SIZE)]
+        for chunk_records in await asyncio.gather(*(read(chunk) for chunk in chunks)):
+            records.update(chunk_records)
+        return records
+
+    async def set_embeddings_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """概念埋め込みを一括保存（概念ID → レコード、保存できた件数を返す）"""
+        result = await self.bulk_write(user_id, "concept_embeddings", records)
+        return len(result["written"])
+
+    async def clear_embeddings(self, user_id: str, progress: Callable[[str, int], None] | None = None) -> int:
+        """ユーザーの全概念埋め込みを削除"""
+        return await self._clear_collection(user_id, "concept_embeddings", progress)
+
+    # ========== 概念の別名（Aliases）操作 ==========
+
+    async def get_all_aliases(self, user_id: str) -> list[dict[str, Any]]:
+        """ユーザーの全別名レコードを取得"""
+        return await self._stream_dicts(user_id, "concept_aliases")
+
+    async def set_aliases_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """別名レコードを一括保存（ドキュメントID → レコード、保存できた件数を返す）"""
+        result = await self.bulk_write(user_id, "concept_aliases", records)
+        return len(result["written"])
+
+    async def clear_aliases(self, user_id: str, progress: Callable[[str, int], None] | None = None) -> int:
+        """ユーザーの全別名レコードを削除"""
+        return await self._clear_collection(user_id, "concept_aliases", progress)
+
+    async def delete_documents_batch(self, user_id: str, collection: str, doc_ids: list[str]) -> int:
+        """ユーザー配下のサブコレクションからドキュメントを一括削除（削除できた件数を返す）"""
+        result = await self.bulk_write(user_id, collection, dict.fromkeys(doc_ids))
+        return len(result["written"])
 
     # ========== 論文（Papers）操作 ==========
 
     async def add_paper(self, user_id: str, paper: dict[str, Any]) -> str:
         """論文を追加"""
-        doc_ref = self.collection("users").document(user_id).collection("papers").document(paper["id"])
-        doc_ref.set(paper)
+        doc_ref = self.user_collection(user_id, "papers").document(paper["id"])
+        await doc_ref.set(paper)
         return paper["id"]
 
-    async def get_all_papers(self, user_id: str) -> list[dict[str, Any]]:
+    async def get_all_papers(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
         """ユーザーの全論文を取得"""
-        papers_ref = self.collection("users").document(user_id).collection("papers")
-        docs = papers_ref.stream()
-        return [doc.to_dict() for doc in docs]
+        return await self._stream_dicts(user_id, "papers", fields)
 
     async def delete_paper(self, user_id: str, paper_id: str) -> bool:
         """論文を削除"""
-        doc_ref = self.collection("users").document(user_id).collection("papers").document(paper_id)
-        doc_ref.delete()
+        doc_ref = self.user_collection(user_id, "papers").document(paper_id)
+        await doc_ref.delete()
         return True
 
-    async def clear_papers(self, user_id: str) -> int:
+    async def clear_papers(self, user_id: str, progress: Callable[[str, int], None] | None = None) -> int:
         """ユーザーの全論文を削除"""
-        papers_ref = self.collection("users").document(user_id).collection("papers")
-        docs = papers_ref.stream()
-        count = 0
-        for doc in docs:
-            doc.reference.delete()
-            count += 1
-        return count
+        return await self._clear_collection(user_id, "papers", progress)
 
     # ========== グラフ全体操作 ==========
 
     async def get_graph(self, user_id: str) -> dict[str, Any]:
-        """ユーザーのナレッジグラフ全体を取得"""
-        concepts = await self.get_all_concepts(user_id)
-        relations = await self.get_all_relations(user_id)
+        """ユーザーのナレッジグラフ全体を取得
+
+        バージョン文書だけを読み、キャッシュが同じバージョンならそれを返す。
+        変わっていればスナップショット（なければ全件）から読み直してキャッシュする。
+        """
+        version = await self.get_graph_version(user_id)
+        cached = self._graph_cache.get(user_id, version)
+        if cached is not None:
+            return cached
+
+        graph = await self._load_graph(user_id, version)
+        self._graph_cache.put(user_id, version, graph)
+        return graph
+
+    async def _read_full_graph(self, user_id: str) -> dict[str, Any]:
+        """概念と関係性を並行して全件読む"""
+        concepts, relations = await asyncio.gather(
+            self.get_all_concepts(user_id),
+            self.get_all_relations(user_id),
+        )
         return {
             "concepts": concepts,
             "relations": relations,
         }
 
+    async def _load_graph(self, user_id: str, version: int) -> dict[str, Any]:
+        """スナップショットと、その後の差分からグラフを組み立てる
+
+        スナップショットのバージョンが現在と同じならそのまま使い、古ければ基準時刻より後に
+        更新された概念・関係性と墓標だけを読んで重ねる。スナップショットがない・読めない場合は
+        全件を読む。差分や件数が多ければスナップショットをバックグラウンドで作り直す。
+        """
+        header_doc = await self._snapshot_header_ref(user_id).get()
+        header = header_doc.to_dict() if header_doc.exists else None
+        graph = await self._read_snapshot(user_id, header) if header else None
+
+        if graph is None:
+            graph = await self._read_full_graph(user_id)
+            self._snapshot_stats["full_loads"] += 1
+            if sum(len(documents) for documents in graph.values()) >= GRAPH_SNAPSHOT_MIN_DOCUMENTS:
+                self._schedule_snapshot_rebuild(user_id)
+            return graph
+
+        self._snapshot_stats["snapshot_loads"] += 1
+        if header["version"] == version:
+            return graph
+
+        changed, tombstones = await self._read_graph_delta(user_id, header["as_of"])
+        changes = sum(len(documents) for documents in changed.values()) + len(tombstones)
+        self._snapshot_stats["delta_documents"] += changes
+        if changes >= GRAPH_SNAPSHOT_REBUILD_CHANGES:
+            self._schedule_snapshot_rebuild(user_id)
+        return apply_delta(graph, changed, tombstones)
+
+    # ========== グラフのスナップショット ==========
+
+    def _snapshot_header_ref(self, user_id: str) -> firestore.AsyncDocumentReference:
+        """スナップショットの見出し（バージョン・基準時刻・チャンク数）の参照"""
+        return self.user_collection(user_id, "meta").document("graph_snapshot")
+
+    async def _read_snapshot(self, user_id: str, header: dict[str, Any]) -> dict[str, Any] | None:
+        """スナップショットのチャンクを読んで復元（欠けていれば None）"""
+        chunk_ref = self.user_collection(user_id, SNAPSHOT_CHUNK_COLLECTION)
+        docs = await asyncio.gather(
+            *(chunk_ref.document(f"{header['snapshot_id']}-{i:04d}").get() for i in range(header["chunks"]))
+        )
+        if not all(doc.exists for doc in docs):
+            # 作り直しで古いチャンクが消された直後など
+            print(f"Graph snapshot {header['snapshot_id']} is incomplete, falling back to a full read")
+            return None
+        return decode_snapshot([doc.to_dict()["data"] for doc in docs])
+
+    async def _read_graph_delta(
+        self,
+        user_id: str,
+        as_of: datetime,
+    ) -> tuple[dict[str, list[dict[str, Any]]], list[dict[str, Any]]]:
+        """基準時刻より後に書き込まれた概念・関係性と、削除の墓標を読む"""
+
+        async def changed_since(name: str) -> list[dict[str, Any]]:
+            query = self.user_collection(user_id, name).where(filter=FieldFilter(UPDATED_AT_FIELD, ">", as_of))
+            return [doc.to_dict() async for doc in query.stream()]
+
+        tombstone_query = self.user_collection(user_id, TOMBSTONE_COLLECTION).where(
+            filter=FieldFilter("deleted_at", ">", as_of)
+        )
+
+        async def tombstones_since() -> list[dict[str, Any]]:
+            return [doc.to_dict() async for doc in tombstone_query.stream()]
+
+        concepts, relations, tombstones = await asyncio.gather(
+            changed_since("concepts"),
+            changed_since("relations"),
+            tombstones_since(),
+        )
+        return {"concepts": concepts, "relations": relations}, tombstones
+
+    def _schedule_snapshot_rebuild(self, user_id: str) -> None:
+        """スナップショットの作り直しをバックグラウンドで開始（実行中なら何もしない）"""
+        if user_id in self._snapshot_tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self.rebuild_snapshot(user_id))
+        self._snapshot_tasks[user_id] = task
+        task.add_done_callback(lambda _: self._snapshot_tasks.pop(user_id, None))
+
+    async def refresh_snapshot(self, user_id: str) -> None:
+        """スナップショットがあれば作り直しをバックグラウンドで開始
+
+        エージェントのパイプラインなど、このクライアントを通さずに書き込んだ後に呼ぶ。
+        """
+        if (await self._snapshot_header_ref(user_id).get()).exists:
+            self._schedule_snapshot_rebuild(user_id)
+
+    async def rebuild_snapshot(self, user_id: str) -> dict[str, Any] | None:
+        """グラフ全体を圧縮したスナップショットを作り直す
+
+        バージョンと基準時刻を全件読み込みの前に決めるため、読み込み中の書き込みは
+        次の読み出しで差分として重ねられる。チャンクを書いてから見出しを差し替え、
+        古いチャンクと、前のスナップショットより前の墓標を削除する。
+
+        Returns:
+            新しいスナップショットの見出し（チャンクを書けなかった場合は None）
+        """
+        try:
+            version = await self.get_graph_version(user_id)
+            as_of = datetime.now(UTC) - GRAPH_SNAPSHOT_CLOCK_SKEW
+            header_ref = self._snapshot_header_ref(user_id)
+            previous_doc, graph = await asyncio.gather(header_ref.get(), self._read_full_graph(user_id))
+            previous = previous_doc.to_dict() if previous_doc.exists else None
+
+            chunks = encode_snapshot(graph)
+            snapshot_id = uuid.uuid4().hex
+            chunk_ref = self.user_collection(user_id, SNAPSHOT_CHUNK_COLLECTION)
+            # チャンクは1件で1MiB 近いため、バッチにまとめず個別に書く
+            await asyncio.gather(
+                *(chunk_ref.document(f"{snapshot_id}-{i:04d}").set({"data": chunk}) for i, chunk in enumerate(chunks))
+            )
+            header = {
+                "snapshot_id": snapshot_id,
+                "version": version,
+                "as_of": as_of,
+                "chunks": len(chunks),
+                "bytes": sum(len(chunk) for chunk in chunks),
+                "concept_count": len(graph["concepts"]),
+                "relation_count": len(graph["relations"]),
+            }
+            await header_ref.set(header)
+
+            stale_chunks = [
+                doc.id async for doc in chunk_ref.select([FieldPath.document_id()]).stream()
+                if not doc.id.startswith(f"{snapshot_id}-")
+            ]
+            await self.bulk_write(user_id, SNAPSHOT_CHUNK_COLLECTION, dict.fromkeys(stale_chunks))
+            if previous:
+                # 前のスナップショットを読み込み中の呼び出しのため、その基準時刻より後の墓標は残す
+                old_tombstones = (
+                    self.user_collection(user_id, TOMBSTONE_COLLECTION)
+                    .where(filter=FieldFilter("deleted_at", "<", previous["as_of"]))
+                    .select([FieldPath.document_id()])
+                )
+                await self.bulk_write(
+                    user_id, TOMBSTONE_COLLECTION, dict.fromkeys([doc.id async for doc in old_tombstones.stream()])
+                )
+            self._snapshot_stats["rebuilds"] += 1
+            return header
+        except Exception as e:
+            print(f"Graph snapshot rebuild failed for {user_id}: {e}")
+            return None
+
+    async def _clear_snapshot(
+        self,
+        user_id: str,
+        progress: Callable[[str, int], None] | None = None,
+    ) -> None:
+        """スナップショットの見出し・チャンクと墓標を削除"""
+        await self._snapshot_header_ref(user_id).delete()
+        await asyncio.gather(
+            self._clear_collection(user_id, SNAPSHOT_CHUNK_COLLECTION, progress),
+            self._clear_collection(user_id, TOMBSTONE_COLLECTION, progress),
+        )
+
+    async def _sync_collection(
+        self,
+        user_id: str,
+        name: str,
+        documents: list[dict[str, Any]],
+        fields: tuple[str, ...] = (),
+        delete_missing: bool = False,
+    ) -> dict[str, Any]:
+        """内容ハッシュを比較して、追加・変更されたドキュメントだけを書き込む
+
+        保存済みドキュメントは内容ハッシュと fields だけを射影して読む。
+
+        Returns:
+            added / updated / unchanged / deleted のIDリスト、射影した既存ドキュメント（existing）、
+            書き込みに失敗したID → エラー（failed）
+        """
+        query = self.user_collection(user_id, name).select([CONTENT_HASH_FIELD, *fields])
+        existing = {doc.id: doc.to_dict() or {} async for doc in query.stream()}
+        diff, writes = plan_sync(existing, documents, delete_missing)
+
+        result = await self.bulk_write(user_id, name, writes)
+        failed = result["failed"]
+        for key in ("added", "updated", "deleted"):
+            diff[key] = [doc_id for doc_id in diff[key] if doc_id not in failed]
+        return {**diff, "existing": existing, "failed": failed}
+
     async def sync_graph(
         self,
         user_id: str,
         concepts: list[dict[str, Any]],
         relations: list[dict[str, Any]],
+        delete_missing: bool = False,
+    ) -> dict[str, Any]:
+        """フロントエンドからグラフを同期
+
+        各ドキュメントに内容ハッシュを持たせ、ハッシュが変わったものだけを書き込む。
+        delete_missing=True の場合は、送られてこなかった既存の概念・関係性を削除する。
+        関係の端点は同期後の概念のIDに解決するため、概念を先に同期する。
+
+        Returns:
+            概念・関係性ごとの added / updated / unchanged / deleted の件数、
+            埋め込みの更新が必要な概念IDのリスト、削除した概念IDのリスト、
+            書き込みに失敗した概念・関係性ID → エラー
+        """
+        concept_sync = await self._sync_collection(
+            user_id, "concepts", concepts, CONCEPT_CONTENT_FIELDS, delete_missing
+        )
+        relations = resolve_relations(
+            relations, graph_concepts_after_sync(concept_sync["existing"], concepts, concept_sync["deleted"])
+        )
+        relation_sync = await self._sync_collection(user_id, "relations", relations, (), delete_missing)
+        if concept_sync["deleted"]:
+            await self.delete_documents_batch(user_id, "concept_embeddings", concept_sync["deleted"])
+        unresolved = count_unresolved(relations)
+        if unresolved:
+            await self.mark_unresolved_relations(user_id, unresolved)
+        return summarize_sync(concept_sync, relation_sync, concepts)
+
+    async def clear_graph(
+        self,
+        user_id: str,
+        progress: Callable[[str, int], None] | None = None,
     ) -> dict[str, int]:
-        """フロントエンドからグラフを同期"""
-        # 既存データを取得
-        existing_concepts = {c["id"] for c in await self.get_all_concepts(user_id)}
-        existing_relations = {r["id"] for r in await self.get_all_relations(user_id)}
-
-        # 新規追加のみ（既存は上書き）
-        new_concept_ids = [c["id"] for c in concepts]
-        new_relation_ids = [r["id"] for r in relations]
+        """ユーザーのナレッジグラフをクリア
 
-        # バッチ追加
-        await self.add_concepts_batch(user_id, concepts)
-        await self.add_relations_batch(user_id, relations)
-
-        return {
-            "concepts_synced": len(concepts),
-            "relations_synced": len(relations),
-        }
-
-    async def clear_graph(self, user_id: str) -> dict[str, int]:
-        """ユーザーのナレッジグラフをクリア"""
-        concepts_deleted = await self.clear_concepts(user_id)
-        relations_deleted = await self.clear_relations(user_id)
+        Args:
+            user_id: ユーザーID
+            progress: 削除の進捗を (サブコレクション名, 累計削除件数) で受け取るコールバック
+        """
+        concepts_deleted, relations_deleted, _, _, _ = await asyncio.gather(
+            self.clear_concepts(user_id, progress),
+            self.clear_relations(user_id, progress),
+            self.clear_embeddings(user_id, progress),
+            self.clear_aliases(user_id, progress),
+            self._clear_snapshot(user_id, progress),
+        )
         return {
             "concepts_deleted": concepts_deleted,
             "relations_deleted": relations_deleted,
@@ -0,0 +1,89 @@
+"""ユーザーごとのナレッジグラフのキャッシュ
+
+Firestore から読んだ概念・関係性をグラフのバージョン番号と一緒に保持する。
+グラフへの書き込みはバージョンを上げるため、読み出し時にバージョン文書1件だけを
+確認すれば、キャッシュが最新か（コレクション全体を読み直す必要があるか）が分かる。
+メモリ使用量の概算がバイト数の上限を超えたら、最も古く使われたユーザーから追い出す。
+"""
+
+import sys
+from collections import OrderedDict
+from typing import Any
+
+
+def graph_nbytes(graph: dict[str, list[dict[str, Any]]]) -> int:
+    """グラフが占めるメモリの概算（ドキュメントと値のサイズの合計）"""
+    total = 0
+    for documents in graph.values():
+        total += sys.getsizeof(documents)
+        for document in documents:
+            total += sys.getsizeof(document)
+            total += sum(sys.getsizeof(value) for value in document.values())
+    return total
+
+
+class GraphCache:
+    """ユーザーID → (バージョン, グラフ) の LRU キャッシュ
+
+    Args:
+        max_bytes: 保持する最大バイト数の概算（None で無制限）
+    """
+
+    def __init__(self, max_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[int, dict[str, list[dict[str, Any]]], int]] = OrderedDict()
+        self._resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str, version: int) -> dict[str, list[dict[str, Any]]] | None:
+        """バージョンが一致するグラフを取得（古いバージョンは破棄してミス扱い）
+
+        呼び出し側がリストを変更してもキャッシュに影響しないよう、リストは複製して返す。
+        """
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] != version:
+            self.invalidate(user_id)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return {name: list(documents) for name, documents in entry[1].items()}
+
+    def put(self, user_id: str, version: int, graph: dict[str, list[dict[str, Any]]]) -> None:
+        """グラフを登録し、上限を超えた分を追い出す"""
+        self.invalidate(user_id)
+        nbytes = graph_nbytes(graph)
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        self._entries[user_id] = (version, {name: list(documents) for name, documents in graph.items()}, nbytes)
+        self._resident_bytes += nbytes
+        while self.max_bytes is not None and self._resident_bytes > self.max_bytes:
+            _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+            self._resident_bytes -= evicted_bytes
+            self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """ユーザーのグラフを破棄（存在しなければ何もしない）"""
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._resident_bytes -= entry[2]
+
+    def stats(self) -> dict[str, Any]:
+        """ヒット率などの統計を取得"""
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "resident_bytes": self._resident_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
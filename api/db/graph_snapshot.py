@@ -0,0 +1,71 @@
+"""ナレッジグラフのスナップショット
+
+概念・関係性の全件を1つの JSON にまとめて zlib で圧縮したもの。Firestore の
+1ドキュメント 1MiB の上限に収まるよう、圧縮後のバイト列を複数のチャンクに分けて保存する。
+スナップショット作成後の書き込みは、ドキュメントの更新時刻と削除の墓標（tombstone）から
+差分として読み、apply_delta() でスナップショットに重ねる。
+"""
+
+import json
+import zlib
+from typing import Any
+
+# 1チャンクのバイト数（ドキュメントの上限 1MiB に余裕を持たせる）
+SNAPSHOT_CHUNK_BYTES = 900_000
+
+# 書き込み時に付ける更新時刻のフィールド名（スナップショットとの差分の検出に使う）
+UPDATED_AT_FIELD = "updated_at"
+
+
+def strip_internal_fields(document: dict[str, Any]) -> dict[str, Any]:
+    """差分検出用の内部フィールドを除いたドキュメント"""
+    if UPDATED_AT_FIELD not in document:
+        return document
+    return {k: v for k, v in document.items() if k != UPDATED_AT_FIELD}
+
+
+def encode_snapshot(graph: dict[str, list[dict[str, Any]]]) -> list[bytes]:
+    """グラフを圧縮してチャンクのリストにする"""
+    payload = json.dumps(graph, ensure_ascii=False, separators=(",", ":"), default=str)
+    blob = zlib.compress(payload.encode("utf-8"), 6)
+    return [blob[start:start + SNAPSHOT_CHUNK_BYTES] for start in range(0, len(blob), SNAPSHOT_CHUNK_BYTES)]
+
+
+def decode_snapshot(chunks: list[bytes]) -> dict[str, list[dict[str, Any]]]:
+    """チャンクのリストからグラフを復元"""
+    return json.loads(zlib.decompress(b"".join(chunks)).decode("utf-8"))
+
+
+def apply_delta(
+    graph: dict[str, list[dict[str, Any]]],
+    changed: dict[str, list[dict[str, Any]]],
+    tombstones: list[dict[str, Any]],
+) -> dict[str, list[dict[str, Any]]]:
+    """スナップショットに、その後の書き込みと削除を重ねる
+
+    同じドキュメントに書き込みと削除の両方がある場合は、時刻の新しい方を採用する。
+
+    Args:
+        graph: スナップショットのグラフ（コレクション名 → ドキュメントのリスト）
+        changed: スナップショット以降に書き込まれたドキュメント（更新時刻付き）
+        tombstones: スナップショット以降の削除（collection, id, deleted_at）
+
+    Returns:
+        差分を反映したグラフ（ドキュメントの並びはスナップショットの順、新規は末尾）
+    """
+    merged: dict[str, list[dict[str, Any]]] = {}
+    for name, documents in graph.items():
+        by_id = {d["id"]: d for d in documents}
+        written_at: dict[str, Any] = {}
+        for document in changed.get(name, []):
+            by_id[document["id"]] = strip_internal_fields(document)
+            written_at[document["id"]] = document.get(UPDATED_AT_FIELD)
+        for tombstone in tombstones:
+            if tombstone.get("collection") != name:
+                continue
+            doc_id = tombstone["id"]
+            rewritten = written_at.get(doc_id)
+            if rewritten is None or rewritten < tombstone["deleted_at"]:
+                by_id.pop(doc_id, None)
+        merged[name] = list(by_id.values())
+    return merged
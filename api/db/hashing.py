@@ -0,0 +1,123 @@
+"""ドキュメント内容の比較ユーティリティ"""
+
+import hashlib
+import json
+from typing import Any
+
+# 埋め込みの入力になる概念フィールド
+CONCEPT_CONTENT_FIELDS = ("name", "name_en", "name_ja", "definition", "definition_ja", "concept_type")
+
+# ドキュメントに保存する内容ハッシュのフィールド名
+CONTENT_HASH_FIELD = "content_hash"
+
+
+def concept_content_changed(old: dict[str, Any] | None, new: dict[str, Any]) -> bool:
+    """概念が新規、または名前・定義などの内容が変わったか判定"""
+    if old is None:
+        return True
+    return any(old.get(field) != new.get(field) for field in CONCEPT_CONTENT_FIELDS)
+
+
+def document_hash(document: dict[str, Any]) -> str:
+    """ドキュメント全体の内容ハッシュ（キー順に依存せず、ハッシュ自身のフィールドは除く）"""
+    payload = {k: v for k, v in document.items() if k != CONTENT_HASH_FIELD}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def with_content_hash(document: dict[str, Any]) -> dict[str, Any]:
+    """内容ハッシュを付けたドキュメントのコピー"""
+    return {**document, CONTENT_HASH_FIELD: document_hash(document)}
+
+
+def diff_documents(
+    existing_hashes: dict[str, str | None],
+    documents: list[dict[str, Any]],
+) -> dict[str, list[str]]:
+    """保存済みの内容ハッシュと比較して、送られたドキュメントを分類
+
+    ハッシュを持たない古いドキュメントは更新扱いにする（次回以降は比較できる）。
+
+    Args:
+        existing_hashes: 保存済みのドキュメントID → 内容ハッシュ
+        documents: 送られたドキュメント（内容ハッシュ付き）
+
+    Returns:
+        added / updated / unchanged のドキュメントIDリスト
+    """
+    diff: dict[str, list[str]] = {"added": [], "updated": [], "unchanged": []}
+    for document in documents:
+        doc_id = document["id"]
+        if doc_id not in existing_hashes:
+            diff["added"].append(doc_id)
+        elif existing_hashes[doc_id] != document[CONTENT_HASH_FIELD]:
+            diff["updated"].append(doc_id)
+        else:
+            diff["unchanged"].append(doc_id)
+    return diff
+
+
+def plan_sync(
+    existing: dict[str, dict[str, Any]],
+    documents: list[dict[str, Any]],
+    delete_missing: bool = False,
+) -> tuple[dict[str, list[str]], dict[str, dict[str, Any] | None]]:
+    """保存済みドキュメントと比較して、書き込むドキュメントを決める
+
+    Args:
+        existing: 保存済みのドキュメントID → ドキュメント（内容ハッシュのフィールドを含む）
+        documents: 送られたドキュメント（同じIDが複数あれば後のものを使う）
+        delete_missing: 送られなかった保存済みドキュメントを削除するか
+
+    Returns:
+        (added / updated / unchanged / deleted のIDリスト,
+         ドキュメントID → 書き込む内容（内容ハッシュ付き、None なら削除）)
+    """
+    incoming = {d["id"]: with_content_hash(d) for d in documents}
+    diff = diff_documents(
+        {doc_id: doc.get(CONTENT_HASH_FIELD) for doc_id, doc in existing.items()},
+        list(incoming.values()),
+    )
+    writes: dict[str, dict[str, Any] | None] = {
+        doc_id: incoming[doc_id] for doc_id in diff["added"] + diff["updated"]
+    }
+    diff["deleted"] = [doc_id for doc_id in existing if doc_id not in incoming] if delete_missing else []
+    writes.update(dict.fromkeys(diff["deleted"]))
+    return diff, writes
+
+
+def summarize_sync(
+    concept_sync: dict[str, Any],
+    relation_sync: dict[str, Any],
+    concepts: list[dict[str, Any]],
+) -> dict[str, Any]:
+    """概念・関係性の同期結果をグラフストアの sync_graph() の戻り値にまとめる
+
+    Args:
+        concept_sync: 概念の added / updated / unchanged / deleted のIDリスト、
+            比較に使った既存ドキュメント（existing）、失敗したID → エラー（failed）
+        relation_sync: 関係性の同じ形式の結果
+        concepts: 送られた概念
+
+    Returns:
+        概念・関係性ごとの件数、埋め込みの更新が必要な概念IDのリスト、
+        削除した概念IDのリスト、書き込みに失敗した概念・関係性ID → エラー
+    """
+    # 名前・定義などが変わった概念だけを再埋め込みの対象にする
+    concepts_by_id = {c["id"]: c for c in concepts}
+    changed_concept_ids = concept_sync["added"] + [
+        cid for cid in concept_sync["updated"]
+        if concept_content_changed(concept_sync["existing"][cid], concepts_by_id[cid])
+    ]
+
+    def counts(sync: dict[str, Any]) -> dict[str, int]:
+        return {key: len(sync[key]) for key in ("added", "updated", "unchanged", "deleted")}
+
+    return {
+        "concepts": counts(concept_sync),
+        "relations": counts(relation_sync),
+        "changed_concept_ids": changed_concept_ids,
+        "deleted_concept_ids": concept_sync["deleted"],
+        "failed_concepts": concept_sync["failed"],
+        "failed_relations": relation_sync["failed"],
+    }
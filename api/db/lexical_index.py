@@ -0,0 +1,214 @@
+"""概念の転置インデックス（字句検索）
+
+単語トークンと文字 bigram を索引語にした BM25 で概念を検索する。
+文字 n-gram を使うため、分かち書きのない日本語でも部分一致で検索できる。
+1文字のクエリでも部分一致するよう文字 unigram も索引する。
+ベクトル検索との統合には reciprocal_rank_fusion を使う。
+"""
+
+import hashlib
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from typing import Any
+
+# 索引対象のフィールドと重み
+LEXICAL_FIELDS = {
+    "name": 3.0,
+    "name_en": 3.0,
+    "name_ja": 3.0,
+    "definition": 1.0,
+    "definition_ja": 1.0,
+}
+
+# 名前一致の判定に使うフィールド
+NAME_FIELDS = ("name", "name_en", "name_ja")
+
+# 英数字の連続と、それ以外（日本語など）の文字の連続を別の単語として扱う
+_WORD_RE = re.compile(r"[0-9a-z]+|[^\W0-9a-z_]+")
+
+# 部分一致の判定に使う索引語（文字 bigram と unigram）の接頭辞
+_SUBSTRING_PREFIXES = ("g:", "u:")
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化と小文字化"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> list[str]:
+    """単語トークンと文字 bigram・unigram に分割
+
+    "BERT" や "F1" のような略語は単語トークンで完全一致し、
+    日本語は文字 bigram で部分一致する。unigram（u:）は「学」のような
+    1文字のクエリを部分一致させるためのもの。
+    """
+    terms: list[str] = []
+    for word in _WORD_RE.findall(normalize_text(text)):
+        terms.append(f"w:{word}")
+        terms.extend(f"u:{char}" for char in word)
+        terms.extend(f"g:{word[i:i + 2]}" for i in range(len(word) - 1))
+    return terms
+
+
+def query_terms(query: str) -> set[str]:
+    """クエリの索引語（bigram に含まれる文字の unigram は除く）
+
+    2文字以上のクエリは bigram だけで部分一致を判定し、ランキングも unigram の
+    追加前と変わらないようにする。
+    """
+    terms = set(tokenize(query))
+    bigram_chars = {char for term in terms if term.startswith("g:") for char in term[2:]}
+    return {term for term in terms if not (term.startswith("u:") and term[2:] in bigram_chars)}
+
+
+def reciprocal_rank_fusion(rankings: Iterable[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """複数のランキングを reciprocal rank fusion で統合
+
+    Args:
+        rankings: 概念IDのランキング（上位順）のリスト
+        k: 順位の平滑化定数
+
+    Returns:
+        (概念ID, RRF スコア) のリスト（スコア降順）
+    """
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, concept_id in enumerate(ranking):
+            scores[concept_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+class LexicalIndex:
+    """概念フィールドの BM25 転置インデックス"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[str, float]] = defaultdict(dict)
+        self._doc_terms: dict[str, list[str]] = {}
+        self._doc_lengths: dict[str, float] = {}
+        self._doc_names: dict[str, list[str]] = {}
+        self._hashes: dict[str, str] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, concept_id: object) -> bool:
+        return concept_id in self._doc_terms
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._doc_terms)
+
+    @staticmethod
+    def content_hash(concept: dict[str, Any]) -> str:
+        """索引対象フィールドの内容ハッシュ"""
+        payload = "\x1f".join(concept.get(field) or "" for field in LEXICAL_FIELDS)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def add(self, concept: dict[str, Any]) -> None:
+        """概念を索引（既存IDは置き換え）"""
+        concept_id = concept["id"]
+        content_hash = self.content_hash(concept)
+        if self._hashes.get(concept_id) == content_hash:
+            return
+        self.remove([concept_id])
+
+        weights: Counter[str] = Counter()
+        for field, weight in LEXICAL_FIELDS.items():
+            for term in tokenize(concept.get(field) or ""):
+                weights[term] += weight
+
+        for term, weight in weights.items():
+            self._postings[term][concept_id] = weight
+        length = sum(weights.values())
+        self._doc_terms[concept_id] = list(weights)
+        self._doc_lengths[concept_id] = length
+        self._doc_names[concept_id] = [
+            normalize_text(concept.get(field) or "") for field in NAME_FIELDS
+        ]
+        self._hashes[concept_id] = content_hash
+        self._total_length += length
+
+    def remove(self, ids: Iterable[str]) -> None:
+        """概念を索引から削除"""
+        for concept_id in ids:
+            terms = self._doc_terms.pop(concept_id, None)
+            if terms is None:
+                continue
+            for term in terms:
+                postings = self._postings[term]
+                postings.pop(concept_id, None)
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(concept_id)
+            self._doc_names.pop(concept_id, None)
+            self._hashes.pop(concept_id, None)
+
+    def sync(self, concepts: list[dict[str, Any]]) -> None:
+        """概念リストと同期（内容が変わった概念だけを再索引）"""
+        current_ids = set()
+        for concept in concepts:
+            current_ids.add(concept["id"])
+            self.add(concept)
+        self.remove([cid for cid in self.ids if cid not in current_ids])
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        require_all: bool = False,
+        allowed: set[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """BM25 で概念を検索
+
+        Args:
+            query: 検索クエリ
+            top_k: 返す結果の最大数
+            require_all: True の場合、クエリの全 bigram（1文字なら unigram）を含む概念
+                （部分一致相当）だけを返す
+            allowed: 指定時はこの概念IDだけを対象にする（属性フィルタ）
+
+        Returns:
+            (概念ID, BM25 スコア) のリスト（スコア降順）
+        """
+        terms = query_terms(query)
+        if not terms or not self._doc_terms:
+            return []
+
+        n_docs = len(self._doc_terms)
+        avg_length = self._total_length / n_docs
+        scores: dict[str, float] = defaultdict(float)
+        matched: Counter[str] = Counter()
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for concept_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[concept_id] / avg_length)
+                scores[concept_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                if term.startswith(_SUBSTRING_PREFIXES):
+                    matched[concept_id] += 1
+
+        if require_all:
+            required = sum(1 for term in terms if term.startswith(_SUBSTRING_PREFIXES))
+            scores = {cid: score for cid, score in scores.items() if matched[cid] == required}
+        if allowed is not None:
+            scores = {cid: score for cid, score in scores.items() if cid in allowed}
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:top_k]
+
+    def name_matches(self, query: str, ids: Iterable[str]) -> set[str]:
+        """名前フィールドにクエリ文字列そのものを含む概念IDを返す"""
+        needle = normalize_text(query).strip()
+        if not needle:
+            return set()
+        return {
+            cid for cid in ids
+            if any(needle in name for name in self._doc_names.get(cid, []))
+        }
@@ -0,0 +1,248 @@
+"""インメモリのグラフストア
+
+Firestore も SQLite も設定されていないときの保存先。ユーザーごと・コレクションごとに
+ドキュメントID → ドキュメントの dict で保持するため、IDでの読み書きは O(1)。
+関係は書き込みのたびに概念IDの隣接リストも更新する。
+並びは追加順（更新しても位置は変わらない）。プロセスを再起動すると消える。
+"""
+
+from typing import Any
+
+from api.db.adjacency import (
+    RELATION_IDS_STATE,
+    AdjacencyList,
+    count_unresolved,
+    graph_concepts_after_sync,
+    resolve_relations,
+)
+from api.db.hashing import plan_sync, summarize_sync, with_content_hash
+from api.db.pagination import paginate_by_id, project
+from api.db.store import ProgressCallback
+
+# clear_graph() で削除するコレクション
+GRAPH_DATA_COLLECTIONS = ("concepts", "relations", "concept_embeddings", "concept_aliases")
+
+
+class MemoryGraphStore:
+    """プロセス内の dict に保存するグラフストア（GraphStore の実装）
+
+    埋め込みは VectorSearchClient が全精度のまま自前で保持する（再スコアリングに使う）ため、
+    このストアの埋め込みは durable なストアと同じインターフェースを揃えるためのもの。
+    """
+
+    name = "memory"
+    durable = False
+
+    def __init__(self):
+        # ユーザーID → コレクション名 → ドキュメントID → ドキュメント
+        self._data: dict[str, dict[str, dict[str, dict[str, Any]]]] = {}
+        # ユーザーID → 関係の隣接リスト
+        self._adjacency: dict[str, AdjacencyList] = {}
+        # ユーザーID → グラフのバージョン（概念・関係性を書き込むたびに増える）
+        self._versions: dict[str, int] = {}
+
+    def _collection(self, user_id: str, name: str) -> dict[str, dict[str, Any]]:
+        """コレクションの dict を取得（なければ作成）"""
+        return self._data.setdefault(user_id, {}).setdefault(name, {})
+
+    def _documents(self, user_id: str, name: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """コレクションの全ドキュメントの複製（fields 指定時は射影）"""
+        return [project(dict(d), fields) for d in self._collection(user_id, name).values()]
+
+    def _write(self, user_id: str, name: str, writes: dict[str, dict[str, Any] | None]) -> list[str]:
+        """書き込みと削除をまとめて反映（None なら削除）"""
+        documents = self._collection(user_id, name)
+        if writes and name in ("concepts", "relations"):
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        adjacency = self._adjacency.setdefault(user_id, AdjacencyList()) if name == "relations" else None
+        for doc_id, document in writes.items():
+            previous = documents.pop(doc_id, None) if document is None else documents.get(doc_id)
+            if document is not None:
+                documents[doc_id] = document
+            if adjacency is not None:
+                if previous is not None:
+                    adjacency.remove(previous)
+                if document is not None:
+                    adjacency.add(document)
+        return list(writes)
+
+    # ========== グラフ ==========
+
+    async def get_graph(self, user_id: str) -> dict[str, Any]:
+        """ユーザーのナレッジグラフ全体を取得"""
+        return {
+            "concepts": self._documents(user_id, "concepts"),
+            "relations": self._documents(user_id, "relations"),
+        }
+
+    def _sync_collection(
+        self,
+        user_id: str,
+        name: str,
+        documents: list[dict[str, Any]],
+        delete_missing: bool,
+    ) -> dict[str, Any]:
+        """内容ハッシュを比較して、追加・変更・削除されたドキュメントだけを反映"""
+        existing = dict(self._collection(user_id, name))
+        diff, writes = plan_sync(existing, documents, delete_missing)
+        self._write(user_id, name, writes)
+        return {**diff, "existing": existing, "failed": {}}
+
+    async def sync_graph(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        relations: list[dict[str, Any]],
+        delete_missing: bool = False,
+    ) -> dict[str, Any]:
+        """フロントエンドからグラフを同期（戻り値は FirestoreClient.sync_graph() と同じ）
+
+        関係の端点は同期後の概念のIDに解決する。
+        """
+        concept_sync = self._sync_collection(user_id, "concepts", concepts, delete_missing)
+        relations = resolve_relations(
+            relations, graph_concepts_after_sync(concept_sync["existing"], concepts, concept_sync["deleted"])
+        )
+        relation_sync = self._sync_collection(user_id, "relations", relations, delete_missing)
+        self._write(user_id, "concept_embeddings", dict.fromkeys(concept_sync["deleted"]))
+        unresolved = count_unresolved(relations)
+        if unresolved:
+            await self.mark_unresolved_relations(user_id, unresolved)
+        return summarize_sync(concept_sync, relation_sync, concepts)
+
+    async def clear_graph(self, user_id: str, progress: ProgressCallback | None = None) -> dict[str, int]:
+        """ユーザーのナレッジグラフをクリア"""
+        collections = self._data.get(user_id, {})
+        self._adjacency.pop(user_id, None)
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        deleted: dict[str, int] = {}
+        for name in GRAPH_DATA_COLLECTIONS:
+            deleted[name] = len(collections.pop(name, {}))
+            if progress:
+                progress(name, deleted[name])
+        return {
+            "concepts_deleted": deleted["concepts"],
+            "relations_deleted": deleted["relations"],
+        }
+
+    # ========== 概念・関係性 ==========
+
+    async def get_all_concepts(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全概念を取得"""
+        return self._documents(user_id, "concepts", fields)
+
+    async def get_concept(self, user_id: str, concept_id: str) -> dict[str, Any] | None:
+        """概念を取得"""
+        concept = self._collection(user_id, "concepts").get(concept_id)
+        return dict(concept) if concept is not None else None
+
+    async def get_all_relations(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全関係性を取得"""
+        return self._documents(user_id, "relations", fields)
+
+    async def get_neighbors(self, user_id: str, concept_ids: list[str]) -> dict[str, list[str]]:
+        """概念ごとの隣接する概念ID（隣接リストから次数に比例する時間で引く）"""
+        adjacency = self._adjacency.get(user_id) or AdjacencyList()
+        return {concept_id: adjacency.neighbors(concept_id) for concept_id in concept_ids}
+
+    async def add_concepts_batch(self, user_id: str, concepts: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の概念を一括追加（内容ハッシュを付与）"""
+        written = self._write(user_id, "concepts", {c["id"]: with_content_hash(c) for c in concepts})
+        return {"written": written, "failed": {}}
+
+    async def add_relations_batch(self, user_id: str, relations: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の関係性を一括追加（内容ハッシュを付与）"""
+        written = self._write(user_id, "relations", {r["id"]: with_content_hash(r) for r in relations})
+        return {"written": written, "failed": {}}
+
+    async def delete_documents_batch(self, user_id: str, collection: str, doc_ids: list[str]) -> int:
+        """コレクションからドキュメントを一括削除"""
+        return len(self._write(user_id, collection, dict.fromkeys(doc_ids)))
+
+    async def list_page(
+        self,
+        user_id: str,
+        name: str,
+        page_size: int,
+        page_token: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """コレクションをドキュメントID順に1ページ分取得"""
+        return paginate_by_id(self._documents(user_id, name), page_size, page_token, fields)
+
+    # ========== 論文 ==========
+
+    async def add_paper(self, user_id: str, paper: dict[str, Any]) -> str:
+        """論文を追加（同じIDは上書き）"""
+        self._write(user_id, "papers", {paper["id"]: paper})
+        return paper["id"]
+
+    async def get_all_papers(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全論文を取得"""
+        return self._documents(user_id, "papers", fields)
+
+    async def delete_paper(self, user_id: str, paper_id: str) -> bool:
+        """論文を削除"""
+        self._write(user_id, "papers", {paper_id: None})
+        return True
+
+    # ========== 埋め込み・別名 ==========
+
+    async def get_all_embeddings(self, user_id: str) -> dict[str, dict[str, Any]]:
+        """ユーザーの全埋め込みレコードを取得（概念ID → レコード）"""
+        return dict(self._collection(user_id, "concept_embeddings"))
+
+    async def get_embeddings(self, user_id: str, concept_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """指定した概念の埋め込みレコードを取得（保存済みのものだけ）"""
+        records = self._collection(user_id, "concept_embeddings")
+        return {cid: records[cid] for cid in concept_ids if cid in records}
+
+    async def set_embeddings_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """埋め込みレコードを一括保存"""
+        return len(self._write(user_id, "concept_embeddings", records))
+
+    async def get_all_aliases(self, user_id: str) -> list[dict[str, Any]]:
+        """概念の別名レコードを全件取得"""
+        return self._documents(user_id, "concept_aliases")
+
+    async def set_aliases_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """別名レコードを一括保存（統合された概念ID → レコード）"""
+        return len(self._write(user_id, "concept_aliases", records))
+
+    # ========== ジョブ ==========
+
+    async def get_clear_job(self, user_id: str) -> dict[str, Any] | None:
+        """最後に開始したグラフ削除ジョブの状態"""
+        job = self._collection(user_id, "meta").get("clear_job")
+        return dict(job) if job is not None else None
+
+    async def set_clear_job(self, user_id: str, job: dict[str, Any]) -> None:
+        """グラフ削除ジョブの状態を保存"""
+        self._write(user_id, "meta", {"clear_job": dict(job)})
+
+    # ========== 関係の端点の移行 ==========
+
+    async def get_graph_version(self, user_id: str) -> int:
+        """グラフのバージョン番号"""
+        return self._versions.get(user_id, 0)
+
+    async def get_relation_ids_state(self, user_id: str) -> dict[str, Any] | None:
+        """関係の端点の移行状態"""
+        state = self._collection(user_id, "meta").get(RELATION_IDS_STATE)
+        return dict(state) if state is not None else None
+
+    async def set_relation_ids_state(self, user_id: str, state: dict[str, Any]) -> None:
+        """移行の結果を既存の状態にマージして保存"""
+        current = self._collection(user_id, "meta").get(RELATION_IDS_STATE, {})
+        self._write(user_id, "meta", {RELATION_IDS_STATE: {**current, **state}})
+
+    async def mark_unresolved_relations(self, user_id: str, count: int) -> None:
+        """端点を解決できない関係を書き込んだことを記録"""
+        current = self._collection(user_id, "meta").get(RELATION_IDS_STATE, {})
+        self._write(user_id, "meta", {
+            RELATION_IDS_STATE: {**current, "pending": current.get("pending", 0) + count},
+        })
+
+    def graph_cache_stats(self) -> dict[str, Any]:
+        """キャッシュは持たない"""
+        return {}
@@ -0,0 +1,114 @@
+"""一覧取得のページングとフィールド射影
+
+ページトークンは、直前のページの最後のドキュメントID（ID順の一覧）または
+次の開始位置（関連度順の検索結果）を base64url で包んだ不透明な文字列。
+Firestore とインメモリのどちらでも同じトークンを使う。
+"""
+
+import base64
+from typing import Any
+
+from api.db.graph_snapshot import UPDATED_AT_FIELD
+from api.db.hashing import CONTENT_HASH_FIELD
+
+# 1ページの最大件数
+MAX_PAGE_SIZE = 500
+
+# ストアが内部で付けるフィールド（fields で明示しない限り一覧の応答に含めない）
+INTERNAL_FIELDS = frozenset({CONTENT_HASH_FIELD, UPDATED_AT_FIELD})
+
+
+def encode_page_token(cursor: str) -> str:
+    """カーソルをページトークンに変換"""
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> str:
+    """ページトークンをカーソルに戻す（不正なトークンは ValueError）"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode("utf-8")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"不正なページトークンです: {token}") from e
+
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    """カンマ区切りのフィールド指定をリストに変換（id は常に含める）"""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return ["id"] + [name for name in names if name != "id"]
+
+
+def project(document: dict[str, Any], fields: list[str] | None) -> dict[str, Any]:
+    """指定したフィールドだけを残す（None なら全フィールド）
+
+    Firestore の select と同じく、"summary.title" のようなドット区切りのネストも扱う。
+    """
+    if fields is None:
+        return document
+    projected: dict[str, Any] = {}
+    for path in fields:
+        source, target = document, projected
+        *parents, leaf = path.split(".")
+        for key in parents:
+            if not isinstance(source.get(key), dict):
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return projected
+
+
+def without_internal_fields(
+    documents: list[dict[str, Any]],
+    fields: list[str] | None,
+) -> list[dict[str, Any]]:
+    """fields を指定しない一覧の応答から、内容ハッシュなど内部のフィールドを除く"""
+    if fields is not None:
+        return documents
+    return [{k: v for k, v in d.items() if k not in INTERNAL_FIELDS} for d in documents]
+
+
+def paginate_by_id(
+    documents: list[dict[str, Any]],
+    page_size: int,
+    page_token: str | None = None,
+    fields: list[str] | None = None,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """ID順の一覧を1ページ分切り出す（Firestore の order_by(__name__) と同じ順序）
+
+    Returns:
+        (ページ内のドキュメント, 次ページのトークン。最後のページなら None)
+    """
+    ordered = sorted(documents, key=lambda d: d["id"])
+    if page_token:
+        after = decode_page_token(page_token)
+        ordered = [d for d in ordered if d["id"] > after]
+    page = ordered[:page_size]
+    next_token = encode_page_token(page[-1]["id"]) if len(ordered) > page_size else None
+    return [project(d, fields) for d in page], next_token
+
+
+def paginate_ranked(
+    documents: list[dict[str, Any]],
+    page_size: int,
+    page_token: str | None = None,
+    fields: list[str] | None = None,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """関連度順などID順でない一覧を開始位置で1ページ分切り出す
+
+    Returns:
+        (ページ内のドキュメント, 次ページのトークン。最後のページなら None)
+    """
+    start = 0
+    if page_token:
+        cursor = decode_page_token(page_token)
+        if not cursor.isdigit():
+            raise ValueError(f"不正なページトークンです: {page_token}")
+        start = int(cursor)
+    end = start + page_size
+    next_token = encode_page_token(str(end)) if end < len(documents) else None
+    return [project(d, fields) for d in documents[start:end]], next_token
@@ -0,0 +1,434 @@
+"""メモリマップ型の埋め込みセグメントストア
+
+ユーザーごとのディレクトリに、固定幅 float32 行列（.f32）と ID テーブル（.json）
+の組をセグメントとして追記し、numpy.memmap で開いて検索する。
+複数の uvicorn ワーカーが同じページキャッシュを共有でき、読み込み時に
+ベクトルのデシリアライズは発生しない。
+
+    <root>/<sha256(user_id)>/manifest.json
+    <root>/<sha256(user_id)>/seg-00000001.f32
+    <root>/<sha256(user_id)>/seg-00000001.json
+    <root>/<sha256(user_id)>/projection.npz   （次元削減の射影、任意）
+    <root>/<sha256(user_id)>/ann.npz          （近似最近傍インデックス、任意）
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from api.db.vector_index import normalize_rows, top_k_indices, top_k_indices_rows
+
+# open() が compaction と重なってセグメントを開けなかったときに、マニフェストを読み直す回数
+OPEN_RETRIES = 5
+
+
+class SegmentView:
+    """memmap で開いたセグメント群の読み取り専用ビュー
+
+    VectorIndex と同じ検索インターフェースを持つ。同じIDが複数のセグメントに
+    ある場合は最新のセグメントが優先され、削除済みIDは除外される。
+    """
+
+    def __init__(self, version: int, dim: int | None, segments: list[dict[str, Any]]):
+        self.version = version
+        self.dim = dim
+        self._matrices: list[np.ndarray] = []
+        self._live: list[np.ndarray] = []
+        self._segment_ids: list[list[str]] = []
+        self._positions: dict[str, tuple[int, int]] = {}
+        self._hashes: dict[str, str] = {}
+
+        # 新しいセグメントから順に見て、最初に出現した行だけを有効にする
+        seen: set[str] = set()
+        tables = [segment["table"] for segment in segments]
+        for seg_no in reversed(range(len(segments))):
+            table = tables[seg_no]
+            seen.update(table.get("deleted", []))
+            live = np.zeros(len(table["ids"]), dtype=bool)
+            for row, (cid, content_hash) in enumerate(zip(table["ids"], table["hashes"])):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                live[row] = True
+                self._positions[cid] = (seg_no, row)
+                self._hashes[cid] = content_hash
+            self._live.append(live)
+        self._live.reverse()
+
+        # フィルタのマスクは全セグメントの行を連結した行番号で表す
+        self._offsets: list[int] = []
+        offset = 0
+        for segment, table in zip(segments, tables):
+            self._matrices.append(segment["matrix"])
+            self._segment_ids.append(table["ids"])
+            self._offsets.append(offset)
+            offset += len(table["ids"])
+        self._row_count = offset
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, concept_id: object) -> bool:
+        return concept_id in self._positions
+
+    @property
+    def ids(self) -> list[str]:
+        """有効な概念IDリスト（セグメント・行順）"""
+        return [
+            cid
+            for ids, live in zip(self._segment_ids, self._live)
+            for cid, alive in zip(ids, live)
+            if alive
+        ]
+
+    @property
+    def row_count(self) -> int:
+        """全セグメントの行数（削除済み行を含む、フィルタのマスクの長さ）"""
+        return self._row_count
+
+    def row_positions(self, ids: Iterable[str]) -> np.ndarray:
+        """概念IDの有効行の行番号（未登録のIDは除く）"""
+        positions = [
+            self._offsets[self._positions[cid][0]] + self._positions[cid][1]
+            for cid in ids
+            if cid in self._positions
+        ]
+        return np.asarray(positions, dtype=np.int64)
+
+    def _segment_masks(self, mask: np.ndarray | None) -> list[np.ndarray]:
+        """有効行マスクにフィルタのマスクを重ねたセグメントごとのマスク"""
+        if mask is None:
+            return self._live
+        return [
+            live & mask[offset:offset + len(live)]
+            for live, offset in zip(self._live, self._offsets)
+        ]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """有効行の正規化済みベクトル行列（ids と同じ順序、コピー）"""
+        blocks = [m[live] for m, live in zip(self._matrices, self._live) if live.any()]
+        if not blocks:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def content_hash(self, concept_id: str) -> str | None:
+        """登録時の内容ハッシュを取得"""
+        return self._hashes.get(concept_id)
+
+    def vector(self, concept_id: str) -> np.ndarray | None:
+        """概念の正規化済みベクトルを取得"""
+        pos = self._positions.get(concept_id)
+        if pos is None:
+            return None
+        seg_no, row = pos
+        return np.asarray(self._matrices[seg_no][row])
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        exclude: Iterable[str] = (),
+        rescore: Any = None,
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[str, float]]:
+        """全セグメントを走査して類似概念を検索
+
+        セグメントは常に全精度（float32）のため rescore は使わない。
+        mask は row_positions() の行番号に対応する検索対象行マスク。
+
+        Returns:
+            (概念ID, コサイン類似度) のリスト（類似度降順）
+        """
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0 or not self._positions:
+            return []
+        q = q / norm
+        excluded = set(exclude)
+
+        results: list[tuple[str, float]] = []
+        for matrix, live, ids in zip(self._matrices, self._segment_masks(mask), self._segment_ids):
+            if not live.any():
+                continue
+            scores = matrix @ q
+            scores[~live] = -np.inf
+            for i in top_k_indices(scores, top_k + len(excluded)):
+                if scores[i] >= threshold and ids[i] not in excluded:
+                    results.append((ids[i], float(scores[i])))
+
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    def search_batch(
+        self,
+        queries: np.ndarray | list[list[float]],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        rescore: Any = None,
+        mask: np.ndarray | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """複数クエリをセグメントごとの行列積でまとめて検索
+
+        Returns:
+            クエリごとの (概念ID, コサイン類似度) のリスト
+        """
+        rows = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        results: list[list[tuple[str, float]]] = [[] for _ in rows]
+        for matrix, live, ids in zip(self._matrices, self._segment_masks(mask), self._segment_ids):
+            if not live.any():
+                continue
+            scores = rows @ matrix.T
+            scores[:, ~live] = -np.inf
+            best = top_k_indices_rows(scores, top_k)
+            for q, (cols, row_scores) in enumerate(zip(best, np.take_along_axis(scores, best, axis=1))):
+                results[q].extend(
+                    (ids[i], float(score)) for i, score in zip(cols, row_scores) if score >= threshold
+                )
+
+        for hits in results:
+            hits.sort(key=lambda x: x[1], reverse=True)
+            del hits[top_k:]
+        return results
+
+
+class SegmentStore:
+    """ユーザーごとの埋め込みセグメントを管理するストア
+
+    Args:
+        root: セグメントを置くディレクトリ
+        compact_threshold: このセグメント数を超えたら compaction を推奨する
+    """
+
+    def __init__(self, root: str | Path, compact_threshold: int = 8):
+        self.root = Path(root)
+        self.compact_threshold = compact_threshold
+        self._views: dict[str, SegmentView] = {}
+
+    def _user_dir(self, user_id: str) -> Path:
+        # ユーザーIDはヘッダ由来のためハッシュ化してパスに使う
+        return self.root / hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+
+    @contextmanager
+    def _lock(self, user_id: str) -> Iterator[Path]:
+        """ワーカー間で書き込みを直列化するファイルロック"""
+        user_dir = self._user_dir(user_id)
+        user_dir.mkdir(parents=True, exist_ok=True)
+        with open(user_dir / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield user_dir
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_manifest(user_dir: Path) -> dict[str, Any]:
+        try:
+            with open(user_dir / "manifest.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "dim": None, "next_segment": 1, "segments": []}
+
+    @staticmethod
+    def _write_json(path: Path, data: dict[str, Any]) -> None:
+        """一時ファイル経由でアトミックに書き込む"""
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _write_segment(
+        self,
+        user_dir: Path,
+        manifest: dict[str, Any],
+        ids: list[str],
+        vectors: np.ndarray,
+        hashes: list[str],
+        deleted: list[str],
+    ) -> str:
+        """新しいセグメントを書き出し、名前を返す"""
+        name = f"seg-{manifest['next_segment']:08d}"
+        manifest["next_segment"] += 1
+        vectors.astype(np.float32).tofile(user_dir / f"{name}.f32")
+        self._write_json(user_dir / f"{name}.json", {"ids": ids, "hashes": hashes, "deleted": deleted})
+        return name
+
+    def append(
+        self,
+        user_id: str,
+        ids: list[str],
+        vectors: np.ndarray | list[np.ndarray],
+        hashes: list[str] | None = None,
+        deleted: Iterable[str] = (),
+    ) -> int:
+        """追加・更新・削除をひとつのセグメントとして追記
+
+        Returns:
+            現在のセグメント数
+        """
+        deleted = list(deleted)
+        if not ids and not deleted:
+            return len(self._read_manifest(self._user_dir(user_id))["segments"])
+
+        with self._lock(user_id) as user_dir:
+            manifest = self._read_manifest(user_dir)
+            rows = (
+                normalize_rows(np.asarray(vectors, dtype=np.float32))
+                if ids else np.empty((0, manifest["dim"] or 0), dtype=np.float32)
+            )
+            if ids:
+                if manifest["dim"] is None:
+                    manifest["dim"] = rows.shape[1]
+                elif rows.shape[1] != manifest["dim"]:
+                    raise ValueError(f"次元が一致しません: {rows.shape[1]} != {manifest['dim']}")
+
+            name = self._write_segment(
+                user_dir, manifest, ids, rows, hashes or [""] * len(ids), deleted
+            )
+            manifest["segments"].append(name)
+            manifest["version"] += 1
+            self._write_json(user_dir / "manifest.json", manifest)
+            return len(manifest["segments"])
+
+    def open(self, user_id: str) -> SegmentView:
+        """セグメントを memmap で開く（マニフェストが変わっていなければ再利用）
+
+        ビューのキャッシュを差し替えるため、イベントループのスレッドから呼ぶ。
+        スレッドプールで開く場合は load() と publish() に分けて呼ぶ。
+        """
+        return self.publish(user_id, self.load(user_id))
+
+    def load(self, user_id: str) -> SegmentView:
+        """最新のマニフェストのビューを開く（キャッシュは差し替えないのでスレッドから呼べる）
+
+        ロックは取らない。読んでいる間に compaction（このプロセスのスレッドや他のワーカー）が
+        古いセグメントを削除した場合は、マニフェストを読み直して新しいセグメントを開く。
+        """
+        user_dir = self._user_dir(user_id)
+        for attempt in range(OPEN_RETRIES):
+            manifest = self._read_manifest(user_dir)
+            view = self._views.get(user_id)
+            if view is not None and view.version == manifest["version"]:
+                return view
+            try:
+                return self._load_view(user_dir, manifest)
+            except FileNotFoundError:
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+
+    def publish(self, user_id: str, view: SegmentView) -> SegmentView:
+        """load() で開いたビューをキャッシュに登録（より新しいビューがあればそちらを返す）"""
+        current = self._views.get(user_id)
+        if current is not None and current.version >= view.version:
+            return current
+        self._views[user_id] = view
+        return view
+
+    def cached(self, user_id: str) -> SegmentView | None:
+        """最後に公開したビュー（マニフェストは読み直さない）"""
+        return self._views.get(user_id)
+
+    @staticmethod
+    def _load_view(user_dir: Path, manifest: dict[str, Any]) -> SegmentView:
+        """マニフェストのセグメントを memmap で開いたビュー（キャッシュしない）"""
+        segments = []
+        for name in manifest["segments"]:
+            with open(user_dir / f"{name}.json") as f:
+                table = json.load(f)
+            rows = len(table["ids"])
+            if rows:
+                matrix = np.memmap(
+                    user_dir / f"{name}.f32", dtype=np.float32, mode="r",
+                    shape=(rows, manifest["dim"]),
+                )
+            else:
+                matrix = np.empty((0, manifest["dim"] or 0), dtype=np.float32)
+            segments.append({"matrix": matrix, "table": table})
+        return SegmentView(manifest["version"], manifest["dim"], segments)
+
+    def needs_compaction(self, user_id: str) -> bool:
+        """セグメント数が閾値を超えているか"""
+        manifest = self._read_manifest(self._user_dir(user_id))
+        return len(manifest["segments"]) > self.compact_threshold
+
+    def compact(self, user_id: str) -> int:
+        """有効行だけを1つのセグメントにまとめ直す
+
+        古いファイルは削除するが、既に memmap しているリーダーは
+        POSIX のセマンティクスにより引き続き読み取れる。スレッドプールから呼べるよう
+        ビューのキャッシュには触れない（呼び出し側が load() と publish() で開き直す）。
+
+        Returns:
+            compaction 後の行数
+        """
+        with self._lock(user_id) as user_dir:
+            manifest = self._read_manifest(user_dir)
+            old_segments = list(manifest["segments"])
+            view = self._load_view(user_dir, manifest)
+            if len(old_segments) <= 1:
+                return len(view)
+
+            ids = view.ids
+            name = self._write_segment(
+                user_dir, manifest, ids, view.matrix,
+                [view.content_hash(cid) or "" for cid in ids], [],
+            )
+            manifest["segments"] = [name]
+            manifest["version"] += 1
+            self._write_json(user_dir / "manifest.json", manifest)
+
+            for old in old_segments:
+                for suffix in (".f32", ".json"):
+                    (user_dir / f"{old}{suffix}").unlink(missing_ok=True)
+            return len(ids)
+
+    def save_projection(self, user_id: str, data: bytes) -> None:
+        """次元削減の射影を保存（他のワーカーも同じ射影でクエリを変換する）"""
+        with self._lock(user_id) as user_dir:
+            tmp = user_dir / "projection.npz.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, user_dir / "projection.npz")
+
+    def load_projection(self, user_id: str) -> bytes | None:
+        """保存済みの射影を読み込む"""
+        try:
+            return (self._user_dir(user_id) / "projection.npz").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def save_ann_index(self, user_id: str, data: bytes) -> None:
+        """近似最近傍インデックスを保存（他のワーカーや再起動後は学習せずに読み込む）"""
+        with self._lock(user_id) as user_dir:
+            tmp = user_dir / "ann.npz.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, user_dir / "ann.npz")
+
+    def load_ann_index(self, user_id: str) -> bytes | None:
+        """保存済みの近似最近傍インデックスを読み込む"""
+        try:
+            return (self._user_dir(user_id) / "ann.npz").read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def clear(self, user_id: str) -> None:
+        """ユーザーの全セグメントと射影・近似最近傍インデックスを削除"""
+        with self._lock(user_id) as user_dir:
+            manifest = self._read_manifest(user_dir)
+            (user_dir / "projection.npz").unlink(missing_ok=True)
+            (user_dir / "ann.npz").unlink(missing_ok=True)
+            for name in manifest["segments"]:
+                for suffix in (".f32", ".json"):
+                    (user_dir / f"{name}{suffix}").unlink(missing_ok=True)
+            manifest["segments"] = []
+            manifest["dim"] = None
+            manifest["version"] += 1
+            self._write_json(user_dir / "manifest.json", manifest)
+        self._views.pop(user_id, None)
@@ -0,0 +1,567 @@
+"""SQLite のグラフストア
+
+クラウドサービスなしでグラフを永続化する（セルフホスト環境やベンチマーク向け）。
+
+- WAL モードで、書き込み中も他の接続から読める
+- 索引: 概念・関係性の (user_id, id)、関係性の端点の概念ID (user_id, source_id) /
+  (user_id, target_id)、概念の (user_id, source_paper)
+- 書き込みは準備済みの文を executemany でまとめて1トランザクションで実行する
+
+sqlite3 の呼び出しはスレッドプールで実行し、イベントループを止めない。接続はスレッドごとに持つ。
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from api.db.adjacency import (
+    RELATION_IDS_STATE,
+    SOURCE_ID_FIELD,
+    TARGET_ID_FIELD,
+    count_unresolved,
+    graph_concepts_after_sync,
+    resolve_relations,
+)
+from api.db.hashing import (
+    CONCEPT_CONTENT_FIELDS,
+    CONTENT_HASH_FIELD,
+    plan_sync,
+    summarize_sync,
+    with_content_hash,
+)
+from api.db.pagination import decode_page_token, encode_page_token, project
+from api.db.store import ProgressCallback
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS concepts (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    source_paper TEXT,
+    content_hash TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS relations (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    source_id TEXT,
+    target_id TEXT,
+    content_hash TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS concept_embeddings (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    hash TEXT,
+    model TEXT,
+    dtype TEXT,
+    scale REAL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    user_id TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, collection, id)
+);
+"""
+
+# 索引（古いデータベースに列を追加してから作る）
+INDEXES = """
+CREATE INDEX IF NOT EXISTS concepts_source_paper ON concepts (user_id, source_paper);
+DROP INDEX IF EXISTS relations_source;
+DROP INDEX IF EXISTS relations_target;
+CREATE INDEX IF NOT EXISTS relations_source_id ON relations (user_id, source_id);
+CREATE INDEX IF NOT EXISTS relations_target_id ON relations (user_id, target_id);
+"""
+
+# 古いデータベースに追加する列（テーブル → 列と型）
+ADDED_COLUMNS = {
+    "relations": {"source_id": "TEXT", "target_id": "TEXT"},
+}
+
+# get_neighbors() / get_embeddings() の IN 句に一度に渡すIDの件数
+IN_QUERY_CHUNK = 500
+
+# 専用のテーブルを持つコレクション（それ以外は documents テーブルに JSON で保存）
+TABLES = {
+    "concepts": "concepts",
+    "relations": "relations",
+    "concept_embeddings": "concept_embeddings",
+}
+
+UPSERT_CONCEPT = """
+INSERT INTO concepts (user_id, id, source_paper, content_hash, data) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id, id) DO UPDATE SET
+    source_paper = excluded.source_paper, content_hash = excluded.content_hash, data = excluded.data
+"""
+
+UPSERT_RELATION = """
+INSERT INTO relations (user_id, id, source, target, source_id, target_id, content_hash, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, id) DO UPDATE SET
+    source = excluded.source, target = excluded.target,
+    source_id = excluded.source_id, target_id = excluded.target_id,
+    content_hash = excluded.content_hash, data = excluded.data
+"""
+
+UPSERT_EMBEDDING = """
+INSERT INTO concept_embeddings (user_id, id, hash, model, dtype, scale, vector) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, id) DO UPDATE SET
+    hash = excluded.hash, model = excluded.model, dtype = excluded.dtype,
+    scale = excluded.scale, vector = excluded.vector
+"""
+
+UPSERT_DOCUMENT = """
+INSERT INTO documents (user_id, collection, id, data) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id, collection, id) DO UPDATE SET data = excluded.data
+"""
+
+# 概念・関係性を書き込んだらグラフのバージョン（documents テーブルの meta/graph）を上げる
+BUMP_GRAPH_VERSION = """
+INSERT INTO documents (user_id, collection, id, data) VALUES (?, 'meta', 'graph', '{"version": 1}')
+ON CONFLICT (user_id, collection, id) DO UPDATE SET
+    data = json_set(data, '$.version', json_extract(data, '$.version') + 1)
+"""
+
+# clear_graph() で削除するコレクション
+GRAPH_DATA_COLLECTIONS = ("concepts", "relations", "concept_embeddings", "concept_aliases")
+
+
+def _dumps(document: dict[str, Any]) -> str:
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SQLiteGraphStore:
+    """SQLite ファイルに保存するグラフストア（GraphStore の実装）
+
+    Args:
+        path: データベースファイルのパス
+    """
+
+    name = "sqlite"
+    durable = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        conn.executescript(INDEXES)
+
+    def _connection(self) -> sqlite3.Connection:
+        """このスレッドの接続を取得（初回は WAL モードで開く）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # トランザクションは _call() で明示的に開始する
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _call(self, fn: Callable[..., Any], write: bool, *args: Any) -> Any:
+        """1トランザクションで fn(conn, *args) を実行
+
+        書き込みは BEGIN IMMEDIATE で最初に書き込みロックを取り、読み込みから
+        書き込みへの昇格で SQLITE_BUSY になるのを避ける。
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def _read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(self._call, fn, False, *args)
+
+    async def _write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(self._call, fn, True, *args)
+
+    # ---------- 行の読み書き（スレッドプール内で実行） ----------
+
+    @staticmethod
+    def _select_documents(conn: sqlite3.Connection, user_id: str, name: str) -> list[dict[str, Any]]:
+        """コレクションの全ドキュメント（追加順）"""
+        if name in ("concepts", "relations"):
+            rows = conn.execute(f"SELECT data FROM {name} WHERE user_id = ? ORDER BY rowid", (user_id,))
+        else:
+            rows = conn.execute(
+                "SELECT data FROM documents WHERE user_id = ? AND collection = ? ORDER BY rowid",
+                (user_id, name),
+            )
+        return [json.loads(data) for (data,) in rows]
+
+    @staticmethod
+    def _select_meta(conn: sqlite3.Connection, user_id: str, doc_id: str) -> dict[str, Any] | None:
+        """meta のドキュメント（なければ None）"""
+        row = conn.execute(
+            "SELECT data FROM documents WHERE user_id = ? AND collection = 'meta' AND id = ?",
+            (user_id, doc_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, user_id: str, name: str, documents: dict[str, dict[str, Any]]) -> None:
+        """ドキュメントを一括で追加・上書き"""
+        if not documents:
+            return
+        if name in ("concepts", "relations"):
+            conn.execute(BUMP_GRAPH_VERSION, (user_id,))
+        if name == "concepts":
+            conn.executemany(UPSERT_CONCEPT, [
+                (user_id, doc_id, d.get("source_paper"), d.get(CONTENT_HASH_FIELD), _dumps(d))
+                for doc_id, d in documents.items()
+            ])
+        elif name == "relations":
+            conn.executemany(UPSERT_RELATION, [
+                (
+                    user_id, doc_id, d["source"], d["target"], d.get(SOURCE_ID_FIELD), d.get(TARGET_ID_FIELD),
+                    d.get(CONTENT_HASH_FIELD), _dumps(d),
+                )
+                for doc_id, d in documents.items()
+            ])
+        elif name == "concept_embeddings":
+            conn.executemany(UPSERT_EMBEDDING, [
+                (user_id, doc_id, r.get("hash"), r.get("model"), r.get("dtype"), r.get("scale"), r["values"])
+                for doc_id, r in documents.items()
+            ])
+        else:
+            conn.executemany(UPSERT_DOCUMENT, [
+                (user_id, name, doc_id, _dumps(d)) for doc_id, d in documents.items()
+            ])
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, user_id: str, name: str, doc_ids: list[str]) -> int:
+        """ドキュメントを一括削除（削除した件数を返す）"""
+        if not doc_ids:
+            return 0
+        before = conn.total_changes
+        if name in TABLES:
+            conn.executemany(
+                f"DELETE FROM {TABLES[name]} WHERE user_id = ? AND id = ?",
+                [(user_id, doc_id) for doc_id in doc_ids],
+            )
+        else:
+            conn.executemany(
+                "DELETE FROM documents WHERE user_id = ? AND collection = ? AND id = ?",
+                [(user_id, name, doc_id) for doc_id in doc_ids],
+            )
+        deleted = conn.total_changes - before
+        if deleted and name in ("concepts", "relations"):
+            conn.execute(BUMP_GRAPH_VERSION, (user_id,))
+        return deleted
+
+    @staticmethod
+    def _clear(conn: sqlite3.Connection, user_id: str, name: str) -> int:
+        """コレクションの全ドキュメントを削除（削除した件数を返す）"""
+        if name in ("concepts", "relations"):
+            conn.execute(BUMP_GRAPH_VERSION, (user_id,))
+        if name in TABLES:
+            return conn.execute(f"DELETE FROM {TABLES[name]} WHERE user_id = ?", (user_id,)).rowcount
+        return conn.execute(
+            "DELETE FROM documents WHERE user_id = ? AND collection = ?", (user_id, name)
+        ).rowcount
+
+    # ========== グラフ ==========
+
+    async def get_graph(self, user_id: str) -> dict[str, Any]:
+        """ユーザーのナレッジグラフ全体を取得（概念と関係性を同じスナップショットから読む）"""
+
+        def read(conn: sqlite3.Connection) -> dict[str, Any]:
+            return {
+                "concepts": self._select_documents(conn, user_id, "concepts"),
+                "relations": self._select_documents(conn, user_id, "relations"),
+            }
+
+        return await self._read(read)
+
+    async def sync_graph(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        relations: list[dict[str, Any]],
+        delete_missing: bool = False,
+    ) -> dict[str, Any]:
+        """フロントエンドからグラフを同期（戻り値は FirestoreClient.sync_graph() と同じ）
+
+        既存の行は内容ハッシュと埋め込みに使うフィールドだけを読み、差分を1トランザクションで書く。
+        関係の端点は同期後の概念のIDに解決する。
+        """
+        concept_columns = ", ".join(f"json_extract(data, '$.{field}')" for field in CONCEPT_CONTENT_FIELDS)
+
+        def sync(conn: sqlite3.Connection) -> dict[str, Any]:
+            existing_concepts = {
+                row[0]: {CONTENT_HASH_FIELD: row[1], **dict(zip(CONCEPT_CONTENT_FIELDS, row[2:]))}
+                for row in conn.execute(
+                    f"SELECT id, content_hash, {concept_columns} FROM concepts WHERE user_id = ?", (user_id,)
+                )
+            }
+            existing_relations = {
+                doc_id: {CONTENT_HASH_FIELD: content_hash}
+                for doc_id, content_hash in conn.execute(
+                    "SELECT id, content_hash FROM relations WHERE user_id = ?", (user_id,)
+                )
+            }
+
+            results = []
+            for name, existing, documents in (
+                ("concepts", existing_concepts, concepts),
+                ("relations", existing_relations, relations),
+            ):
+                if name == "relations":
+                    documents = resolve_relations(
+                        documents, graph_concepts_after_sync(existing_concepts, concepts, results[0]["deleted"])
+                    )
+                    unresolved = count_unresolved(documents)
+                diff, writes = plan_sync(existing, documents, delete_missing)
+                self._upsert(conn, user_id, name, {k: v for k, v in writes.items() if v is not None})
+                self._delete(conn, user_id, name, diff["deleted"])
+                results.append({**diff, "existing": existing, "failed": {}})
+
+            self._delete(conn, user_id, "concept_embeddings", results[0]["deleted"])
+            if unresolved:
+                self._update_relation_ids_state(conn, user_id, {}, pending=unresolved)
+            return summarize_sync(results[0], results[1], concepts)
+
+        return await self._write(sync)
+
+    async def clear_graph(self, user_id: str, progress: ProgressCallback | None = None) -> dict[str, int]:
+        """ユーザーのナレッジグラフをクリア（1トランザクションで削除）"""
+
+        def clear(conn: sqlite3.Connection) -> dict[str, int]:
+            return {name: self._clear(conn, user_id, name) for name in GRAPH_DATA_COLLECTIONS}
+
+        deleted = await self._write(clear)
+        if progress:
+            for name, count in deleted.items():
+                progress(name, count)
+        return {
+            "concepts_deleted": deleted["concepts"],
+            "relations_deleted": deleted["relations"],
+        }
+
+    # ========== 概念・関係性 ==========
+
+    async def get_all_concepts(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全概念を取得"""
+        concepts = await self._read(self._select_documents, user_id, "concepts")
+        return [project(c, fields) for c in concepts]
+
+    async def get_concept(self, user_id: str, concept_id: str) -> dict[str, Any] | None:
+        """概念を取得"""
+
+        def read(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            row = conn.execute(
+                "SELECT data FROM concepts WHERE user_id = ? AND id = ?", (user_id, concept_id)
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+
+        return await self._read(read)
+
+    async def get_all_relations(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全関係性を取得"""
+        relations = await self._read(self._select_documents, user_id, "relations")
+        return [project(r, fields) for r in relations]
+
+    async def get_neighbors(self, user_id: str, concept_ids: list[str]) -> dict[str, list[str]]:
+        """概念ごとの隣接する概念ID（端点の概念IDの索引だけを引く）"""
+
+        def read(conn: sqlite3.Connection) -> dict[str, list[str]]:
+            neighbors: dict[str, dict[str, None]] = {concept_id: {} for concept_id in concept_ids}
+            for start in range(0, len(concept_ids), IN_QUERY_CHUNK):
+                chunk = concept_ids[start:start + IN_QUERY_CHUNK]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT source_id, target_id FROM relations WHERE user_id = ? AND source_id IN ({placeholders}) "
+                    f"UNION ALL "
+                    f"SELECT target_id, source_id FROM relations WHERE user_id = ? AND target_id IN ({placeholders})",
+                    (user_id, *chunk, user_id, *chunk),
+                )
+                for concept_id, neighbor in rows:
+                    if neighbor is not None:
+                        neighbors[concept_id][neighbor] = None
+            return {concept_id: list(ids) for concept_id, ids in neighbors.items()}
+
+        return await self._read(read)
+
+    async def add_concepts_batch(self, user_id: str, concepts: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の概念を一括追加（内容ハッシュを付与）"""
+        documents = {c["id"]: with_content_hash(c) for c in concepts}
+        await self._write(self._upsert, user_id, "concepts", documents)
+        return {"written": list(documents), "failed": {}}
+
+    async def add_relations_batch(self, user_id: str, relations: list[dict[str, Any]]) -> dict[str, Any]:
+        """複数の関係性を一括追加（内容ハッシュを付与）"""
+        documents = {r["id"]: with_content_hash(r) for r in relations}
+        await self._write(self._upsert, user_id, "relations", documents)
+        return {"written": list(documents), "failed": {}}
+
+    async def delete_documents_batch(self, user_id: str, collection: str, doc_ids: list[str]) -> int:
+        """コレクションからドキュメントを一括削除"""
+        return await self._write(self._delete, user_id, collection, doc_ids)
+
+    async def list_page(
+        self,
+        user_id: str,
+        name: str,
+        page_size: int,
+        page_token: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """コレクションをドキュメントID順に1ページ分取得（主キーの索引で直前のIDから再開）"""
+        after = decode_page_token(page_token) if page_token else ""
+
+        def read(conn: sqlite3.Connection) -> list[tuple[str, str]]:
+            if name in ("concepts", "relations"):
+                return conn.execute(
+                    f"SELECT id, data FROM {name} WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (user_id, after, page_size + 1),
+                ).fetchall()
+            return conn.execute(
+                "SELECT id, data FROM documents WHERE user_id = ? AND collection = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (user_id, name, after, page_size + 1),
+            ).fetchall()
+
+        rows = await self._read(read)
+        next_token = encode_page_token(rows[page_size - 1][0]) if len(rows) > page_size else None
+        return [project(json.loads(data), fields) for _, data in rows[:page_size]], next_token
+
+    # ========== 論文 ==========
+
+    async def add_paper(self, user_id: str, paper: dict[str, Any]) -> str:
+        """論文を追加（同じIDは上書き）"""
+        await self._write(self._upsert, user_id, "papers", {paper["id"]: paper})
+        return paper["id"]
+
+    async def get_all_papers(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        """ユーザーの全論文を取得"""
+        papers = await self._read(self._select_documents, user_id, "papers")
+        return [project(p, fields) for p in papers]
+
+    async def delete_paper(self, user_id: str, paper_id: str) -> bool:
+        """論文を削除"""
+        await self._write(self._delete, user_id, "papers", [paper_id])
+        return True
+
+    # ========== 埋め込み・別名 ==========
+
+    async def get_all_embeddings(self, user_id: str) -> dict[str, dict[str, Any]]:
+        """ユーザーの全埋め込みレコードを取得（概念ID → レコード）"""
+
+        def read(conn: sqlite3.Connection) -> dict[str, dict[str, Any]]:
+            rows = conn.execute(
+                "SELECT id, hash, model, dtype, scale, vector FROM concept_embeddings WHERE user_id = ?",
+                (user_id,),
+            )
+            return self._embedding_records(rows)
+
+        return await self._read(read)
+
+    async def get_embeddings(self, user_id: str, concept_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """指定した概念の埋め込みレコードを主キーで取得（保存済みのものだけ）"""
+
+        def read(conn: sqlite3.Connection) -> dict[str, dict[str, Any]]:
+            records: dict[str, dict[str, Any]] = {}
+            for start in range(0, len(concept_ids), IN_QUERY_CHUNK):
+                chunk = concept_ids[start:start + IN_QUERY_CHUNK]
+                rows = conn.execute(
+                    "SELECT id, hash, model, dtype, scale, vector FROM concept_embeddings "
+                    f"WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))})",
+                    (user_id, *chunk),
+                )
+                records.update(self._embedding_records(rows))
+            return records
+
+        return await self._read(read)
+
+    @staticmethod
+    def _embedding_records(rows: sqlite3.Cursor) -> dict[str, dict[str, Any]]:
+        """concept_embeddings の行を概念ID → レコードに変換"""
+        return {
+            doc_id: {"hash": hash_, "model": model, "dtype": dtype, "scale": scale, "values": vector}
+            for doc_id, hash_, model, dtype, scale, vector in rows
+        }
+
+    async def set_embeddings_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """埋め込みレコードを一括保存"""
+        await self._write(self._upsert, user_id, "concept_embeddings", records)
+        return len(records)
+
+    async def get_all_aliases(self, user_id: str) -> list[dict[str, Any]]:
+        """概念の別名レコードを全件取得"""
+        return await self._read(self._select_documents, user_id, "concept_aliases")
+
+    async def set_aliases_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        """別名レコードを一括保存（統合された概念ID → レコード）"""
+        await self._write(self._upsert, user_id, "concept_aliases", records)
+        return len(records)
+
+    # ========== ジョブ ==========
+
+    async def get_clear_job(self, user_id: str) -> dict[str, Any] | None:
+        """最後に開始したグラフ削除ジョブの状態（documents テーブルの meta に保存）"""
+
+        return await self._read(self._select_meta, user_id, "clear_job")
+
+    async def set_clear_job(self, user_id: str, job: dict[str, Any]) -> None:
+        """グラフ削除ジョブの状態を保存"""
+        await self._write(self._upsert, user_id, "meta", {"clear_job": job})
+
+    # ========== 関係の端点の移行 ==========
+
+    async def get_graph_version(self, user_id: str) -> int:
+        """グラフのバージョン番号（documents テーブルの meta/graph）"""
+        graph = await self._read(self._select_meta, user_id, "graph")
+        return graph["version"] if graph else 0
+
+    async def get_relation_ids_state(self, user_id: str) -> dict[str, Any] | None:
+        """関係の端点の移行状態"""
+        return await self._read(self._select_meta, user_id, RELATION_IDS_STATE)
+
+    def _update_relation_ids_state(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str,
+        state: dict[str, Any],
+        pending: int = 0,
+    ) -> None:
+        """移行状態に state をマージし、pending に加算して保存（書き込みトランザクション内で呼ぶ）"""
+        current = self._select_meta(conn, user_id, RELATION_IDS_STATE) or {}
+        merged = {**current, **state}
+        if pending:
+            merged["pending"] = current.get("pending", 0) + pending
+        self._upsert(conn, user_id, "meta", {RELATION_IDS_STATE: merged})
+
+    async def set_relation_ids_state(self, user_id: str, state: dict[str, Any]) -> None:
+        """移行の結果を既存の状態にマージして保存"""
+        await self._write(self._update_relation_ids_state, user_id, state)
+
+    async def mark_unresolved_relations(self, user_id: str, count: int) -> None:
+        """端点を解決できない関係を書き込んだことを記録"""
+        await self._write(self._update_relation_ids_state, user_id, {}, count)
+
+    def graph_cache_stats(self) -> dict[str, Any]:
+        """キャッシュは持たない（ページキャッシュは SQLite に任せる）"""
+        return {}
@@ -0,0 +1,189 @@
+"""グラフストア（ナレッジグラフの保存先）の共通インターフェース
+
+ルーターは GraphStore プロトコルのメソッドだけを使い、保存先は GRAPH_STORE で選ぶ。
+
+- firestore: Cloud Firestore（GOOGLE_CLOUD_PROJECT が必要）
+- sqlite: ローカルの SQLite ファイル（セルフホスト環境やベンチマーク向け）
+- memory: プロセス内の辞書（再起動で消える）
+
+未設定の場合は GOOGLE_CLOUD_PROJECT があれば firestore、なければ memory を使う。
+"""
+
+import os
+from collections.abc import Callable
+from typing import Any, Protocol, runtime_checkable
+
+# グラフストアの種類（firestore / sqlite / memory、空なら自動選択）
+GRAPH_STORE = os.getenv("GRAPH_STORE", "")
+
+# SQLite のデータベースファイル
+GRAPH_STORE_PATH = os.getenv("GRAPH_STORE_PATH", "paperforge.db")
+
+# 削除の進捗を (コレクション名, 累計削除件数) で受け取るコールバック
+ProgressCallback = Callable[[str, int], None]
+
+
+@runtime_checkable
+class GraphStore(Protocol):
+    """ナレッジグラフ・論文・埋め込み・別名を保存するストア
+
+    コレクション名は Firestore のサブコレクション名（concepts / relations / papers /
+    concept_embeddings / concept_aliases）に揃える。
+    """
+
+    name: str  # レスポンスの storage に返す名前
+    durable: bool  # 再起動後もデータが残るか
+
+    # ---------- グラフ ----------
+
+    async def get_graph(self, user_id: str) -> dict[str, Any]:
+        """概念と関係性の全件（{"concepts": [...], "relations": [...]}）"""
+        ...
+
+    async def sync_graph(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        relations: list[dict[str, Any]],
+        delete_missing: bool = False,
+    ) -> dict[str, Any]:
+        """内容ハッシュが変わったものだけを書き込む（戻り値は hashing.summarize_sync() の形式）"""
+        ...
+
+    async def clear_graph(self, user_id: str, progress: ProgressCallback | None = None) -> dict[str, int]:
+        """概念・関係性・埋め込み・別名を削除（concepts_deleted / relations_deleted を返す）"""
+        ...
+
+    # ---------- 概念・関係性 ----------
+
+    async def get_all_concepts(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        ...
+
+    async def get_concept(self, user_id: str, concept_id: str) -> dict[str, Any] | None:
+        ...
+
+    async def get_all_relations(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        ...
+
+    async def get_neighbors(self, user_id: str, concept_ids: list[str]) -> dict[str, list[str]]:
+        """概念ID → 隣接する概念ID（関係の source_id / target_id をたどる、次数に比例）"""
+        ...
+
+    async def add_concepts_batch(self, user_id: str, concepts: list[dict[str, Any]]) -> dict[str, Any]:
+        """書き込めたID（written）と失敗したID → エラー（failed）を返す"""
+        ...
+
+    async def add_relations_batch(self, user_id: str, relations: list[dict[str, Any]]) -> dict[str, Any]:
+        """書き込めたID（written）と失敗したID → エラー（failed）を返す"""
+        ...
+
+    async def delete_documents_batch(self, user_id: str, collection: str, doc_ids: list[str]) -> int:
+        """コレクションからドキュメントを一括削除（削除できた件数を返す）"""
+        ...
+
+    async def list_page(
+        self,
+        user_id: str,
+        name: str,
+        page_size: int,
+        page_token: str | None = None,
+        fields: list[str] | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """コレクションをドキュメントID順に1ページ分取得（pagination のトークンを使う）"""
+        ...
+
+    # ---------- 論文 ----------
+
+    async def add_paper(self, user_id: str, paper: dict[str, Any]) -> str:
+        ...
+
+    async def get_all_papers(self, user_id: str, fields: list[str] | None = None) -> list[dict[str, Any]]:
+        ...
+
+    async def delete_paper(self, user_id: str, paper_id: str) -> bool:
+        ...
+
+    # ---------- 埋め込み・別名 ----------
+
+    async def get_all_embeddings(self, user_id: str) -> dict[str, dict[str, Any]]:
+        ...
+
+    async def get_embeddings(self, user_id: str, concept_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """指定した概念の埋め込みレコードだけを読む（保存されていないIDは含まない）"""
+        ...
+
+    async def set_embeddings_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        ...
+
+    async def get_all_aliases(self, user_id: str) -> list[dict[str, Any]]:
+        ...
+
+    async def set_aliases_batch(self, user_id: str, records: dict[str, dict[str, Any]]) -> int:
+        ...
+
+    # ---------- ジョブ ----------
+
+    async def get_clear_job(self, user_id: str) -> dict[str, Any] | None:
+        """最後に開始したグラフ削除ジョブの状態（meta に保存、なければ None）"""
+        ...
+
+    async def set_clear_job(self, user_id: str, job: dict[str, Any]) -> None:
+        """グラフ削除ジョブの状態を保存（ユーザーごとに最新の1件だけを持つ）"""
+        ...
+
+    # ---------- 関係の端点の移行 ----------
+
+    async def get_graph_version(self, user_id: str) -> int:
+        """グラフのバージョン番号（概念・関係性を書き込むたびに増える）"""
+        ...
+
+    async def get_relation_ids_state(self, user_id: str) -> dict[str, Any] | None:
+        """関係の端点の移行状態（meta に保存、未移行なら None。adjacency.RELATION_IDS_STATE）"""
+        ...
+
+    async def set_relation_ids_state(self, user_id: str, state: dict[str, Any]) -> None:
+        """移行の結果を既存の状態にマージして保存（pending は書き込み側が増やすので上書きしない）"""
+        ...
+
+    async def mark_unresolved_relations(self, user_id: str, count: int) -> None:
+        """端点を解決できない関係を書き込んだことを記録（次の近傍探索の前に移行し直す）"""
+        ...
+
+    # ---------- 統計 ----------
+
+    def graph_cache_stats(self) -> dict[str, Any]:
+        """キャッシュなどの統計（ないストアは空の dict）"""
+        ...
+
+
+# シングルトンインスタンス
+_graph_store: GraphStore | None = None
+
+
+def create_graph_store(backend: str = "", path: str = GRAPH_STORE_PATH) -> GraphStore:
+    """種類を指定してグラフストアを作成
+
+    Args:
+        backend: firestore / sqlite / memory（空なら GOOGLE_CLOUD_PROJECT の有無で選ぶ）
+        path: SQLite のデータベースファイル
+    """
+    backend = backend or ("firestore" if os.getenv("GOOGLE_CLOUD_PROJECT") else "memory")
+    if backend == "firestore":
+        from api.db.firestore import get_firestore_client
+        return get_firestore_client()
+    if backend == "sqlite":
+        from api.db.sqlite_store import SQLiteGraphStore
+        return SQLiteGraphStore(path)
+    if backend == "memory":
+        from api.db.memory_store import MemoryGraphStore
+        return MemoryGraphStore()
+    raise ValueError(f"未対応のグラフストアです: {backend}")
+
+
+def get_graph_store() -> GraphStore:
+    """GRAPH_STORE で選んだグラフストアのシングルトンを取得"""
+    global _graph_store
+    if _graph_store is None:
+        _graph_store = create_graph_store(GRAPH_STORE)
+        print(f"Graph store: {_graph_store.name}")
+    return _graph_store
@@ -0,0 +1,393 @@
+"""ユーザー単位のベクトルインデックス
+
+正規化済みベクトル行列（float32 / float16 / int8）と概念IDの配列を保持し、
+行列ベクトル積 + argpartition で top-k 類似検索を行う
+"""
+
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """各行を L2 正規化（ゼロベクトルはそのまま）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """スコア上位 top_k 件のインデックスを降順で返す"""
+    if top_k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < scores.size:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def top_k_indices_rows(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """スコア行列（クエリ数 × N）の各行で上位 top_k 件の列番号を降順で返す"""
+    k = min(top_k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+# インデックスが対応する保存形式
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+def quantize_rows(rows: np.ndarray, storage: str) -> tuple[np.ndarray, np.ndarray]:
+    """float32 行列を保存形式に量子化
+
+    int8 は行ごとの対称スケール（値 ≈ code × scale）で量子化する。
+
+    Returns:
+        (量子化済み行列, 行ごとのスケール)
+    """
+    rows = np.asarray(rows, dtype=np.float32)
+    if storage == "int8":
+        scales = np.abs(rows).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(rows / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return rows.astype(STORAGE_DTYPES[storage]), np.ones(rows.shape[0], dtype=np.float32)
+
+
+def dequantize_rows(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """量子化済み行列を float32 に復元"""
+    rows = codes.astype(np.float32)
+    if codes.dtype == np.int8:
+        rows *= scales[:, None]
+    return rows
+
+
+class VectorIndex:
+    """正規化済みベクトルを連続した行列で保持するインデックス
+
+    Args:
+        dim: 次元数（省略時は最初の追加で決定）
+        storage: 行列の保存形式（float32 / float16 / int8）
+        rescore_factor: 量子化時に厳密再スコアリングへ回す候補倍率
+    """
+
+    # 量子化行列をスコアリングする際の1ブロックの行数
+    SCORE_BLOCK_ROWS = 65_536
+
+    def __init__(self, dim: int | None = None, storage: str = "float32", rescore_factor: int = 4):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"未対応の保存形式です: {storage}")
+        self.dim = dim
+        self.storage = storage
+        self.rescore_factor = rescore_factor
+        self._matrix = np.empty((0, dim or 0), dtype=STORAGE_DTYPES[storage])
+        self._scales = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._ids: list[str] = []
+        self._hashes: list[str] = []
+        self._positions: dict[str, int] = {}
+        # 行の並びが変わるたびに増える（フィルタのマスクの無効化に使う）
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, concept_id: object) -> bool:
+        return concept_id in self._positions
+
+    @property
+    def ids(self) -> list[str]:
+        """行順の概念IDリスト"""
+        return self._ids
+
+    @property
+    def row_count(self) -> int:
+        """検索対象の行数（フィルタのマスクの長さ）"""
+        return self._size
+
+    def row_positions(self, ids: Iterable[str]) -> np.ndarray:
+        """概念IDの行番号（未登録のIDは除く）"""
+        positions = [self._positions[cid] for cid in ids if cid in self._positions]
+        return np.asarray(positions, dtype=np.int64)
+
+    @property
+    def quantized(self) -> bool:
+        return self.storage != "float32"
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """正規化済みベクトル行列（float32、行数 = 登録数）"""
+        if not self.quantized:
+            return self._matrix[:self._size]
+        return dequantize_rows(self._matrix[:self._size], self._scales[:self._size])
+
+    @property
+    def nbytes(self) -> int:
+        """ベクトル行列が占めるバイト数"""
+        return self._matrix[:self._size].nbytes + (self._size * 4 if self.storage == "int8" else 0)
+
+    def content_hash(self, concept_id: str) -> str | None:
+        """登録時の内容ハッシュを取得"""
+        pos = self._positions.get(concept_id)
+        return self._hashes[pos] if pos is not None else None
+
+    def vector(self, concept_id: str) -> np.ndarray | None:
+        """概念の正規化済みベクトルを取得（float32）"""
+        pos = self._positions.get(concept_id)
+        if pos is None:
+            return None
+        return dequantize_rows(self._matrix[pos:pos + 1], self._scales[pos:pos + 1])[0]
+
+    def _reserve(self, size: int) -> None:
+        """行列の容量を確保（倍々で拡張して追加を償却 O(1) に）"""
+        if size <= self._matrix.shape[0]:
+            return
+        capacity = max(size, self._matrix.shape[0] * 2, 16)
+        grown = np.empty((capacity, self.dim), dtype=self._matrix.dtype)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        self._scales = scales
+
+    def add(
+        self,
+        ids: list[str],
+        vectors: np.ndarray | list[list[float]],
+        hashes: list[str] | None = None,
+    ) -> None:
+        """ベクトルを追加（既存IDは上書き）"""
+        if not ids:
+            return
+        rows = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = rows.shape[1]
+            self._matrix = np.empty((0, self.dim), dtype=self._matrix.dtype)
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"次元が一致しません: {rows.shape[1]} != {self.dim}")
+        hashes = hashes or [""] * len(ids)
+        codes, scales = quantize_rows(rows, self.storage)
+
+        self._reserve(self._size + len(ids))
+        for concept_id, code, scale, content_hash in zip(ids, codes, scales, hashes):
+            pos = self._positions.get(concept_id)
+            if pos is None:
+                pos = self._size
+                self._positions[concept_id] = pos
+                self._ids.append(concept_id)
+                self._hashes.append(content_hash)
+                self._size += 1
+                self.version += 1
+            else:
+                self._hashes[pos] = content_hash
+            self._matrix[pos] = code
+            self._scales[pos] = scale
+
+    def update(
+        self,
+        ids: list[str],
+        vectors: np.ndarray | list[list[float]],
+        hashes: list[str] | None = None,
+    ) -> None:
+        """登録済みベクトルを更新"""
+        missing = [cid for cid in ids if cid not in self._positions]
+        if missing:
+            raise KeyError(f"未登録の概念IDです: {missing[:5]}")
+        self.add(ids, vectors, hashes)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """ベクトルを削除（末尾行で穴を埋めて行列を連続に保つ）"""
+        removed = 0
+        for concept_id in ids:
+            pos = self._positions.pop(concept_id, None)
+            if pos is None:
+                continue
+            last = self._size - 1
+            if pos != last:
+                self._matrix[pos] = self._matrix[last]
+                self._scales[pos] = self._scales[last]
+                self._ids[pos] = self._ids[last]
+                self._hashes[pos] = self._hashes[last]
+                self._positions[self._ids[pos]] = pos
+            self._ids.pop()
+            self._hashes.pop()
+            self._size -= 1
+            self.version += 1
+            removed += 1
+        return removed
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """全行とのコサイン類似度（量子化時はブロック単位で復元して計算）
+
+        query が クエリ数 × D の行列なら、行数 × クエリ数 のスコア行列を返す。
+        """
+        if not self.quantized:
+            return self._matrix[:self._size] @ query.T
+        scores = np.empty((self._size,) + query.shape[:-1], dtype=np.float32)
+        for start in range(0, self._size, self.SCORE_BLOCK_ROWS):
+            end = min(start + self.SCORE_BLOCK_ROWS, self._size)
+            block = self._matrix[start:end].astype(np.float32) @ query.T
+            if self.storage == "int8":
+                block *= self._scales[start:end].reshape((-1,) + (1,) * (query.ndim - 1))
+            scores[start:end] = block
+        return scores
+
+    def search(
+        self,
+        query: np.ndarray | list[float],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        exclude: Iterable[str] = (),
+        rescore: Callable[[list[str]], list[np.ndarray | None]] | None = None,
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[str, float]]:
+        """クエリに類似した概念を検索
+
+        量子化時は top_k × rescore_factor 件の候補を選び、rescore で
+        全精度ベクトルが得られたものは厳密なコサイン類似度で並べ直す。
+
+        Args:
+            query: クエリベクトル
+            top_k: 返す結果の最大数
+            threshold: 類似度の閾値
+            exclude: 結果から除外する概念ID
+            rescore: 概念IDリストから全精度ベクトルを返す関数
+            mask: 検索対象の行を True とする真偽値マスク（top-k 選択の前に適用）
+
+        Returns:
+            (概念ID, コサイン類似度) のリスト（類似度降順）
+        """
+        if self._size == 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+        q = q / norm
+
+        scores = self._scores(q)
+        if mask is not None:
+            scores[~mask[:self._size]] = -np.inf
+        for concept_id in exclude:
+            pos = self._positions.get(concept_id)
+            if pos is not None:
+                scores[pos] = -np.inf
+
+        if not (self.quantized and rescore):
+            return [
+                (self._ids[i], float(scores[i]))
+                for i in top_k_indices(scores, top_k)
+                if scores[i] > -np.inf and scores[i] >= threshold
+            ]
+
+        # 量子化スコアで候補を絞り、全精度ベクトルで再スコアリング
+        candidates = [i for i in top_k_indices(scores, top_k * self.rescore_factor) if scores[i] > -np.inf]
+        candidate_ids = [self._ids[i] for i in candidates]
+        results = []
+        for i, cid, full in zip(candidates, candidate_ids, rescore(candidate_ids)):
+            if full is None:
+                score = float(scores[i])
+            else:
+                full = np.asarray(full, dtype=np.float32)
+                score = float(full @ q / (np.linalg.norm(full) or 1.0))
+            if score >= threshold:
+                results.append((cid, score))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    def search_batch(
+        self,
+        queries: np.ndarray | list[list[float]],
+        top_k: int = 5,
+        threshold: float = -1.0,
+        rescore: Callable[[list[str]], list[np.ndarray | None]] | None = None,
+        mask: np.ndarray | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """複数クエリを1回の行列積でまとめて検索
+
+        量子化インデックスで rescore を使う場合は、クエリごとに search() で再スコアリングする。
+        mask は全クエリに共通の検索対象行マスク。
+
+        Returns:
+            クエリごとの (概念ID, コサイン類似度) のリスト
+        """
+        rows = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if self._size == 0:
+            return [[] for _ in rows]
+        if self.quantized and rescore:
+            return [self.search(q, top_k, threshold, rescore=rescore, mask=mask) for q in rows]
+
+        scores = self._scores(rows).T
+        if mask is not None:
+            scores[:, ~mask[:self._size]] = -np.inf
+        best = top_k_indices_rows(scores, top_k)
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        return [
+            [
+                (self._ids[i], float(score))
+                for i, score in zip(cols, row_scores)
+                if score > -np.inf and score >= threshold
+            ]
+            for cols, row_scores in zip(best, best_scores)
+        ]
+
+
+def similar_pairs(
+    matrix: np.ndarray,
+    threshold: float,
+    top_k_per_row: int = 10,
+    exclude: dict[int, list[int]] | None = None,
+    block_size: int | None = None,
+) -> list[tuple[int, int, float]]:
+    """正規化済み行列の全ペアから類似ペアを抽出
+
+    類似度行列を行ブロック単位のタイルで計算し、メモリ使用量を
+    block_size × N に抑える。各行は上三角（i < j）のみを対象とし、
+    閾値以上かつ上位 top_k_per_row 件だけを残す。
+
+    Args:
+        matrix: 正規化済みベクトル行列（N × D）
+        threshold: 類似度の閾値
+        top_k_per_row: 1行あたりに残す候補数
+        exclude: 除外するペア（行番号 → 列番号リスト）
+        block_size: 1タイルの行数（省略時は約400万要素に収まるよう決定）
+
+    Returns:
+        (行番号, 列番号, 類似度) のリスト
+    """
+    n = matrix.shape[0]
+    if n < 2 or top_k_per_row <= 0:
+        return []
+    exclude = exclude or {}
+    block_size = block_size or max(1, 4_000_000 // n)
+    k = min(top_k_per_row, n - 1)
+
+    pairs: list[tuple[int, int, float]] = []
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        scores = matrix[start:end] @ matrix.T
+
+        # 下三角と対角、既存ペアをマスク
+        scores[np.arange(n)[None, :] <= np.arange(start, end)[:, None]] = -np.inf
+        for row in range(start, end):
+            cols = exclude.get(row)
+            if cols:
+                scores[row - start, cols] = -np.inf
+
+        # 行ごとに上位 k 件を抽出
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        rows, slots = np.nonzero(candidate_scores >= threshold)
+        pairs.extend(
+            (start + int(r), int(candidates[r, s]), float(candidate_scores[r, s]))
+            for r, s in zip(rows, slots)
+        )
+
+    return pairs
@@ -3,80 +3,281 @@
 概念のベクトル埋め込みと類似検索を提供
 """
 
+import asyncio
+import hashlib
 import os
-import numpy as np
+import random
+import time
+from functools import partial
 from typing import Any
 
+import numpy as np
+
+from api.db.ann_index import IVFFlatIndex
+from api.db.dim_reduction import (
+    PCA_MIN_SAMPLES,
+    REDUCTION_METHODS,
+    DimensionReducer,
+    evaluate_reduction_recall,
+)
+from api.db.embedding_backends import EmbeddingBackend, create_embedding_backend
+from api.db.embedding_cache import EmbeddingCache
+from api.db.filters import FilterBitmaps, FilterIndex
+from api.db.lexical_index import LexicalIndex
+from api.db.segments import SegmentStore, SegmentView
+from api.db.vector_index import (
+    VectorIndex,
+    dequantize_rows,
+    normalize_rows,
+    quantize_rows,
+    similar_pairs,
+    top_k_indices,
+)
+
+# 埋め込み1リクエストあたりに詰め込めるテキスト数の上限
+EMBEDDING_BATCH_SIZE = 100
+
+# 非同期埋め込みの同時リクエスト数と、レート制限時の再試行設定
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = 5
+EMBEDDING_BACKOFF_BASE = 1.0
+EMBEDDING_BACKOFF_MAX = 30.0
+
+# この概念数以上のユーザーは近似最近傍（IVF-Flat）で検索する
+ANN_MIN_SIZE = 20_000
+
+# 埋め込みキャッシュの上限（MB）
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+
+# 検索クエリの埋め込みキャッシュ（概念用とは別）の件数上限と有効期間（秒）
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+
+# 属性フィルタで使う保存済み論文（論文・年への所属）を読み直す間隔（秒）
+# 同じプロセスでの論文の保存・削除は即座に反映し、他のインスタンスでの変更はこの間隔で取り込む
+FILTER_PAPERS_TTL_SECONDS = float(os.getenv("FILTER_PAPERS_TTL_SECONDS", "300"))
+
+# ベクトルインデックスと永続ストアの保存形式（float32 / float16 / int8）
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+
+# ワーカー間で共有するメモリマップ型セグメントの保存先（未設定なら無効）
+EMBEDDING_SEGMENT_DIR = os.getenv("EMBEDDING_SEGMENT_DIR")
+
+# インデックスに保持する削減後の次元数（0 なら全次元）と削減方式（truncate / pca）
+EMBEDDING_REDUCED_DIM = int(os.getenv("EMBEDDING_REDUCED_DIM", "0"))
+EMBEDDING_REDUCTION = os.getenv("EMBEDDING_REDUCTION", "truncate")
+
+
+def embedding_hash(text: str, model: str) -> str:
+    """埋め込みテキストとモデル名から内容ハッシュを計算"""
+    return hashlib.sha256(f"{model}\n{text}".encode()).hexdigest()
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """429 / RESOURCE_EXHAUSTED によるエラーか判定"""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or "429" in message
+
+
+def encode_embedding(vector: np.ndarray, dtype: str = "float32") -> dict[str, Any]:
+    """埋め込みを永続ストア用のフィールドに変換（dtype に応じて量子化）"""
+    codes, scales = quantize_rows(np.asarray(vector, dtype=np.float32)[None, :], dtype)
+    return {"dtype": dtype, "values": codes.tobytes(), "scale": float(scales[0])}
+
+
+def decode_embedding(record: dict[str, Any]) -> np.ndarray:
+    """永続ストアのレコードから float32 の埋め込みを復元"""
+    dtype = record.get("dtype", "float32")
+    codes = np.frombuffer(record["values"], dtype=dtype)
+    scales = np.array([record.get("scale", 1.0)], dtype=np.float32)
+    return dequantize_rows(codes[None, :], scales)[0]
+
+
+def _durable(db: Any) -> bool:
+    """埋め込みを永続ストア（Firestore / SQLite）に保存するか
+
+    インメモリのストアや None の場合は、再スコアリング用に全精度のままクライアント内に保持する。
+    """
+    return db is not None and getattr(db, "durable", True)
+
 
 class VectorSearchClient:
-    """ベクトル検索クライアント"""
+    """ベクトル検索クライアント
 
-    def __init__(self):
-        self._client = None
-        self._embeddings_cache: dict[str, list[float]] = {}
+    Args:
+        backend: 埋め込みバックエンド（省略時は EMBEDDING_BACKEND の設定に従う）
+    """
 
-    def _get_client(self):
-        """Gemini/Vertex AI クライアントを取得"""
-        if self._client is None:
-            from google import genai
+    def __init__(self, backend: EmbeddingBackend | None = None):
+        self._backend = backend or create_embedding_backend()
+        self._embeddings_cache = EmbeddingCache(max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        # 検索クエリの埋め込み（連続した似たクエリの再埋め込みを避ける）
+        self._query_cache = EmbeddingCache(
+            max_entries=QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL_SECONDS
+        )
+        # 永続ストアを使わないときの埋め込みレコード（ユーザーID → 概念ID → レコード）
+        self._memory_embeddings: dict[str, dict[str, dict[str, Any]]] = {}
+        # ユーザーごとのベクトルインデックス
+        self._indexes: dict[str, VectorIndex] = {}
+        # 大規模ユーザー向けの近似最近傍インデックスと、構築中のタスク・構築中に変わった概念ID
+        self._ann_indexes: dict[str, IVFFlatIndex] = {}
+        self._ann_builds: dict[str, asyncio.Task] = {}
+        self._ann_pending: dict[str, set[str]] = {}
+        # ワーカー間で共有するセグメントストア
+        self._segments = SegmentStore(EMBEDDING_SEGMENT_DIR) if EMBEDDING_SEGMENT_DIR else None
+        # 実行中のセグメント compaction タスク
+        self._compactions: dict[str, asyncio.Task] = {}
+        # ユーザーごとの字句検索インデックス
+        self._lexical_indexes: dict[str, LexicalIndex] = {}
+        # ユーザーごとの次元削減の射影
+        self._reducers: dict[str, DimensionReducer] = {}
+        # ユーザーごとの属性フィルタの所属表と、マスク（厳密検索インデックスの行に対応）
+        self._filter_indexes: dict[str, FilterIndex] = {}
+        self._filter_bitmaps: dict[str, FilterBitmaps] = {}
+        # 非同期埋め込みの同時実行数を制限
+        self._embed_semaphore = asyncio.Semaphore(EMBEDDING_MAX_CONCURRENCY)
 
-            api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-            if api_key:
-                self._client = genai.Client(api_key=api_key)
-            else:
-                project = os.getenv("GOOGLE_CLOUD_PROJECT")
-                if project:
-                    location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
-                    self._client = genai.Client(
-                        vertexai=True, project=project, location=location
-                    )
-        return self._client
-
-    def generate_embedding(self, text: str) -> list[float] | None:
+    @property
+    def embedding_model(self) -> str:
+        """使用中の埋め込みモデル名"""
+        return self._backend.model
+
+    def generate_embedding(self, text: str) -> np.ndarray | None:
         """テキストの埋め込みベクトルを生成
 
         Args:
             text: 埋め込みを生成するテキスト
 
         Returns:
-            埋め込みベクトル（768次元）
+            埋め込みベクトル（float32、Gemini は768次元）
         """
-        # キャッシュチェック
-        if text in self._embeddings_cache:
-            return self._embeddings_cache[text]
+        return self.generate_embeddings_batch([text])[0]
 
-        client = self._get_client()
-        if client is None:
-            return None
+    def generate_embeddings_batch(self, texts: list[str]) -> list[np.ndarray | None]:
+        """複数テキストの埋め込みベクトルをまとめて生成
 
-        try:
-            # Gemini の embedding モデルを使用
-            response = client.models.embed_content(
-                model="text-embedding-004",
-                contents=text,
-            )
+        キャッシュ済みのテキストはスキップし、残りを EMBEDDING_BATCH_SIZE 件ずつ
+        1リクエストに詰めて埋め込みバックエンドを呼び出す。
 
-            if response.embeddings and len(response.embeddings) > 0:
-                embedding = list(response.embeddings[0].values)
-                self._embeddings_cache[text] = embedding
-                return embedding
+        Args:
+            texts: 埋め込みを生成するテキストのリスト
 
-        except Exception as e:
-            print(f"Embedding generation failed: {e}")
-            return None
+        Returns:
+            入力と同じ順序の埋め込みベクトルのリスト（失敗したものは None）
+        """
+        results = [self._embeddings_cache.get(text) for text in texts]
 
-        return None
+        # キャッシュ未登録のテキストを重複なく抽出
+        pending = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if not pending:
+            return results
 
-    def generate_concept_embedding(self, concept: dict[str, Any]) -> list[float] | None:
-        """概念の埋め込みベクトルを生成
+        if not self._backend.available:
+            return results
+
+        fetched: dict[str, np.ndarray] = {}
+        for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+            chunk = pending[start:start + EMBEDDING_BATCH_SIZE]
+            try:
+                embeddings = self._backend.embed(chunk)
+            except Exception as e:
+                print(f"Embedding generation failed: {e}")
+                continue
+
+            for text, values in zip(chunk, embeddings):
+                fetched[text] = self._embeddings_cache.put(text, values)
+
+        return [r if r is not None else fetched.get(t) for t, r in zip(texts, results)]
+
+    async def agenerate_embedding(self, text: str) -> np.ndarray | None:
+        """テキストの埋め込みベクトルを非同期で生成"""
+        return (await self.agenerate_embeddings_batch([text]))[0]
+
+    async def agenerate_embeddings_batch(
+        self,
+        texts: list[str],
+        cache: EmbeddingCache | None = None,
+    ) -> list[np.ndarray | None]:
+        """複数テキストの埋め込みベクトルを非同期でまとめて生成
+
+        バックエンドの非同期 API でチャンクを並行に送信する。同時リクエスト数は
+        EMBEDDING_MAX_CONCURRENCY に制限し、レート制限時はジッター付きの
+        指数バックオフで再試行するため、その間もイベントループは他のリクエストを処理できる。
+
+        Args:
+            texts: 埋め込みを生成するテキストのリスト
+            cache: 使用するキャッシュ（省略時は概念の埋め込みキャッシュ）
+
+        Returns:
+            入力と同じ順序の埋め込みベクトルのリスト（失敗したものは None）
+        """
+        if cache is None:
+            cache = self._embeddings_cache
+        results = [cache.get(text) for text in texts]
+
+        # キャッシュ未登録のテキストを重複なく抽出
+        pending = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+        if not pending:
+            return results
+
+        if not self._backend.available:
+            return results
+
+        chunks = [
+            pending[start:start + EMBEDDING_BATCH_SIZE]
+            for start in range(0, len(pending), EMBEDDING_BATCH_SIZE)
+        ]
+        responses = await asyncio.gather(*(self._aembed_chunk(chunk) for chunk in chunks))
+
+        fetched: dict[str, np.ndarray] = {}
+        for chunk, embeddings in zip(chunks, responses):
+            for text, values in zip(chunk, embeddings):
+                fetched[text] = cache.put(text, values)
+
+        return [r if r is not None else fetched.get(t) for t, r in zip(texts, results)]
+
+    async def _aembed_chunk(self, chunk: list[str]) -> list[list[float]]:
+        """1チャンクを埋め込む（レート制限時はバックオフして再試行）"""
+        async with self._embed_semaphore:
+            for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+                try:
+                    return await self._backend.aembed(chunk)
+                except Exception as e:
+                    if not _is_rate_limited(e) or attempt == EMBEDDING_MAX_RETRIES:
+                        print(f"Embedding generation failed: {e}")
+                        return []
+                    delay = min(EMBEDDING_BACKOFF_MAX, EMBEDDING_BACKOFF_BASE * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                    print(f"Embedding rate limited, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return []
+
+    async def aembed_queries(self, queries: list[str]) -> list[np.ndarray | None]:
+        """検索クエリをまとめて埋め込む（TTL 付きのクエリキャッシュを使用）"""
+        return await self.agenerate_embeddings_batch(
+            [query.strip() for query in queries], cache=self._query_cache
+        )
+
+    def cache_stats(self) -> dict[str, Any]:
+        """埋め込みキャッシュの統計（ヒット数・ミス数・追い出し数・常駐バイト数）"""
+        return {
+            "concepts": self._embeddings_cache.stats(),
+            "queries": self._query_cache.stats(),
+        }
 
-        概念名と定義を組み合わせてベクトル化
+    def concept_embedding_text(self, concept: dict[str, Any]) -> str:
+        """概念の埋め込み用テキストを構築
+
+        概念名と定義を組み合わせてベクトル化の入力とする
 
         Args:
             concept: 概念オブジェクト（name, definition を含む）
 
         Returns:
-            埋め込みベクトル
+            埋め込み用テキスト
         """
         # 日本語と英語の両方を含めて意味を豊かに
         name = concept.get("name_ja") or concept.get("name", "")
@@ -91,8 +292,605 @@ class VectorSearchClient:
         text_parts.append(f"\n種類: {concept_type}")
         text_parts.append(f"\n定義: {definition}")
 
-        text = " ".join(text_parts)
-        return self.generate_embedding(text)
+        return " ".join(text_parts)
+
+    def generate_concept_embedding(self, concept: dict[str, Any]) -> np.ndarray | None:
+        """概念の埋め込みベクトルを生成
+
+        Args:
+            concept: 概念オブジェクト（name, definition を含む）
+
+        Returns:
+            埋め込みベクトル
+        """
+        return self.generate_embedding(self.concept_embedding_text(concept))
+
+    def generate_concept_embeddings(
+        self, concepts: list[dict[str, Any]]
+    ) -> list[np.ndarray | None]:
+        """複数概念の埋め込みベクトルをバッチで生成
+
+        Args:
+            concepts: 概念オブジェクトのリスト
+
+        Returns:
+            入力と同じ順序の埋め込みベクトルのリスト
+        """
+        texts = [self.concept_embedding_text(c) for c in concepts]
+        return self.generate_embeddings_batch(texts)
+
+    async def get_concept_embeddings(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        db: Any = None,
+    ) -> list[np.ndarray | None]:
+        """永続ストアを参照して概念の埋め込みを取得
+
+        保存済みレコードのハッシュが一致する概念はそのまま使い、
+        新規または内容が変わった概念だけをバッチで埋め込んで保存する。
+        永続ストアからは渡された概念のレコードだけを読む（全件は読まない）。
+
+        Args:
+            user_id: ユーザーID
+            concepts: 概念オブジェクトのリスト
+            db: グラフストア（None またはインメモリのストアならクライアント内に保存）
+
+        Returns:
+            入力と同じ順序の埋め込みベクトルのリスト
+        """
+        if _durable(db):
+            stored = await db.get_embeddings(user_id, [c["id"] for c in concepts])
+        else:
+            stored = self._memory_embeddings.setdefault(user_id, {})
+
+        texts = [self.concept_embedding_text(c) for c in concepts]
+        hashes = [embedding_hash(t, self._backend.model) for t in texts]
+
+        embeddings: list[np.ndarray | None] = [None] * len(concepts)
+        stale: list[int] = []
+        for i, (concept, content_hash) in enumerate(zip(concepts, hashes)):
+            record = stored.get(concept["id"])
+            if record and record.get("hash") == content_hash:
+                embeddings[i] = decode_embedding(record)
+            else:
+                stale.append(i)
+
+        if not stale:
+            return embeddings
+
+        # ハッシュが変わった概念だけを埋め込む
+        fresh = await self.agenerate_embeddings_batch([texts[i] for i in stale])
+        updates: dict[str, dict[str, Any]] = {}
+        for i, embedding in zip(stale, fresh):
+            if embedding is None:
+                continue
+            embeddings[i] = embedding
+            # インメモリ保存は再スコアリング用に全精度のまま保持
+            dtype = EMBEDDING_STORE_DTYPE if _durable(db) else "float32"
+            updates[concepts[i]["id"]] = {
+                "hash": hashes[i],
+                "model": self._backend.model,
+                **encode_embedding(embedding, dtype),
+            }
+
+        if updates:
+            if _durable(db):
+                await db.set_embeddings_batch(user_id, updates)
+            else:
+                stored.update(updates)
+
+        return embeddings
+
+    async def get_user_index(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        db: Any = None,
+    ) -> VectorIndex | SegmentView:
+        """ユーザーのベクトルインデックスを概念リストと同期して取得
+
+        内容ハッシュが変わった概念だけを埋め込んで更新し、
+        概念リストにない行はインデックスから削除する。
+
+        Args:
+            user_id: ユーザーID
+            concepts: 概念オブジェクトのリスト
+            db: グラフストア（None またはインメモリのストアならクライアント内に保存）
+
+        Returns:
+            同期済みのベクトルインデックス
+        """
+        index = await self._current_index(user_id)
+        current_ids = {c["id"] for c in concepts}
+        removed_ids = [cid for cid in index.ids if cid not in current_ids]
+        return await self.update_user_index(user_id, concepts, removed_ids, db)
+
+    async def update_user_index(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        removed_ids: list[str] | None = None,
+        db: Any = None,
+    ) -> VectorIndex | SegmentView:
+        """指定した概念だけでユーザーのベクトルインデックスをその場で更新
+
+        グラフ同期後のバックグラウンド処理から呼ばれ、新規または内容が
+        変わった概念だけを埋め込む。
+
+        Args:
+            user_id: ユーザーID
+            concepts: 追加・更新された概念オブジェクトのリスト
+            removed_ids: インデックスから削除する概念ID
+            db: グラフストア（None またはインメモリのストアならクライアント内に保存）
+
+        Returns:
+            更新後のベクトルインデックス
+        """
+        index = await self._current_index(user_id)
+        self._filter_index(user_id).update_concepts(concepts, removed_ids or [])
+        removed_ids = [cid for cid in removed_ids or [] if cid in index]
+
+        hashes = [
+            embedding_hash(self.concept_embedding_text(c), self._backend.model) for c in concepts
+        ]
+        stale = [
+            i for i, (c, h) in enumerate(zip(concepts, hashes))
+            if index.content_hash(c["id"]) != h
+        ]
+        added_ids: list[str] = []
+        added_vectors: list[np.ndarray] = []
+        added_hashes: list[str] = []
+        if stale:
+            embeddings = await self.get_concept_embeddings(
+                user_id, [concepts[i] for i in stale], db
+            )
+            for i, embedding in zip(stale, embeddings):
+                if embedding is not None:
+                    added_ids.append(concepts[i]["id"])
+                    added_vectors.append(embedding)
+                    added_hashes.append(hashes[i])
+            index, added_vectors = await self._reduce_vectors(user_id, index, added_vectors)
+
+        if self._segments is not None:
+            # 差分をセグメントとして追記し、他のワーカーと共有する
+            # （compaction がロックを持っている間も待つのはスレッドプール側）
+            if added_ids or removed_ids:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    partial(
+                        self._segments.append,
+                        user_id, added_ids, added_vectors, added_hashes, removed_ids,
+                    ),
+                )
+                index = await self._open_segments(user_id)
+                if self._segments.needs_compaction(user_id) and user_id not in self._compactions:
+                    self._compactions[user_id] = asyncio.create_task(self._compact_segments(user_id))
+        else:
+            index.add(added_ids, added_vectors, added_hashes)
+            index.remove(removed_ids)
+
+        self._sync_ann_index(user_id, index, added_ids, removed_ids)
+        return index
+
+    def get_lexical_index(self, user_id: str, concepts: list[dict[str, Any]]) -> LexicalIndex:
+        """ユーザーの字句検索インデックスを概念リストと同期して取得"""
+        index = self._lexical_indexes.setdefault(user_id, LexicalIndex())
+        index.sync(concepts)
+        return index
+
+    def _local_index(self, user_id: str) -> VectorIndex | SegmentView:
+        """ユーザーの厳密検索インデックス（セグメントストア有効時は最後に開いた memmap ビュー）"""
+        if self._segments is not None:
+            return self._segments.cached(user_id) or self._segments.open(user_id)
+        return self._indexes.setdefault(user_id, VectorIndex(storage=VECTOR_INDEX_DTYPE))
+
+    async def _current_index(self, user_id: str) -> VectorIndex | SegmentView:
+        """他のワーカーの追記も反映した厳密検索インデックス"""
+        if self._segments is not None:
+            return await self._open_segments(user_id)
+        return self._local_index(user_id)
+
+    async def _open_segments(self, user_id: str) -> SegmentView:
+        """セグメントをスレッドプールで開き、ビューをイベントループ上で公開"""
+        view = await asyncio.get_running_loop().run_in_executor(
+            None, self._segments.load, user_id
+        )
+        return self._segments.publish(user_id, view)
+
+    def _reducer(self, user_id: str) -> DimensionReducer | None:
+        """ユーザーの次元削減の射影を取得（無効時は None）"""
+        if not EMBEDDING_REDUCED_DIM:
+            return None
+        reducer = self._reducers.get(user_id)
+        if reducer is None or not reducer.fitted:
+            # 他のワーカーが学習した射影があれば共有する
+            data = self._segments.load_projection(user_id) if self._segments is not None else None
+            if data is not None:
+                reducer = DimensionReducer.from_bytes(data)
+            elif reducer is None:
+                reducer = DimensionReducer(EMBEDDING_REDUCTION, EMBEDDING_REDUCED_DIM)
+            self._reducers[user_id] = reducer
+        return reducer
+
+    async def _reduce_vectors(
+        self,
+        user_id: str,
+        index: VectorIndex | SegmentView,
+        vectors: list[np.ndarray],
+    ) -> tuple[VectorIndex | SegmentView, list[np.ndarray]]:
+        """追加するベクトルを削減後の次元に射影
+
+        PCA は PCA_MIN_SAMPLES 件集まるまで全次元のまま保持し、集まった時点で
+        学習して既存の行も射影し直す。EMBEDDING_REDUCED_DIM が埋め込みの次元以上の
+        場合は削減しない。
+
+        Returns:
+            (射影後の行を持つインデックス, 射影済みベクトル)
+        """
+        reducer = self._reducer(user_id)
+        if reducer is None or not vectors or len(vectors[0]) <= reducer.dim:
+            # 削減後の次元が埋め込みの次元以上なら射影しない
+            return index, vectors
+
+        if not reducer.fitted:
+            if len(index) + len(vectors) < max(PCA_MIN_SAMPLES, reducer.dim):
+                return index, vectors
+            sample = np.stack(vectors)
+            if len(index):
+                sample = np.concatenate([index.matrix, sample])
+            reducer.fit(sample)
+            if self._segments is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._segments.save_projection, user_id, reducer.to_bytes()
+                )
+
+        if len(index) and index.dim != reducer.output_dim:
+            index = await self._rebuild_reduced_index(user_id, index, reducer)
+        return index, list(reducer.transform(np.stack(vectors)))
+
+    async def _rebuild_reduced_index(
+        self,
+        user_id: str,
+        index: VectorIndex | SegmentView,
+        reducer: DimensionReducer,
+    ) -> VectorIndex | SegmentView:
+        """全次元で保持していた行を射影してインデックスを作り直す"""
+        ids = index.ids
+        hashes = [index.content_hash(cid) or "" for cid in ids]
+        reduced = reducer.transform(index.matrix)
+        self._drop_ann_index(user_id)
+        print(f"Reducing embedding index for {user_id}: {index.dim} -> {reducer.dim} dims")
+
+        if self._segments is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._rewrite_segments, user_id, ids, reduced, hashes
+            )
+            return await self._open_segments(user_id)
+
+        rebuilt = VectorIndex(storage=VECTOR_INDEX_DTYPE)
+        rebuilt.add(ids, reduced, hashes)
+        self._indexes[user_id] = rebuilt
+        return rebuilt
+
+    def _rewrite_segments(
+        self,
+        user_id: str,
+        ids: list[str],
+        vectors: np.ndarray,
+        hashes: list[str],
+    ) -> None:
+        """射影を残してセグメントを書き直す（スレッドで実行）"""
+        projection = self._segments.load_projection(user_id)
+        self._segments.clear(user_id)
+        if projection is not None:
+            self._segments.save_projection(user_id, projection)
+        self._segments.append(user_id, ids, vectors, hashes)
+
+    def _reduce_query(self, user_id: str, query: np.ndarray | list[float]) -> np.ndarray:
+        """クエリをインデックスと同じ次元に射影（射影済みならそのまま）"""
+        q = np.asarray(query, dtype=np.float32)
+        reducer = self._reducer(user_id)
+        if reducer is not None and reducer.applies_to(q):
+            return reducer.transform(q)
+        return q
+
+    async def evaluate_reduction(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        db: Any = None,
+        dims: list[int] | None = None,
+        methods: tuple[str, ...] = REDUCTION_METHODS,
+        top_k: int = 10,
+    ) -> list[dict[str, Any]]:
+        """ユーザーの埋め込みで次元削減による recall@k の低下を評価
+
+        永続ストアの全次元の埋め込みを正解として、方式・次元ごとの
+        recall@k とインデックスのメモリ比を返す。
+
+        Args:
+            user_id: ユーザーID
+            concepts: 概念オブジェクトのリスト
+            db: グラフストア（None またはインメモリのストアならクライアント内に保存）
+            dims: 評価する削減後の次元数
+            methods: 評価する削減方式
+            top_k: recall@k の k
+
+        Returns:
+            評価結果のリスト
+        """
+        embeddings = await self.get_concept_embeddings(user_id, concepts, db)
+        rows = [e for e in embeddings if e is not None]
+        if len(rows) < 2:
+            return []
+        vectors = np.stack(rows)
+
+        results = []
+        loop = asyncio.get_running_loop()
+        for method in methods:
+            for dim in dims or [EMBEDDING_REDUCED_DIM or 384, 256, 128]:
+                # 全次元以上や、PCA の学習に足りない次元は評価しない
+                if dim >= vectors.shape[1] or (method == "pca" and dim >= len(rows)):
+                    continue
+                results.append(await loop.run_in_executor(
+                    None,
+                    partial(evaluate_reduction_recall, vectors, DimensionReducer(method, dim), top_k),
+                ))
+        return results
+
+    async def _compact_segments(self, user_id: str) -> None:
+        """セグメントをスレッドプールで compaction し、新しいビューをイベントループ上で公開"""
+        try:
+            loop = asyncio.get_running_loop()
+            rows = await loop.run_in_executor(None, self._segments.compact, user_id)
+            await self._open_segments(user_id)
+            print(f"Compacted embedding segments for {user_id}: {rows} rows")
+        except Exception as e:
+            print(f"Segment compaction failed: {e}")
+        finally:
+            self._compactions.pop(user_id, None)
+
+    def _sync_ann_index(
+        self,
+        user_id: str,
+        index: VectorIndex | SegmentView,
+        added_ids: list[str],
+        removed_ids: list[str],
+    ) -> None:
+        """厳密インデックスの変更を近似最近傍インデックスへ反映
+
+        まだインデックスがなければ構築をバックグラウンドで始め、完成するまでは厳密検索で答える。
+        """
+        ann = self._ann_indexes.get(user_id)
+        if len(index) < ANN_MIN_SIZE:
+            # 小規模なグラフは厳密検索で十分
+            self._drop_ann_index(user_id)
+        elif ann is not None:
+            ann.remove(removed_ids)
+            if added_ids:
+                ann.add(added_ids, np.stack([index.vector(cid) for cid in added_ids]))
+        elif user_id in self._ann_builds:
+            self._ann_pending[user_id].update(added_ids, removed_ids)
+        else:
+            self._schedule_ann_build(user_id, index)
+
+    def _schedule_ann_build(self, user_id: str, index: VectorIndex | SegmentView) -> None:
+        """近似最近傍インデックスの構築（または保存済みの読み込み）をスレッドプールで開始
+
+        k-means の学習は数秒かかるためイベントループでは実行しない。行列は構築中の
+        書き込みと切り離すためにここで複製し、構築中に変わった概念は完成後に反映する。
+        """
+        ids = index.ids
+        matrix = np.array(index.matrix, dtype=np.float32)
+        self._ann_pending[user_id] = set()
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(self._build_ann_index(user_id, ids, matrix))
+        self._ann_builds[user_id] = task
+
+    async def _build_ann_index(self, user_id: str, ids: list[str], matrix: np.ndarray) -> None:
+        """スレッドプールで構築したインデックスに構築中の変更を重ねて公開（イベントループ上）"""
+        task = asyncio.current_task()
+        try:
+            ann = await asyncio.get_running_loop().run_in_executor(
+                None, self._load_or_build_ann, user_id, ids, matrix
+            )
+        except Exception as e:
+            print(f"ANN index build failed for {user_id}: {e}")
+            self._ann_pending.pop(user_id, None)
+            return
+        finally:
+            # 破棄された後に別の構築が始まっていれば、そちらの登録は残す
+            if self._ann_builds.get(user_id) is task:
+                del self._ann_builds[user_id]
+
+        pending = list(self._ann_pending.pop(user_id, ()))
+        index = self._local_index(user_id)
+        if len(index) < ANN_MIN_SIZE:
+            return
+        ann.remove(pending)
+        present = [cid for cid in pending if cid in index]
+        if present:
+            ann.add(present, np.stack([index.vector(cid) for cid in present]))
+        self._ann_indexes[user_id] = ann
+        print(f"ANN index ready for {user_id}: {len(ann)} vectors, {ann.nlist} lists")
+
+    def _load_or_build_ann(self, user_id: str, ids: list[str], matrix: np.ndarray) -> IVFFlatIndex:
+        """保存済みのインデックスがあれば読み込んで差分を反映し、なければ学習して保存（スレッドで実行）"""
+        ann = None
+        data = self._segments.load_ann_index(user_id) if self._segments is not None else None
+        if data is not None:
+            try:
+                ann = IVFFlatIndex.from_bytes(data)
+                if ann.centroids.shape[1] != matrix.shape[1]:
+                    ann = None
+            except Exception as e:
+                print(f"Saved ANN index for {user_id} is unreadable, rebuilding: {e}")
+                ann = None
+
+        if ann is not None:
+            changed = ann.sync(ids, matrix)
+        else:
+            ann = IVFFlatIndex.build(ids, matrix, storage=VECTOR_INDEX_DTYPE)
+            changed = len(ann)
+        if changed and self._segments is not None:
+            self._segments.save_ann_index(user_id, ann.to_bytes())
+        return ann
+
+    def _drop_ann_index(self, user_id: str) -> None:
+        """近似最近傍インデックスと構築中のタスクを破棄"""
+        self._ann_indexes.pop(user_id, None)
+        self._ann_pending.pop(user_id, None)
+        task = self._ann_builds.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    def _filter_index(self, user_id: str) -> FilterIndex:
+        """ユーザーの属性フィルタの所属表"""
+        return self._filter_indexes.setdefault(user_id, FilterIndex())
+
+    async def filter_memberships(
+        self,
+        user_id: str,
+        concepts: list[dict[str, Any]],
+        db: Any,
+        selected: dict[str, list[str]],
+    ) -> dict[str, dict[str, set[str]]]:
+        """属性フィルタの所属表を概念リストと同期して取得
+
+        所属表は update_user_index() と論文の保存・削除のたびに差分で更新しておき、
+        ここでは変わった概念だけを付け替える。論文・年で絞るときは、保存済み論文を
+        まだ読んでいないか FILTER_PAPERS_TTL_SECONDS を過ぎていれば読み直す。
+
+        Returns:
+            属性 → 値 → 概念IDの集合
+        """
+        filter_index = self._filter_index(user_id)
+        filter_index.sync_concepts(concepts)
+        if selected.get("source_paper") or selected.get("year"):
+            loaded_at = filter_index.papers_loaded_at
+            if loaded_at is None or time.monotonic() - loaded_at > FILTER_PAPERS_TTL_SECONDS:
+                papers = await db.get_all_papers(user_id, fields=["id", "summary.year", "conceptIds"])
+                filter_index.set_papers(papers, loaded_at=time.monotonic())
+        return filter_index.memberships()
+
+    def update_filter_papers(
+        self,
+        user_id: str,
+        papers: list[dict[str, Any]] | None = None,
+        removed_ids: list[str] | None = None,
+    ) -> None:
+        """保存・削除した論文を属性フィルタの所属表に反映（未読み込みなら次の読み込みに任せる）"""
+        filter_index = self._filter_indexes.get(user_id)
+        if filter_index is not None and filter_index.papers_loaded_at is not None:
+            filter_index.update_papers(papers or [], removed_ids or [])
+
+    def filter_mask(self, user_id: str, selected: dict[str, list[str]]) -> np.ndarray | None:
+        """属性フィルタの条件を厳密検索インデックスの行マスクに変換
+
+        属性値ごとのマスクは、所属表のバージョンとインデックスの行配置が変わるまで使い回す。
+        事前に get_user_index() と filter_memberships() で同期しておくこと。
+
+        Args:
+            selected: 属性 → 選択された値のリスト
+
+        Returns:
+            行ごとの真偽値マスク（条件がなければ None）
+        """
+        index = self._local_index(user_id)
+        bitmaps = self._filter_bitmaps.get(user_id)
+        if bitmaps is None or not bitmaps.is_current(index):
+            bitmaps = self._filter_bitmaps[user_id] = FilterBitmaps(index)
+        return bitmaps.mask(self._filter_index(user_id), selected)
+
+    def search_user_index(
+        self,
+        user_id: str,
+        query: np.ndarray | list[float],
+        top_k: int = 5,
+        threshold: float = 0.5,
+        exclude: list[str] | None = None,
+        mask: np.ndarray | None = None,
+    ) -> list[tuple[str, float]]:
+        """ユーザーのインデックスで類似概念を検索
+
+        大規模なグラフでは近似最近傍インデックスを、それ以外は厳密検索を使う。
+        属性フィルタのマスク（filter_mask()）を指定した場合は、条件に合う概念を
+        取りこぼさないよう厳密検索インデックスで top-k 選択の前に適用する。
+        事前に get_user_index() で同期しておくこと。
+
+        Returns:
+            (概念ID, コサイン類似度) のリスト（類似度降順）
+        """
+        ann = self._ann_indexes.get(user_id)
+        index = ann if ann is not None and mask is None else self._local_index(user_id)
+
+        # 量子化インデックスは全精度ベクトルが手元にあれば再スコアリング
+        rescore = None
+        if VECTOR_INDEX_DTYPE != "float32":
+            rescore = partial(self._full_precision_vectors, user_id)
+
+        query = self._reduce_query(user_id, query)
+        if mask is not None:
+            return index.search(
+                query, top_k=top_k, threshold=threshold, exclude=exclude or (), rescore=rescore, mask=mask
+            )
+        return index.search(
+            query, top_k=top_k, threshold=threshold, exclude=exclude or (), rescore=rescore
+        )
+
+    def search_user_index_batch(
+        self,
+        user_id: str,
+        queries: np.ndarray | list[np.ndarray],
+        top_k: int = 5,
+        threshold: float = 0.5,
+        mask: np.ndarray | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """複数クエリをまとめてユーザーのインデックスで検索
+
+        厳密検索ではクエリ行列とインデックス行列の1回の行列積で全クエリのスコアを求める。
+        mask は全クエリに共通の属性フィルタ（search_user_index() と同様に厳密検索で適用）。
+        事前に get_user_index() で同期しておくこと。
+
+        Returns:
+            クエリごとの (概念ID, コサイン類似度) のリスト
+        """
+        ann = self._ann_indexes.get(user_id)
+        index = ann if ann is not None and mask is None else self._local_index(user_id)
+
+        rescore = None
+        if VECTOR_INDEX_DTYPE != "float32":
+            rescore = partial(self._full_precision_vectors, user_id)
+
+        queries = self._reduce_query(user_id, np.stack(queries))
+        if mask is not None:
+            return index.search_batch(queries, top_k=top_k, threshold=threshold, rescore=rescore, mask=mask)
+        return index.search_batch(queries, top_k=top_k, threshold=threshold, rescore=rescore)
+
+    def _full_precision_vectors(self, user_id: str, ids: list[str]) -> list[np.ndarray | None]:
+        """インメモリに保持している全精度の埋め込みを取得（インデックスと同じ次元に射影）"""
+        records = self._memory_embeddings.get(user_id, {})
+        vectors: list[np.ndarray | None] = []
+        for cid in ids:
+            record = records.get(cid)
+            if record and record.get("dtype", "float32") == "float32":
+                vectors.append(self._reduce_query(user_id, decode_embedding(record)))
+            else:
+                vectors.append(None)
+        return vectors
+
+    async def clear_user_embeddings(self, user_id: str) -> None:
+        """ユーザーのインデックスとインメモリの埋め込みレコードを破棄"""
+        self._memory_embeddings.pop(user_id, None)
+        self._indexes.pop(user_id, None)
+        self._drop_ann_index(user_id)
+        self._lexical_indexes.pop(user_id, None)
+        self._reducers.pop(user_id, None)
+        self._filter_indexes.pop(user_id, None)
+        self._filter_bitmaps.pop(user_id, None)
+        if self._segments is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._segments.clear, user_id)
 
     def cosine_similarity(self, vec1: list[float], vec2: list[float]) -> float:
         """コサイン類似度を計算
@@ -126,20 +924,20 @@ class VectorSearchClient:
         Returns:
             (概念, 類似度スコア) のリスト（類似度降順）
         """
-        results = []
-
-        for concept, embedding in concepts_with_embeddings:
-            if embedding is None:
-                continue
-
-            similarity = self.cosine_similarity(query_embedding, embedding)
-            if similarity >= threshold:
-                results.append((concept, similarity))
+        pairs = [(c, e) for c, e in concepts_with_embeddings if e is not None]
+        if not pairs:
+            return []
 
-        # 類似度でソート
-        results.sort(key=lambda x: x[1], reverse=True)
+        # 1回の行列ベクトル積で全概念との類似度を計算
+        matrix = normalize_rows(np.asarray([e for _, e in pairs], dtype=np.float32))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = matrix @ (query / np.linalg.norm(query))
 
-        return results[:top_k]
+        return [
+            (pairs[i][0], float(scores[i]))
+            for i in top_k_indices(scores, top_k)
+            if scores[i] >= threshold
+        ]
 
     def find_related_by_text(
         self,
@@ -172,6 +970,9 @@ class VectorSearchClient:
         concepts: list[dict[str, Any]],
         existing_relations: list[dict[str, Any]],
         similarity_threshold: float = 0.7,
+        index: VectorIndex | None = None,
+        max_suggestions: int | None = None,
+        top_k_per_concept: int = 10,
     ) -> list[dict[str, Any]]:
         """暗黙的な関係性を提案
 
@@ -181,52 +982,74 @@ class VectorSearchClient:
             concepts: 概念リスト
             existing_relations: 既存の関係性リスト
             similarity_threshold: 提案の閾値
+            index: 概念を登録済みのベクトルインデックス（省略時は生成）
+            max_suggestions: 返す提案の最大数
+            top_k_per_concept: 1概念あたりに残す候補数
 
         Returns:
             提案される関係性のリスト
         """
         # 埋め込みを生成
-        concept_embeddings = []
-        for concept in concepts:
-            embedding = self.generate_concept_embedding(concept)
-            concept_embeddings.append((concept, embedding))
-
-        # 既存の関係性をセットに変換
-        existing_pairs = set()
-        for rel in existing_relations:
-            existing_pairs.add((rel["source"], rel["target"]))
-            existing_pairs.add((rel["target"], rel["source"]))  # 双方向
+        if index is None:
+            index = VectorIndex()
+            rows = [
+                (c["id"], e)
+                for c, e in zip(concepts, self.generate_concept_embeddings(concepts))
+                if e is not None
+            ]
+            index.add([cid for cid, _ in rows], [e for _, e in rows])
 
-        # 類似ペアを発見
-        suggested_relations = []
-        for i, (concept1, emb1) in enumerate(concept_embeddings):
-            if emb1 is None:
-                continue
+        concepts_by_id = {c["id"]: c for c in concepts}
+        ids = [cid for cid in index.ids if cid in concepts_by_id]
+        if len(ids) < 2:
+            return []
+        rows_by_id = {cid: row for row, cid in enumerate(ids)}
 
-            for j, (concept2, emb2) in enumerate(concept_embeddings):
-                if i >= j or emb2 is None:
-                    continue
+        # 関係の端点（source_id / target_id、なければ ID または名前）を行番号に解決
+        rows_by_key = dict(rows_by_id)
+        for cid, row in rows_by_id.items():
+            rows_by_key.setdefault(concepts_by_id[cid].get("name", ""), row)
 
-                # 既にリンクがある場合はスキップ
-                name1 = concept1.get("name", "")
-                name2 = concept2.get("name", "")
-                if (name1, name2) in existing_pairs:
-                    continue
+        # 既存の関係性を疎な行 → 列リストに変換（双方向）
+        existing_pairs: dict[int, list[int]] = {}
+        for rel in existing_relations:
+            source = rows_by_key.get(rel.get("source_id") or rel["source"])
+            target = rows_by_key.get(rel.get("target_id") or rel["target"])
+            if source is None or target is None:
+                continue
+            existing_pairs.setdefault(source, []).append(target)
+            existing_pairs.setdefault(target, []).append(source)
 
-                similarity = self.cosine_similarity(emb1, emb2)
-                if similarity >= similarity_threshold:
-                    suggested_relations.append({
-                        "source": name1,
-                        "source_id": concept1.get("id"),
-                        "target": name2,
-                        "target_id": concept2.get("id"),
-                        "relation_type": "semantically-related",
-                        "confidence": similarity,
-                        "suggested": True,
-                    })
+        # タイル化した行列積で類似ペアを発見
+        if len(ids) == len(index):
+            matrix = index.matrix
+        else:
+            matrix = np.stack([index.vector(cid) for cid in ids])
+        pairs = similar_pairs(
+            matrix,
+            similarity_threshold,
+            top_k_per_row=top_k_per_concept,
+            exclude=existing_pairs,
+        )
 
         # 信頼度でソート
-        suggested_relations.sort(key=lambda x: x["confidence"], reverse=True)
+        pairs.sort(key=lambda x: x[2], reverse=True)
+        if max_suggestions is not None:
+            pairs = pairs[:max_suggestions]
+
+        suggested_relations = []
+        for i, j, similarity in pairs:
+            concept1 = concepts_by_id[ids[i]]
+            concept2 = concepts_by_id[ids[j]]
+            suggested_relations.append({
+                "source": concept1.get("name", ""),
+                "source_id": concept1.get("id"),
+                "target": concept2.get("name", ""),
+                "target_id": concept2.get("id"),
+                "relation_type": "semantically-related",
+                "confidence": similarity,
+                "suggested": True,
+            })
 
         return suggested_relations
 
@@ -453,6 +453,13 @@ async def run_pipeline_task(text: str, filename: str, session_id: str, user_id:
                     result_text = part.text
                     last_agent = agent_name
 
+        # エージェントが直接書き込んだ概念・関係性をスナップショットに取り込む
+        from api.db.store import get_graph_store
+
+        graph_store = get_graph_store()
+        if graph_store.name == "firestore":
+            await graph_store.refresh_snapshot(user_id)
+
         # グラフ保存完了のアクティビティ
         activities.append(create_activity(
             "graph", "update", "completed",
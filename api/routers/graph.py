@@ -1,24 +1,22 @@
-"""ナレッジグラフ関連のAPIエンドポイント - Firestore連携"""
+"""ナレッジグラフ関連のAPIエンドポイント - グラフストア（Firestore / SQLite / インメモリ）連携"""
 
-import os
-from fastapi import APIRouter, HTTPException, Header
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException
 from pydantic import BaseModel
 
 router = APIRouter()
 
-# Firestore クライアント（遅延初期化）
+# グラフストア（遅延初期化）
 _db_client = None
 
 
 def get_db():
-    """Firestoreクライアントを取得"""
+    """グラフストアを取得（GRAPH_STORE で Firestore / SQLite / インメモリを選ぶ）"""
     global _db_client
     if _db_client is None:
-        # Firestoreが利用可能かチェック
-        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-        if project_id:
-            from api.db.firestore import get_firestore_client
-            _db_client = get_firestore_client()
+        from api.db.store import get_graph_store
+        _db_client = get_graph_store()
     return _db_client
 
 
@@ -44,6 +42,8 @@ class Relation(BaseModel):
     source: str
     target: str
     relation_type: str
+    source_id: str | None = None  # 端点を解決した概念ID（解決できなければ None）
+    target_id: str | None = None
 
 
 class GraphData(BaseModel):
@@ -54,30 +54,177 @@ class GraphData(BaseModel):
 class SyncRequest(BaseModel):
     concepts: list[Concept]
     relations: list[Relation]
+    # True の場合、送られてこなかった既存の概念・関係性を削除する
+    delete_missing: bool = False
+
+
+class SyncCounts(BaseModel):
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
 
 
 class SyncResponse(BaseModel):
     success: bool
     concepts_synced: int
     relations_synced: int
-    storage: str  # "firestore" or "memory"
+    storage: str  # "firestore", "sqlite" or "memory"
+    # 内容ハッシュの比較結果（書き込んだのは added / updated / deleted のみ）
+    concept_changes: SyncCounts = SyncCounts()
+    relation_changes: SyncCounts = SyncCounts()
+    # 書き込みに失敗したID → エラー（再送すれば失敗分だけ書き直せる）
+    failed_concepts: dict[str, str] = {}
+    failed_relations: dict[str, str] = {}
 
 
 class ClearResponse(BaseModel):
     success: bool
     concepts_deleted: int
     relations_deleted: int
+    job_id: str | None = None  # バックグラウンド実行時のジョブID
+
+
+class ClearJobStatus(BaseModel):
+    job_id: str
+    status: str  # "running", "completed" or "failed"
+    progress: dict[str, int]  # サブコレクション名 → 削除済み件数
+    concepts_deleted: int
+    relations_deleted: int
+    error: str | None = None
+
+
+# バックグラウンドのグラフ削除ジョブの進捗をストアに書き込む間隔（秒）
+CLEAR_JOB_PROGRESS_INTERVAL = 1.0
+
+
+async def load_aliases(user_id: str, db) -> list[dict]:
+    """概念の別名テーブルを取得"""
+    return await db.get_all_aliases(user_id)
 
 
-# インメモリストレージ（Firestore未設定時のフォールバック）
-_memory_storage: dict[str, GraphData] = {}
+async def save_aliases(user_id: str, db, records: dict[str, dict]) -> None:
+    """概念の別名レコードを保存（統合された概念ID → レコード）"""
+    if records:
+        await db.set_aliases_batch(user_id, records)
 
 
-def get_memory_storage(user_id: str) -> GraphData:
-    """インメモリストレージからグラフを取得"""
-    if user_id not in _memory_storage:
-        _memory_storage[user_id] = GraphData(concepts=[], relations=[])
-    return _memory_storage[user_id]
+def _drop_merged_concepts(
+    concepts: list[Concept],
+    relations: list[Relation],
+    aliases: list[dict],
+) -> tuple[list[Concept], list[Relation]]:
+    """統合済みの概念を同期対象から外し、関係を正準ノードへ付け替える"""
+    from api.db.entity_resolution import rewire_relations
+
+    aliases_by_id = {a["alias_id"]: a for a in aliases if a.get("alias_id")}
+    merged = [c for c in concepts if c.id in aliases_by_id]
+    if not merged:
+        return concepts, relations
+
+    id_map = {c.id: aliases_by_id[c.id]["canonical_id"] for c in merged}
+    name_map = {c.name: aliases_by_id[c.id]["canonical_name"] for c in merged}
+    rewired = rewire_relations([r.model_dump() for r in relations], id_map, name_map)
+    return (
+        [c for c in concepts if c.id not in aliases_by_id],
+        [Relation(**r) for r in rewired],
+    )
+
+
+async def resolve_new_concepts(
+    user_id: str,
+    concepts: list[dict],
+    relations: list[dict],
+) -> tuple[list[dict], list[dict], int]:
+    """論文から抽出した概念を既存グラフと照合し、重複を正準ノードに統合する
+
+    照合キー（既存概念と別名テーブル）が一致する概念は埋め込まずに統合し、
+    残りだけを埋め込んでユーザーのベクトルインデックスで近傍を探す。
+    同じ論文内の重複も統合し、関係は正準ノードの名前に付け替えて概念IDに解決する。
+
+    Returns:
+        (統合後の概念, 付け替え後の関係, 統合した概念数)
+    """
+    from api.db.adjacency import resolve_relations
+    from api.db.entity_resolution import (
+        ENTITY_SIMILARITY_THRESHOLD,
+        apply_resolution,
+        cluster_canonicals,
+        cluster_pairs,
+        concept_keys,
+        embedding_pairs,
+        name_pairs,
+        rewire_relations,
+    )
+    from api.db.vectors import get_vector_client
+
+    db = get_db()
+    existing = await db.get_all_concepts(user_id)
+    existing_by_id = {c["id"]: c for c in existing}
+
+    # (概念の種類, 照合キー) → 既存の正準概念ID（名前が一致しても種類が違えば統合しない）
+    canonical_by_key: dict[tuple, str] = {}
+    for concept in existing:
+        for key in concept_keys(concept):
+            canonical_by_key.setdefault((concept.get("concept_type"), key), concept["id"])
+    for record in await load_aliases(user_id, db):
+        canonical = existing_by_id.get(record["canonical_id"])
+        if canonical is None:
+            continue
+        # 保存済みのキーに加え、正規化の変更に追従するよう別名から作り直したキーも使う
+        keys = set(record.get("keys", [])) | concept_keys(
+            {"name": record.get("alias_name"), "name_en": record.get("alias_name_en")}
+        )
+        for key in keys:
+            canonical_by_key.setdefault((canonical.get("concept_type"), key), canonical["id"])
+
+    canonical_for: dict[int, dict] = {}
+    for i, concept in enumerate(concepts):
+        for key in concept_keys(concept):
+            canonical_id = canonical_by_key.get((concept.get("concept_type"), key))
+            if canonical_id is not None:
+                canonical_for[i] = existing_by_id[canonical_id]
+                break
+
+    # 照合キーで決まらなかった概念を埋め込みで既存概念と照合
+    vector_client = get_vector_client()
+    unmatched = [i for i in range(len(concepts)) if i not in canonical_for]
+    vectors: list = [None] * len(concepts)
+    if unmatched:
+        embeddings = await vector_client.agenerate_embeddings_batch(
+            [vector_client.concept_embedding_text(concepts[i]) for i in unmatched]
+        )
+        for i, embedding in zip(unmatched, embeddings):
+            vectors[i] = embedding
+
+        if existing:
+            await vector_client.get_user_index(user_id, existing, db)
+            for i in unmatched:
+                if vectors[i] is None:
+                    continue
+                hits = vector_client.search_user_index(
+                    user_id, vectors[i], top_k=3, threshold=ENTITY_SIMILARITY_THRESHOLD
+                )
+                for concept_id, _ in hits:
+                    candidate = existing_by_id.get(concept_id)
+                    if candidate and candidate.get("concept_type") == concepts[i].get("concept_type"):
+                        canonical_for[i] = candidate
+                        break
+
+    # 同じ論文内の重複
+    rest = [i for i in range(len(concepts)) if i not in canonical_for]
+    rest_concepts = [concepts[i] for i in rest]
+    pairs = name_pairs(rest_concepts) + embedding_pairs(rest_concepts, [vectors[i] for i in rest])
+    clusters = cluster_pairs(len(rest), pairs)
+    for j, canonical in cluster_canonicals(rest_concepts, clusters).items():
+        canonical_for[rest[j]] = canonical
+
+    resolved, id_map, name_map, aliases = apply_resolution(concepts, canonical_for)
+    await save_aliases(user_id, db, aliases)
+    if aliases:
+        print(f"Resolved {len(aliases)} duplicate concepts for {user_id}")
+    relations = resolve_relations(rewire_relations(relations, id_map, name_map), resolved)
+    return resolved, relations, len(aliases)
 
 
 @router.get("/", response_model=GraphData)
@@ -86,123 +233,221 @@ async def get_graph(x_user_id: str | None = Header(default=None)):
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        # Firestore から取得
-        data = await db.get_graph(user_id)
-        return GraphData(
-            concepts=[Concept(**c) for c in data["concepts"]],
-            relations=[Relation(**r) for r in data["relations"]],
-        )
-    else:
-        # インメモリストレージから取得
-        return get_memory_storage(user_id)
+    data = await db.get_graph(user_id)
+    return GraphData(
+        concepts=[Concept(**c) for c in data["concepts"]],
+        relations=[Relation(**r) for r in data["relations"]],
+    )
 
 
 @router.post("/sync", response_model=SyncResponse)
 async def sync_graph(
     request: SyncRequest,
+    background_tasks: BackgroundTasks,
     x_user_id: str | None = Header(default=None),
 ):
-    """フロントエンドからナレッジグラフを同期する"""
+    """フロントエンドからナレッジグラフを同期する
+
+    内容ハッシュを比較して追加・変更されたドキュメントだけを書き込み、
+    delete_missing=true なら送られなかった概念・関係性を削除する。
+    新規または名前・定義が変わった概念だけをバックグラウンドで埋め込み、
+    ベクトルインデックスをその場で更新する
+    """
+    from api.db.vectors import get_vector_client
+
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        # Firestore に同期
-        result = await db.sync_graph(
-            user_id,
-            [c.model_dump() for c in request.concepts],
-            [r.model_dump() for r in request.relations],
-        )
-        return SyncResponse(
-            success=True,
-            concepts_synced=result["concepts_synced"],
-            relations_synced=result["relations_synced"],
-            storage="firestore",
-        )
-    else:
-        # インメモリストレージに保存
-        storage = get_memory_storage(user_id)
-
-        # 既存IDを取得
-        existing_concept_ids = {c.id for c in storage.concepts}
-        existing_relation_ids = {r.id for r in storage.relations}
-
-        # 新規のみ追加（既存は更新）
-        for concept in request.concepts:
-            if concept.id in existing_concept_ids:
-                # 更新
-                storage.concepts = [c if c.id != concept.id else concept for c in storage.concepts]
-            else:
-                storage.concepts.append(concept)
-
-        for relation in request.relations:
-            if relation.id in existing_relation_ids:
-                storage.relations = [r if r.id != relation.id else relation for r in storage.relations]
-            else:
-                storage.relations.append(relation)
+    # 統合済みの重複概念は同期せず、関係を正準ノードへ付け替える
+    request.concepts, request.relations = _drop_merged_concepts(
+        request.concepts, request.relations, await load_aliases(user_id, db)
+    )
 
-        return SyncResponse(
-            success=True,
-            concepts_synced=len(request.concepts),
-            relations_synced=len(request.relations),
-            storage="memory",
+    # 内容ハッシュが変わったドキュメントだけを書き込む
+    result = await db.sync_graph(
+        user_id,
+        [c.model_dump() for c in request.concepts],
+        [r.model_dump() for r in request.relations],
+        delete_missing=request.delete_missing,
+    )
+    changed_ids = set(result["changed_concept_ids"])
+    deleted_ids = result["deleted_concept_ids"]
+    failed_concepts = result["failed_concepts"]
+    failed_relations = result["failed_relations"]
+
+    # 変更された概念だけをバックグラウンドで埋め込む
+    changed_concepts = [c.model_dump() for c in request.concepts if c.id in changed_ids]
+    if changed_concepts or deleted_ids:
+        background_tasks.add_task(
+            get_vector_client().update_user_index, user_id, changed_concepts, deleted_ids, db
         )
 
+    return SyncResponse(
+        success=not (failed_concepts or failed_relations),
+        concepts_synced=len(request.concepts) - len(failed_concepts),
+        relations_synced=len(request.relations) - len(failed_relations),
+        storage=db.name,
+        concept_changes=SyncCounts(**result["concepts"]),
+        relation_changes=SyncCounts(**result["relations"]),
+        failed_concepts=failed_concepts,
+        failed_relations=failed_relations,
+    )
+
 
 @router.delete("/", response_model=ClearResponse)
-async def clear_graph(x_user_id: str | None = Header(default=None)):
-    """ナレッジグラフをクリアする"""
+async def clear_graph(
+    background_tasks: BackgroundTasks,
+    background: bool = False,
+    x_user_id: str | None = Header(default=None),
+):
+    """ナレッジグラフをクリアする
+
+    background=true の場合は削除をバックグラウンドジョブとして実行し、job_id を返す。
+    進捗と結果は GET /clear-jobs/{job_id} で確認する。
+    """
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        result = await db.clear_graph(user_id)
-        return ClearResponse(
-            success=True,
-            concepts_deleted=result["concepts_deleted"],
-            relations_deleted=result["relations_deleted"],
-        )
-    else:
-        storage = get_memory_storage(user_id)
-        concepts_count = len(storage.concepts)
-        relations_count = len(storage.relations)
-        storage.concepts = []
-        storage.relations = []
-        return ClearResponse(
-            success=True,
-            concepts_deleted=concepts_count,
-            relations_deleted=relations_count,
-        )
+    from api.db.vectors import get_vector_client
+    await get_vector_client().clear_user_embeddings(user_id)
+
+    if background:
+        job = _create_clear_job(user_id)
+        await db.set_clear_job(user_id, job)
+        background_tasks.add_task(_run_clear_job, job, db)
+        return ClearResponse(success=True, concepts_deleted=0, relations_deleted=0, job_id=job["job_id"])
+
+    result = await db.clear_graph(user_id)
+    return ClearResponse(
+        success=True,
+        concepts_deleted=result["concepts_deleted"],
+        relations_deleted=result["relations_deleted"],
+    )
+
+
+@router.get("/clear-jobs/{job_id}", response_model=ClearJobStatus)
+async def get_clear_job(job_id: str, x_user_id: str | None = Header(default=None)):
+    """バックグラウンドのグラフ削除ジョブの進捗を取得する
+
+    ジョブの状態はグラフストア（users/{uid}/meta）に保存するため、削除を実行している
+    インスタンス以外からも確認できる。ユーザーごとに最後に開始したジョブだけを保持する。
+    """
+    db = get_db()
+    job = await db.get_clear_job(get_user_id(x_user_id))
+    if job is None or job["job_id"] != job_id:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません（新しい削除ジョブに置き換えられた可能性があります）")
+    return ClearJobStatus(**job)
 
 
-@router.get("/concepts", response_model=list[Concept])
+def _create_clear_job(user_id: str) -> dict:
+    """削除ジョブの初期状態"""
+    import uuid
+
+    return {
+        "job_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "status": "running",
+        "progress": {},
+        "concepts_deleted": 0,
+        "relations_deleted": 0,
+        "error": None,
+    }
+
+
+async def _run_clear_job(job: dict, db) -> None:
+    """グラフストアのグラフを削除し、コレクションごとの削除件数をジョブに記録する
+
+    進捗は CLEAR_JOB_PROGRESS_INTERVAL 秒ごと、結果は終了時にストアへ保存する。
+    """
+    import asyncio
+    import contextlib
+
+    def report(collection: str, deleted: int) -> None:
+        job["progress"][collection] = deleted
+
+    async def save_progress() -> None:
+        while True:
+            await asyncio.sleep(CLEAR_JOB_PROGRESS_INTERVAL)
+            await db.set_clear_job(job["user_id"], {**job, "progress": dict(job["progress"])})
+
+    reporter = asyncio.create_task(save_progress())
+    try:
+        result = await db.clear_graph(job["user_id"], progress=report)
+        job.update(status="completed", **result)
+    except Exception as e:
+        print(f"Clear graph job failed: {e}")
+        job.update(status="failed", error=str(e))
+    finally:
+        reporter.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await reporter
+    try:
+        await db.set_clear_job(job["user_id"], job)
+    except Exception as e:
+        print(f"Failed to save clear graph job status: {e}")
+
+
+class ConceptListResponse(BaseModel):
+    concepts: list[dict]
+    next_page_token: str | None = None
+
+
+@router.get("/concepts", response_model=list[Concept] | ConceptListResponse)
 async def list_concepts(
     query: str | None = None,
     limit: int = 100,
+    fields: str | None = None,
+    page_size: int | None = None,
+    page_token: str | None = None,
     x_user_id: str | None = Header(default=None),
 ):
-    """概念一覧を取得する"""
-    user_id = get_user_id(x_user_id)
-    db = get_db()
+    """概念一覧を取得する
 
-    if db:
-        concepts = await db.get_all_concepts(user_id)
-        result = [Concept(**c) for c in concepts]
-    else:
-        result = get_memory_storage(user_id).concepts
+    page_size か page_token を指定するとID順（query 指定時は関連度順）にページングし、
+    続きは next_page_token を page_token に渡して取得する。指定しない場合は最大 limit 件を返す。
+    fields にカンマ区切りでフィールド名を指定すると、そのフィールド（と id）だけを返す。
+    ページングも fields も指定しない場合は、従来どおり概念のリストをそのまま返す。
+    """
+    from api.db.pagination import (
+        MAX_PAGE_SIZE,
+        paginate_ranked,
+        parse_fields,
+        project,
+        without_internal_fields,
+    )
 
-    # クエリでフィルタリング
-    if query:
-        query_lower = query.lower()
-        result = [
-            c for c in result
-            if query_lower in c.name.lower()
-            or query_lower in c.name_ja.lower()
-            or query_lower in c.definition.lower()
-        ]
+    user_id = get_user_id(x_user_id)
+    db = get_db()
+    projection = parse_fields(fields)
+    paginated = page_size is not None or page_token is not None
+    size = max(1, min(page_size or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    try:
+        # 転置インデックスで検索（関連度順）
+        if query:
+            from api.db.vectors import get_vector_client
+
+            concepts = await db.get_all_concepts(user_id)
+            lexical = get_vector_client().get_lexical_index(user_id, concepts)
+            concepts_by_id = {c["id"]: c for c in concepts}
+            if paginated:
+                hits = lexical.search(query, top_k=len(concepts), require_all=True)
+                ranked = [concepts_by_id[cid] for cid, _ in hits]
+                page, next_token = paginate_ranked(ranked, size, page_token, projection)
+            else:
+                hits = lexical.search(query, top_k=limit, require_all=True)
+                page = [project(concepts_by_id[cid], projection) for cid, _ in hits]
+                next_token = None
+        elif paginated:
+            page, next_token = await db.list_page(user_id, "concepts", size, page_token, projection)
+        else:
+            page, next_token = (await db.get_all_concepts(user_id, projection))[:limit], None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return result[:limit]
+    if not paginated and projection is None:
+        return [Concept(**c) for c in page]
+    return ConceptListResponse(concepts=without_internal_fields(page, projection), next_page_token=next_token)
 
 
 @router.get("/concepts/{concept_id}", response_model=Concept)
@@ -214,15 +459,9 @@ async def get_concept(
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        concept = await db.get_concept(user_id, concept_id)
-        if concept:
-            return Concept(**concept)
-    else:
-        storage = get_memory_storage(user_id)
-        for c in storage.concepts:
-            if c.id == concept_id:
-                return c
+    concept = await db.get_concept(user_id, concept_id)
+    if concept:
+        return Concept(**concept)
 
     raise HTTPException(status_code=404, detail="概念が見つかりません")
 
@@ -233,40 +472,39 @@ async def get_related_concepts(
     depth: int = 1,
     x_user_id: str | None = Header(default=None),
 ):
-    """関連する概念を取得する"""
+    """関連する概念を取得する
+
+    関係の source_id / target_id による隣接リストをたどるため、読み取りは
+    グラフ全体ではなく探索した概念の次数に比例する。近いホップ順に返す。
+    概念名だけを持つ関係は、移行状態を見て必要なときだけ探索の前に概念IDへ移行する。
+    """
+    import asyncio
+
+    from api.db.adjacency import ensure_relation_ids, k_hop
+
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        data = await db.get_graph(user_id)
-        concepts = {c["id"]: Concept(**c) for c in data["concepts"]}
-        relations = data["relations"]
-    else:
-        storage = get_memory_storage(user_id)
-        concepts = {c.id: c for c in storage.concepts}
-        relations = [r.model_dump() for r in storage.relations]
-
-    if concept_id not in concepts:
+    if await db.get_concept(user_id, concept_id) is None:
         raise HTTPException(status_code=404, detail="概念が見つかりません")
 
-    # 関連概念を探索
-    related_ids: set[str] = set()
-    current_ids = {concept_id}
+    await ensure_relation_ids(db, user_id)
+    hops = await k_hop(db, user_id, concept_id, depth)
+    related = await asyncio.gather(*(db.get_concept(user_id, cid) for cid in hops))
+    return [Concept(**c) for c in related if c is not None]
 
-    for _ in range(depth):
-        next_ids: set[str] = set()
-        for rel in relations:
-            if rel["source"] in current_ids and rel["target"] in concepts:
-                next_ids.add(rel["target"])
-            if rel["target"] in current_ids and rel["source"] in concepts:
-                next_ids.add(rel["source"])
-        related_ids.update(next_ids)
-        current_ids = next_ids
 
-    # 元の概念を除外
-    related_ids.discard(concept_id)
+@router.post("/migrate-relation-ids")
+async def migrate_relation_ids(x_user_id: str | None = Header(default=None)):
+    """概念名だけを持つ既存の関係を概念ID（source_id / target_id）に解決する
 
-    return [concepts[cid] for cid in related_ids if cid in concepts]
+    名前が複数の概念に一致する端点は解決せず、件数を ambiguous_endpoints に返す。
+    """
+    from api.db.adjacency import migrate_relation_ids as migrate
+
+    user_id = get_user_id(x_user_id)
+    db = get_db()
+    return {**await migrate(db, user_id), "storage": db.name}
 
 
 @router.get("/stats")
@@ -275,14 +513,9 @@ async def get_stats(x_user_id: str | None = Header(default=None)):
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        data = await db.get_graph(user_id)
-        concepts = data["concepts"]
-        relations = data["relations"]
-    else:
-        storage = get_memory_storage(user_id)
-        concepts = [c.model_dump() for c in storage.concepts]
-        relations = [r.model_dump() for r in storage.relations]
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
+    relations = data["relations"]
 
     # タイプ別集計
     type_counts: dict[str, int] = {}
@@ -301,7 +534,7 @@ async def get_stats(x_user_id: str | None = Header(default=None)):
         "total_relations": len(relations),
         "concept_types": type_counts,
         "relation_types": relation_type_counts,
-        "storage": "firestore" if db else "memory",
+        "storage": db.name,
     }
 
 
@@ -310,11 +543,18 @@ async def get_stats(x_user_id: str | None = Header(default=None)):
 class SemanticSearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    # ベクトル検索はコサイン類似度、字句検索は最上位との比（名前一致は 1.0）に適用
     threshold: float = 0.5
+    mode: Literal["hybrid", "vector", "lexical"] = "hybrid"
+    # 属性フィルタ（同じ属性内は OR、属性間は AND。空なら絞り込まない）
+    concept_types: list[str] = []
+    source_papers: list[str] = []
+    years: list[str] = []
 
 
 class SuggestRelationsRequest(BaseModel):
     threshold: float = 0.7
+    max_suggestions: int = 100
 
 
 class SimilarConceptResult(BaseModel):
@@ -322,6 +562,19 @@ class SimilarConceptResult(BaseModel):
     similarity: float
 
 
+def _filter_selection(
+    concept_types: list[str] | None,
+    source_papers: list[str] | None,
+    years: list[str] | None,
+) -> dict[str, list[str]]:
+    """リクエストの絞り込み条件を属性 → 値リストにまとめる"""
+    return {
+        "concept_type": concept_types or [],
+        "source_paper": source_papers or [],
+        "year": [str(year) for year in years or []],
+    }
+
+
 @router.post("/semantic-search", response_model=list[SimilarConceptResult])
 async def semantic_search(
     request: SemanticSearchRequest,
@@ -329,8 +582,14 @@ async def semantic_search(
 ):
     """テキストクエリで概念をセマンティック検索
 
-    Vertex AI Embeddings を使用して意味的に類似した概念を検索
+    Vertex AI Embeddings によるベクトル検索と、転置インデックスによる字句検索を
+    reciprocal rank fusion で統合する。名前が一致する概念だけで top_k を
+    満たせる場合や mode="lexical" の場合は埋め込み API を呼ばない。
+    concept_types / source_papers / years を指定すると、事前計算した行マスクで
+    top-k 選択の前に絞り込む。
     """
+    from api.db.filters import matching_ids
+    from api.db.lexical_index import reciprocal_rank_fusion
     from api.db.vectors import get_vector_client
 
     user_id = get_user_id(x_user_id)
@@ -338,36 +597,156 @@ async def semantic_search(
     vector_client = get_vector_client()
 
     # 概念を取得
-    if db:
-        data = await db.get_graph(user_id)
-        concepts = data["concepts"]
-    else:
-        storage = get_memory_storage(user_id)
-        concepts = [c.model_dump() for c in storage.concepts]
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
 
     if not concepts:
         return []
 
-    # 概念の埋め込みを生成
-    concepts_with_embeddings = []
-    for concept in concepts:
-        embedding = vector_client.generate_concept_embedding(concept)
-        concepts_with_embeddings.append((concept, embedding))
+    concepts_by_id = {c["id"]: c for c in concepts}
 
-    # 類似検索
-    results = vector_client.find_related_by_text(
-        request.query,
-        concepts_with_embeddings,
+    # 属性フィルタ
+    selected = _filter_selection(request.concept_types, request.source_papers, request.years)
+    memberships = await vector_client.filter_memberships(user_id, concepts, db, selected)
+    allowed = matching_ids(memberships, selected)
+    if allowed is not None and not allowed:
+        return []
+
+    # 字句検索
+    lexical_scores: dict[str, float] = {}
+    if request.mode != "vector":
+        lexical = vector_client.get_lexical_index(user_id, concepts)
+        lexical_hits = lexical.search(request.query, top_k=request.top_k * 2, allowed=allowed)
+        name_hits = lexical.name_matches(request.query, [cid for cid, _ in lexical_hits])
+        top_score = lexical_hits[0][1] if lexical_hits else 1.0
+        # 名前一致は 1.0、それ以外は最上位スコアとの比を類似度として扱う
+        lexical_scores = {
+            cid: 1.0 if cid in name_hits else score / top_score
+            for cid, score in lexical_hits
+        }
+        if request.mode == "lexical" or len(name_hits) >= request.top_k:
+            return _similar_results(concepts_by_id, _above_threshold(lexical_scores, request))
+
+    # ベクトル検索（内容が変わった概念のみ再埋め込み）
+    await vector_client.get_user_index(user_id, concepts, db)
+    query_embedding = (await vector_client.aembed_queries([request.query]))[0]
+    if query_embedding is None:
+        return _similar_results(concepts_by_id, _above_threshold(lexical_scores, request))
+
+    vector_hits = vector_client.search_user_index(
+        user_id,
+        query_embedding,
         top_k=request.top_k,
         threshold=request.threshold,
+        mask=vector_client.filter_mask(user_id, selected),
+    )
+    if request.mode == "vector":
+        return _similar_results(concepts_by_id, vector_hits)
+
+    # reciprocal rank fusion で統合
+    vector_scores = dict(vector_hits)
+    fused = reciprocal_rank_fusion([list(vector_scores), list(lexical_scores)])
+    return _similar_results(
+        concepts_by_id,
+        [
+            (cid, vector_scores.get(cid, lexical_scores.get(cid, 0.0)))
+            for cid, _ in fused[:request.top_k]
+        ],
     )
 
+
+def _above_threshold(scores: dict[str, float], request: SemanticSearchRequest) -> list[tuple[str, float]]:
+    """字句検索のスコアを閾値で絞り、上位 top_k 件を返す"""
+    return [(cid, score) for cid, score in scores.items() if score >= request.threshold][:request.top_k]
+
+
+class BatchSemanticSearchRequest(BaseModel):
+    queries: list[str]
+    top_k: int = 5
+    threshold: float = 0.5
+    # 全クエリに共通の属性フィルタ
+    concept_types: list[str] = []
+    source_papers: list[str] = []
+    years: list[str] = []
+
+
+class BatchSemanticSearchResult(BaseModel):
+    query: str
+    results: list[SimilarConceptResult]
+
+
+# バッチ検索で一度に受け付けるクエリ数の上限
+MAX_BATCH_QUERIES = 256
+
+
+@router.post("/semantic-search/batch", response_model=list[BatchSemanticSearchResult])
+async def semantic_search_batch(
+    request: BatchSemanticSearchRequest,
+    x_user_id: str | None = Header(default=None),
+):
+    """複数のテキストクエリでまとめてセマンティック検索
+
+    クエリはまとめて埋め込み（キャッシュ済みのクエリは再利用）、ユーザーの
+    インデックスとの1回の行列積で全クエリに答える。チューターが複数概念の
+    文脈を一度に引く用途を想定する。
+    """
+    from api.db.vectors import get_vector_client
+
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400, detail=f"クエリは最大 {MAX_BATCH_QUERIES} 件までです"
+        )
+
+    user_id = get_user_id(x_user_id)
+    db = get_db()
+    vector_client = get_vector_client()
+
+    # 概念を取得
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
+
+    if not concepts or not request.queries:
+        return [BatchSemanticSearchResult(query=q, results=[]) for q in request.queries]
+
+    concepts_by_id = {c["id"]: c for c in concepts}
+    selected = _filter_selection(request.concept_types, request.source_papers, request.years)
+    await vector_client.filter_memberships(user_id, concepts, db, selected)
+
+    await vector_client.get_user_index(user_id, concepts, db)
+    mask = vector_client.filter_mask(user_id, selected)
+    embeddings = await vector_client.aembed_queries(request.queries)
+
+    # 埋め込めたクエリだけをまとめて検索
+    embedded = [i for i, e in enumerate(embeddings) if e is not None]
+    hits: list[list[tuple[str, float]]] = [[] for _ in request.queries]
+    if embedded:
+        found = vector_client.search_user_index_batch(
+            user_id,
+            [embeddings[i] for i in embedded],
+            top_k=request.top_k,
+            threshold=request.threshold,
+            mask=mask,
+        )
+        for i, results in zip(embedded, found):
+            hits[i] = results
+
+    return [
+        BatchSemanticSearchResult(query=query, results=_similar_results(concepts_by_id, results))
+        for query, results in zip(request.queries, hits)
+    ]
+
+
+def _similar_results(
+    concepts_by_id: dict[str, dict],
+    hits: list[tuple[str, float]],
+) -> list[SimilarConceptResult]:
+    """(概念ID, 類似度) のリストをレスポンスに変換"""
     return [
         SimilarConceptResult(
-            concept=Concept(**concept),
+            concept=Concept(**concepts_by_id[concept_id]),
             similarity=round(similarity, 3),
         )
-        for concept, similarity in results
+        for concept_id, similarity in hits
     ]
 
 
@@ -387,23 +766,21 @@ async def suggest_relations(
     vector_client = get_vector_client()
 
     # グラフデータを取得
-    if db:
-        data = await db.get_graph(user_id)
-        concepts = data["concepts"]
-        relations = data["relations"]
-    else:
-        storage = get_memory_storage(user_id)
-        concepts = [c.model_dump() for c in storage.concepts]
-        relations = [r.model_dump() for r in storage.relations]
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
+    relations = data["relations"]
 
     if len(concepts) < 2:
         return {"suggestions": [], "message": "関係性を提案するには2つ以上の概念が必要です"}
 
     # 暗黙的な関係性を発見
+    index = await vector_client.get_user_index(user_id, concepts, db)
     suggestions = vector_client.suggest_implicit_relations(
         concepts,
         relations,
         similarity_threshold=request.threshold,
+        index=index,
+        max_suggestions=request.max_suggestions,
     )
 
     return {
@@ -412,14 +789,101 @@ async def suggest_relations(
     }
 
 
+class ResolveEntitiesRequest(BaseModel):
+    threshold: float | None = None
+
+
+@router.post("/resolve-entities")
+async def resolve_entities(
+    request: ResolveEntitiesRequest,
+    background_tasks: BackgroundTasks,
+    x_user_id: str | None = Header(default=None),
+):
+    """重複した概念を正準ノードに統合する
+
+    英語名の正規化キーが一致する概念と、埋め込みの類似度が閾値以上の概念のうち種類が同じものを
+    クラスタにまとめ、関係の多い概念を正準ノードとして残す。関係は正準ノードへ
+    付け替え、統合された概念は別名テーブルに記録する。
+    """
+    from collections import Counter
+
+    from api.db.entity_resolution import (
+        ENTITY_SIMILARITY_THRESHOLD,
+        apply_resolution,
+        cluster_canonicals,
+        cluster_pairs,
+        embedding_pairs,
+        name_pairs,
+        rewire_relations,
+    )
+    from api.db.vectors import get_vector_client
+
+    user_id = get_user_id(x_user_id)
+    db = get_db()
+    vector_client = get_vector_client()
+
+    # グラフデータを取得
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
+    relations = data["relations"]
+
+    # 重複候補をクラスタにまとめる
+    embeddings = await vector_client.get_concept_embeddings(user_id, concepts, db)
+    threshold = ENTITY_SIMILARITY_THRESHOLD if request.threshold is None else request.threshold
+    pairs = name_pairs(concepts) + embedding_pairs(concepts, embeddings, threshold)
+    clusters = cluster_pairs(len(concepts), pairs)
+    if not clusters:
+        return {"clusters": 0, "concepts_merged": 0, "relations_rewired": 0, "relations_dropped": 0}
+
+    # 関係の次数が大きい概念を正準ノードにする
+    degree = Counter()
+    for relation in relations:
+        degree[relation.get("source_id") or relation["source"]] += 1
+        degree[relation.get("target_id") or relation["target"]] += 1
+    weights = [degree[c["id"]] + degree[c.get("name", "")] for c in concepts]
+    canonical_for = cluster_canonicals(concepts, clusters, weights)
+
+    _, id_map, name_map, aliases = apply_resolution(concepts, canonical_for)
+    rewired = rewire_relations(relations, id_map, name_map)
+    relations_by_id = {r["id"]: r for r in relations}
+    kept_ids = {r["id"] for r in rewired}
+    changed_relations = [r for r in rewired if r is not relations_by_id[r["id"]]]
+    dropped_relation_ids = [r["id"] for r in relations if r["id"] not in kept_ids]
+    canonicals = list({c["id"]: c for c in canonical_for.values()}.values())
+    removed_ids = list(id_map)
+
+    await db.add_concepts_batch(user_id, canonicals)
+    await db.delete_documents_batch(user_id, "concepts", removed_ids)
+    await db.delete_documents_batch(user_id, "concept_embeddings", removed_ids)
+    if changed_relations:
+        await db.add_relations_batch(user_id, changed_relations)
+    await db.delete_documents_batch(user_id, "relations", dropped_relation_ids)
+    await save_aliases(user_id, db, aliases)
+
+    # 統合された行を削除し、フィールドを補った正準ノードだけを再埋め込み
+    background_tasks.add_task(
+        vector_client.update_user_index, user_id, canonicals, removed_ids, db
+    )
+
+    return {
+        "clusters": len(clusters),
+        "concepts_merged": len(removed_ids),
+        "relations_rewired": len(changed_relations),
+        "relations_dropped": len(dropped_relation_ids),
+    }
+
+
 @router.get("/concepts/{concept_id}/similar", response_model=list[SimilarConceptResult])
 async def get_similar_concepts(
     concept_id: str,
     top_k: int = 5,
     threshold: float = 0.5,
+    concept_type: str | None = None,
+    source_paper: str | None = None,
+    year: str | None = None,
     x_user_id: str | None = Header(default=None),
 ):
-    """特定の概念に意味的に類似した概念を取得"""
+    """特定の概念に意味的に類似した概念を取得（種類・論文・年で絞り込み可能）"""
     from api.db.vectors import get_vector_client
 
     user_id = get_user_id(x_user_id)
@@ -427,48 +891,100 @@ async def get_similar_concepts(
     vector_client = get_vector_client()
 
     # 概念を取得
-    if db:
-        data = await db.get_graph(user_id)
-        concepts = data["concepts"]
-    else:
-        storage = get_memory_storage(user_id)
-        concepts = [c.model_dump() for c in storage.concepts]
-
-    # 対象概念を検索
-    target_concept = None
-    other_concepts = []
-    for c in concepts:
-        if c["id"] == concept_id:
-            target_concept = c
-        else:
-            other_concepts.append(c)
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
 
-    if target_concept is None:
+    concepts_by_id = {c["id"]: c for c in concepts}
+    if concept_id not in concepts_by_id:
         raise HTTPException(status_code=404, detail="概念が見つかりません")
 
-    # 対象概念の埋め込みを生成
-    target_embedding = vector_client.generate_concept_embedding(target_concept)
+    # ベクトルインデックスを同期
+    index = await vector_client.get_user_index(user_id, concepts, db)
+    target_embedding = index.vector(concept_id)
     if target_embedding is None:
         return []
 
-    # 他の概念の埋め込みを生成
-    concepts_with_embeddings = []
-    for concept in other_concepts:
-        embedding = vector_client.generate_concept_embedding(concept)
-        concepts_with_embeddings.append((concept, embedding))
+    # 属性フィルタ
+    selected = _filter_selection(
+        [concept_type] if concept_type else None,
+        [source_paper] if source_paper else None,
+        [year] if year else None,
+    )
+    await vector_client.filter_memberships(user_id, concepts, db, selected)
 
     # 類似検索
-    results = vector_client.find_similar_concepts(
+    results = vector_client.search_user_index(
+        user_id,
         target_embedding,
-        concepts_with_embeddings,
         top_k=top_k,
         threshold=threshold,
+        exclude=[concept_id],
+        mask=vector_client.filter_mask(user_id, selected),
     )
 
     return [
         SimilarConceptResult(
-            concept=Concept(**concept),
+            concept=Concept(**concepts_by_id[cid]),
             similarity=round(similarity, 3),
         )
-        for concept, similarity in results
+        for cid, similarity in results
     ]
+
+
+@router.get("/cache-stats")
+async def get_graph_cache_stats():
+    """グラフのキャッシュの統計情報を取得（キャッシュを持つのは Firestore のみ）"""
+    db = get_db()
+    return {"storage": db.name, **db.graph_cache_stats()}
+
+
+@router.get("/embeddings/cache-stats")
+async def get_embedding_cache_stats():
+    """埋め込みキャッシュの統計情報を取得"""
+    from api.db.vectors import get_vector_client
+
+    return get_vector_client().cache_stats()
+
+
+class ReductionEvalRequest(BaseModel):
+    dims: list[int] = [384, 256, 128]
+    methods: list[str] = ["truncate", "pca"]
+    top_k: int = 10
+
+
+@router.post("/embeddings/reduction-eval")
+async def evaluate_embedding_reduction(
+    request: ReductionEvalRequest,
+    x_user_id: str | None = Header(default=None),
+):
+    """次元削減による検索再現率の低下を評価
+
+    ユーザーの概念埋め込みを使い、全次元の厳密検索に対する
+    削減後の recall@k とインデックスのメモリ比を方式・次元ごとに返す。
+    """
+    from api.db.dim_reduction import REDUCTION_METHODS
+    from api.db.vectors import get_vector_client
+
+    unknown = [m for m in request.methods if m not in REDUCTION_METHODS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未対応の次元削減方式です: {unknown}")
+
+    user_id = get_user_id(x_user_id)
+    db = get_db()
+
+    # 概念を取得
+    data = await db.get_graph(user_id)
+    concepts = data["concepts"]
+
+    if len(concepts) < 2:
+        return {"results": [], "message": "評価するには2つ以上の概念が必要です"}
+
+    results = await get_vector_client().evaluate_reduction(
+        user_id,
+        concepts,
+        db,
+        dims=request.dims,
+        methods=tuple(request.methods),
+        top_k=request.top_k,
+    )
+    return {"results": results}
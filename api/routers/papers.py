@@ -11,18 +11,16 @@ from pypdf import PdfReader
 
 router = APIRouter()
 
-# Firestore クライアント（遅延初期化）
+# グラフストア（遅延初期化）
 _db_client = None
 
 
 def get_db():
-    """Firestoreクライアントを取得"""
+    """グラフストアを取得（GRAPH_STORE で Firestore / SQLite / インメモリを選ぶ）"""
     global _db_client
     if _db_client is None:
-        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-        if project_id:
-            from api.db.firestore import get_firestore_client
-            _db_client = get_firestore_client()
+        from api.db.store import get_graph_store
+        _db_client = get_graph_store()
     return _db_client
 
 
@@ -31,9 +29,6 @@ def get_user_id(x_user_id: str | None = None) -> str:
     return x_user_id or "anonymous"
 
 
-# インメモリストレージ（Firestore未設定時のフォールバック）
-_memory_papers: dict[str, list[dict]] = {}
-
 # Gemini クライアント（遅延初期化）
 _client = None
 
@@ -70,6 +65,8 @@ class Relation(BaseModel):
     source: str
     target: str
     relation_type: str
+    source_id: str | None = None  # 端点を解決した概念ID（解決できなければ None）
+    target_id: str | None = None
 
 
 class PaperSummary(BaseModel):
@@ -101,6 +98,7 @@ class PaperResponse(BaseModel):
     concepts: list[Concept] = []
     relations: list[Relation] = []
     summary: PaperSummary | None = None
+    merged_concepts: int = 0  # 既存グラフの概念に統合した数
 
 
 class ExtractionResult(BaseModel):
@@ -248,8 +246,15 @@ async def extract_concepts_with_gemini(text: str) -> dict:
 
 
 @router.post("/upload", response_model=PaperResponse)
-async def upload_paper(file: UploadFile = File(...)):
-    """論文をアップロードして概念を抽出する"""
+async def upload_paper(
+    file: UploadFile = File(...),
+    x_user_id: str | None = Header(default=None),
+):
+    """論文をアップロードして概念を抽出する
+
+    抽出した概念は既存のナレッジグラフと照合し、同じ概念は既存の正準ノードの
+    ID を返すことで、論文ごとに重複したノードが増えないようにする。
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="ファイル名が必要です")
 
@@ -308,6 +313,17 @@ async def upload_paper(file: UploadFile = File(...)):
         for r in extraction.get("relations", [])
     ]
 
+    # 既存グラフ・同じ論文内の重複概念を正準ノードに統合
+    from api.routers.graph import resolve_new_concepts
+
+    resolved_concepts, resolved_relations, merged_count = await resolve_new_concepts(
+        get_user_id(x_user_id),
+        [c.model_dump() for c in concepts],
+        [r.model_dump() for r in relations],
+    )
+    concepts = [Concept(**c) for c in resolved_concepts]
+    relations = [Relation(**r) for r in resolved_relations]
+
     # 要約情報を整形
     summary_data = extraction.get("summary", {})
     summary = PaperSummary(
@@ -338,10 +354,11 @@ async def upload_paper(file: UploadFile = File(...)):
         concepts=concepts,
         relations=relations,
         summary=summary,
+        merged_concepts=merged_count,
     )
 
 
-# ========== 論文 Firestore 同期 API ==========
+# ========== 論文の保存 API ==========
 
 class StoredPaper(BaseModel):
     id: str
@@ -361,6 +378,7 @@ class StorePaperResponse(BaseModel):
 class PaperListResponse(BaseModel):
     papers: list[dict]
     storage: str
+    next_page_token: str | None = None
 
 
 @router.post("/store", response_model=StorePaperResponse)
@@ -368,40 +386,49 @@ async def store_paper(
     paper: StoredPaper,
     x_user_id: str | None = Header(default=None),
 ):
-    """論文をFirestore（またはメモリ）に保存する"""
+    """論文をグラフストアに保存する（同じIDは上書き）"""
+    from api.db.vectors import get_vector_client
+
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    paper_data = paper.model_dump()
-
-    if db:
-        await db.add_paper(user_id, paper_data)
-        return StorePaperResponse(success=True, paper_id=paper.id, storage="firestore")
-    else:
-        if user_id not in _memory_papers:
-            _memory_papers[user_id] = []
-        # 既存を上書き
-        _memory_papers[user_id] = [
-            p for p in _memory_papers[user_id] if p["id"] != paper.id
-        ]
-        _memory_papers[user_id].append(paper_data)
-        return StorePaperResponse(success=True, paper_id=paper.id, storage="memory")
+    await db.add_paper(user_id, paper.model_dump())
+    get_vector_client().update_filter_papers(user_id, papers=[paper.model_dump()])
+    return StorePaperResponse(success=True, paper_id=paper.id, storage=db.name)
 
 
 @router.get("/stored/list", response_model=PaperListResponse)
 async def list_stored_papers(
+    fields: str | None = None,
+    page_size: int | None = None,
+    page_token: str | None = None,
     x_user_id: str | None = Header(default=None),
 ):
-    """保存された論文一覧を取得する"""
+    """保存された論文一覧を取得する
+
+    fields にカンマ区切りでフィールド名（"summary.title" のようなネストも可）を指定すると、
+    そのフィールド（と id）だけを返す。page_size か page_token を指定するとID順にページングし、
+    続きは next_page_token を page_token に渡して取得する。
+    """
+    from api.db.pagination import MAX_PAGE_SIZE, parse_fields, without_internal_fields
+
     user_id = get_user_id(x_user_id)
     db = get_db()
+    projection = parse_fields(fields)
+    paginated = page_size is not None or page_token is not None
+    size = max(1, min(page_size or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+
+    try:
+        if paginated:
+            papers, next_token = await db.list_page(user_id, "papers", size, page_token, projection)
+        else:
+            papers, next_token = await db.get_all_papers(user_id, projection), None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if db:
-        papers = await db.get_all_papers(user_id)
-        return PaperListResponse(papers=papers, storage="firestore")
-    else:
-        papers = _memory_papers.get(user_id, [])
-        return PaperListResponse(papers=papers, storage="memory")
+    return PaperListResponse(
+        papers=without_internal_fields(papers, projection), storage=db.name, next_page_token=next_token
+    )
 
 
 @router.delete("/stored/{paper_id}")
@@ -410,18 +437,14 @@ async def delete_stored_paper(
     x_user_id: str | None = Header(default=None),
 ):
     """保存された論文を削除する"""
+    from api.db.vectors import get_vector_client
+
     user_id = get_user_id(x_user_id)
     db = get_db()
 
-    if db:
-        await db.delete_paper(user_id, paper_id)
-        return {"success": True, "storage": "firestore"}
-    else:
-        if user_id in _memory_papers:
-            _memory_papers[user_id] = [
-                p for p in _memory_papers[user_id] if p["id"] != paper_id
-            ]
-        return {"success": True, "storage": "memory"}
+    await db.delete_paper(user_id, paper_id)
+    get_vector_client().update_filter_papers(user_id, removed_ids=[paper_id])
+    return {"success": True, "storage": db.name}
 
 
 # ========== 個別論文取得（動的ルートは末尾に配置）==========
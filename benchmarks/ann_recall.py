@@ -0,0 +1,74 @@
+"""近似最近傍インデックスの再現率・レイテンシ計測スクリプト
+
+IVF-Flat（api.db.ann_index）を厳密検索（api.db.vector_index）と比較し、
+nprobe ごとの recall@k と平均クエリ時間を表示する。
+
+    python -m benchmarks.ann_recall --size 100000 --nprobe 1 4 8 16 32
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from api.db.ann_index import IVFFlatIndex
+from api.db.vector_index import VectorIndex, normalize_rows
+
+
+def make_dataset(size: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """概念埋め込みに近いクラスタ構造を持つ合成データを生成"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.normal(size=(clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, clusters, size=size)
+    noise = rng.normal(scale=0.6 / np.sqrt(dim), size=(size, dim)).astype(np.float32)
+    return normalize_rows(centers[labels] + noise)
+
+
+def time_queries(search, queries: np.ndarray) -> tuple[list[list[str]], float]:
+    """全クエリを実行し、結果と平均レイテンシ（ミリ秒）を返す"""
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append([cid for cid, _ in search(q)])
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF-Flat recall vs latency benchmark")
+    parser.add_argument("--size", type=int, default=100_000, help="ベクトル数")
+    parser.add_argument("--dim", type=int, default=768, help="次元数")
+    parser.add_argument("--clusters", type=int, default=500, help="合成データのクラスタ数")
+    parser.add_argument("--queries", type=int, default=200, help="クエリ数")
+    parser.add_argument("--top-k", type=int, default=10, help="recall@k の k")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF のセル数")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="走査セル数")
+    args = parser.parse_args()
+
+    vectors = make_dataset(args.size, args.dim, args.clusters)
+    ids = [f"c{i}" for i in range(args.size)]
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)]
+
+    exact = VectorIndex()
+    exact.add(ids, vectors)
+
+    start = time.perf_counter()
+    ann = IVFFlatIndex.build(ids, vectors, nlist=args.nlist)
+    build_time = time.perf_counter() - start
+    print(f"vectors={args.size} dim={args.dim} nlist={ann.nlist} build={build_time:.1f}s")
+    print(f"serialized={len(ann.to_bytes()) / 1e6:.1f} MB")
+
+    truth, exact_ms = time_queries(lambda q: exact.search(q, args.top_k), queries)
+    print(f"exact        latency={exact_ms:7.2f} ms  recall@{args.top_k}=1.000")
+
+    for nprobe in args.nprobe:
+        found, ann_ms = time_queries(lambda q: ann.search(q, args.top_k, nprobe=nprobe), queries)
+        recall = np.mean([
+            len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)
+        ])
+        print(f"nprobe={nprobe:<5} latency={ann_ms:7.2f} ms  recall@{args.top_k}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""埋め込みの次元削減による再現率・メモリ計測スクリプト
+
+truncate（Matryoshka 的な先頭次元の切り詰め）と pca（api.db.dim_reduction）を
+全次元の厳密検索と比較し、次元ごとの recall@k とクエリ時間を表示する。
+実データで評価する場合は、埋め込みを (N, D) の .npy で保存して --input に渡す。
+
+    python -m benchmarks.dim_reduction_recall --dims 384 256 128
+    python -m benchmarks.dim_reduction_recall --input embeddings.npy
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from api.db.dim_reduction import (
+    REDUCTION_METHODS,
+    DimensionReducer,
+    evaluate_reduction_recall,
+)
+from api.db.vector_index import VectorIndex
+from benchmarks.ann_recall import make_dataset
+
+
+def query_latency(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> float:
+    """VectorIndex での平均クエリ時間（ミリ秒）"""
+    index = VectorIndex()
+    index.add([f"c{i}" for i in range(vectors.shape[0])], vectors)
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q, top_k)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding dimensionality reduction recall benchmark")
+    parser.add_argument("--input", default=None, help="埋め込み行列の .npy（省略時は合成データ）")
+    parser.add_argument("--size", type=int, default=20_000, help="合成データのベクトル数")
+    parser.add_argument("--dim", type=int, default=768, help="合成データの次元数")
+    parser.add_argument("--clusters", type=int, default=200, help="合成データのクラスタ数")
+    parser.add_argument("--queries", type=int, default=200, help="クエリ数")
+    parser.add_argument("--top-k", type=int, default=10, help="recall@k の k")
+    parser.add_argument("--dims", type=int, nargs="+", default=[384, 256, 128], help="削減後の次元数")
+    parser.add_argument("--methods", nargs="+", default=list(REDUCTION_METHODS), help="削減方式")
+    args = parser.parse_args()
+
+    if args.input:
+        vectors = np.load(args.input).astype(np.float32)
+    else:
+        vectors = make_dataset(args.size, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(vectors.shape[0], min(args.queries, vectors.shape[0]), replace=False)]
+
+    full_ms = query_latency(vectors, queries, args.top_k)
+    print(f"vectors={vectors.shape[0]} dim={vectors.shape[1]}")
+    print(f"full         dim={vectors.shape[1]:<5} latency={full_ms:7.2f} ms  recall@{args.top_k}=1.000")
+
+    for method in args.methods:
+        for dim in args.dims:
+            reducer = DimensionReducer(method, dim)
+            result = evaluate_reduction_recall(vectors, reducer, args.top_k, args.queries)
+            reduced_ms = query_latency(reducer.transform(vectors), reducer.transform(queries), args.top_k)
+            print(
+                f"{method:<12} dim={dim:<5} latency={reduced_ms:7.2f} ms  "
+                f"recall@{result['top_k']}={result['recall']:.3f}  memory={result['memory_ratio']:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
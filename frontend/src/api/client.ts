@@ -73,6 +73,8 @@ export interface Relation {
   source: string;
   target: string;
   relation_type: string;
+  source_id?: string | null; // 端点を解決した概念ID
+  target_id?: string | null;
 }
 
 export async function uploadPaper(file: File): Promise<PaperResponse> {
@@ -272,13 +274,28 @@ export function streamActivities(
 export interface GraphSyncRequest {
   concepts: Concept[];
   relations: Relation[];
+  delete_missing?: boolean;
 }
 
+export interface SyncCounts {
+  added: number;
+  updated: number;
+  unchanged: number;
+  deleted: number;
+}
+
+// バックエンドのグラフストア（GRAPH_STORE）
+export type StorageBackend = "firestore" | "sqlite" | "memory";
+
 export interface GraphSyncResponse {
   success: boolean;
   concepts_synced: number;
   relations_synced: number;
-  storage: "firestore" | "memory";
+  storage: StorageBackend;
+  concept_changes?: SyncCounts;
+  relation_changes?: SyncCounts;
+  failed_concepts?: Record<string, string>;
+  failed_relations?: Record<string, string>;
 }
 
 export interface GraphStatsResponse {
@@ -286,16 +303,18 @@ export interface GraphStatsResponse {
   total_relations: number;
   concept_types: Record<string, number>;
   relation_types: Record<string, number>;
-  storage: "firestore" | "memory";
+  storage: StorageBackend;
 }
 
 export async function syncGraph(
   concepts: Concept[],
-  relations: Relation[]
+  relations: Relation[],
+  deleteMissing = false
 ): Promise<GraphSyncResponse> {
   const response = await apiClient.post<GraphSyncResponse>("/api/graph/sync", {
     concepts,
     relations,
+    delete_missing: deleteMissing,
   });
   return response.data;
 }
@@ -305,8 +324,24 @@ export async function getGraphFromServer(): Promise<{ concepts: Concept[]; relat
   return response.data;
 }
 
-export async function clearGraphOnServer(): Promise<{ success: boolean; concepts_deleted: number; relations_deleted: number }> {
-  const response = await apiClient.delete("/api/graph/");
+export async function clearGraphOnServer(
+  background = false
+): Promise<{ success: boolean; concepts_deleted: number; relations_deleted: number; job_id?: string | null }> {
+  const response = await apiClient.delete("/api/graph/", { params: background ? { background } : undefined });
+  return response.data;
+}
+
+export interface ClearJobStatus {
+  job_id: string;
+  status: "running" | "completed" | "failed";
+  progress: Record<string, number>;
+  concepts_deleted: number;
+  relations_deleted: number;
+  error: string | null;
+}
+
+export async function getClearJob(jobId: string): Promise<ClearJobStatus> {
+  const response = await apiClient.get<ClearJobStatus>(`/api/graph/clear-jobs/${jobId}`);
   return response.data;
 }
 
@@ -385,8 +420,22 @@ export async function storePaper(paper: StoredPaper): Promise<{ success: boolean
   return response.data;
 }
 
-export async function listStoredPapers(): Promise<{ papers: StoredPaper[]; storage: string }> {
-  const response = await apiClient.get("/api/papers/stored/list");
+export interface ListStoredPapersOptions {
+  fields?: string[];
+  pageSize?: number;
+  pageToken?: string;
+}
+
+export async function listStoredPapers(
+  options: ListStoredPapersOptions = {}
+): Promise<{ papers: StoredPaper[]; storage: string; next_page_token?: string | null }> {
+  const response = await apiClient.get("/api/papers/stored/list", {
+    params: {
+      fields: options.fields?.join(","),
+      page_size: options.pageSize,
+      page_token: options.pageToken,
+    },
+  });
   return response.data;
 }
 
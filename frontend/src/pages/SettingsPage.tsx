@@ -3,7 +3,7 @@ import { useGraphStore } from "../stores/graphStore";
 import { useLearningPathStore } from "../stores/learningPathStore";
 import { usePaperStore } from "../stores/paperStore";
 import { useSettingsStore } from "../stores/settingsStore";
-import { getGraphStats, setApiBaseUrl, apiClient } from "../api/client";
+import { getGraphStats, setApiBaseUrl, apiClient, type StorageBackend } from "../api/client";
 
 export function SettingsPage() {
   const { concepts, relations, clearGraph } = useGraphStore();
@@ -15,7 +15,7 @@ export function SettingsPage() {
   );
   const [saved, setSaved] = useState(false);
   const [storageType, setStorageType] = useState<
-    "firestore" | "memory" | "checking" | "error"
+    StorageBackend | "checking" | "error"
   >("checking");
   const [showClearConfirm, setShowClearConfirm] = useState(false);
   const [importMessage, setImportMessage] = useState<{
@@ -178,6 +178,8 @@ export function SettingsPage() {
             <span className="storage-badge offline">接続エラー</span>
           ) : storageType === "firestore" ? (
             <span className="storage-badge firestore">Firestore</span>
+          ) : storageType === "sqlite" ? (
+            <span className="storage-badge sqlite">SQLite</span>
           ) : (
             <span className="storage-badge memory">ローカルのみ</span>
           )}
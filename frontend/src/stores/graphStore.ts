@@ -1,6 +1,6 @@
 import { create } from "zustand";
 import { persist } from "zustand/middleware";
-import { syncGraph, getGraphFromServer } from "../api/client";
+import { syncGraph, getGraphFromServer, type StorageBackend } from "../api/client";
 
 export type ConceptType =
   | "method"
@@ -53,6 +53,8 @@ export interface Relation {
   source: string;
   target: string;
   relation_type: string;
+  source_id?: string | null; // 端点を解決した概念ID
+  target_id?: string | null;
 }
 
 export interface GraphNode {
@@ -83,7 +85,7 @@ interface GraphStore {
   relations: Relation[];
   syncStatus: "idle" | "syncing" | "synced" | "error";
   lastSyncedAt: string | null;
-  storageType: "local" | "firestore" | "memory";
+  storageType: "local" | StorageBackend;
   addConcepts: (concepts: Concept[]) => void;
   addRelations: (relations: Relation[]) => void;
   clearGraph: () => void;
@@ -137,16 +139,17 @@ export const useGraphStore = create<GraphStore>()(
           val: 1,
         }));
 
-        // 概念名からIDへのマッピング
+        // 概念IDで端点を解決（IDがない関係は概念名から引く）
         const nameToId = new Map(concepts.map((c) => [c.name, c.id]));
+        const conceptIds = new Set(concepts.map((c) => c.id));
 
         const links: GraphLink[] = relations
           .map((r) => ({
-            source: nameToId.get(r.source) || r.source,
-            target: nameToId.get(r.target) || r.target,
+            source: r.source_id || nameToId.get(r.source) || r.source,
+            target: r.target_id || nameToId.get(r.target) || r.target,
             label: r.relation_type,
           }))
-          .filter((l) => nameToId.has(l.source) || nameToId.has(l.target));
+          .filter((l) => conceptIds.has(l.source) && conceptIds.has(l.target));
 
         return { nodes, links };
       },
@@ -157,10 +160,13 @@ export const useGraphStore = create<GraphStore>()(
 
         try {
           const result = await syncGraph(concepts, relations);
+          if (!result.success) {
+            console.error("Sync partially failed:", result.failed_concepts, result.failed_relations);
+          }
           set({
-            syncStatus: "synced",
+            syncStatus: result.success ? "synced" : "error",
             lastSyncedAt: new Date().toISOString(),
-            storageType: result.storage === "firestore" ? "firestore" : "memory",
+            storageType: result.storage,
           });
         } catch (error) {
           console.error("Sync failed:", error);
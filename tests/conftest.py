@@ -0,0 +1,17 @@
+"""テスト共通のフィクスチャ"""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def clustered_vectors():
+    """クラスタ構造を持つ乱数ベクトルを作る関数（実際の埋め込みに近い分布）"""
+
+    def make(n: int, dim: int = 32, clusters: int = 16, seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(clusters, dim))
+        labels = rng.integers(0, clusters, size=n)
+        return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+    return make
@@ -0,0 +1,146 @@
+"""テスト用のインメモリの Firestore 非同期クライアント
+
+FirestoreClient が使う操作（ドキュメントの読み書き、WriteBatch、ドキュメントID順の
+ページング、射影と単純な where）だけを実装する。SERVER_TIMESTAMP は書き込み時の時刻に置き換える。
+"""
+
+import operator
+from datetime import UTC, datetime
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.transforms import Increment
+
+from api.db import firestore as firestore_module
+
+DOCUMENT_ID = FieldPath.document_id()
+OPERATORS = {"<": operator.lt, ">": operator.gt, "==": operator.eq}
+
+
+class FakeSnapshot:
+    def __init__(self, path, data):
+        self.id = path.rsplit("/", 1)[-1]
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db, self.path = db, path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    async def get(self):
+        return FakeSnapshot(self.path, self.db.docs.get(self.path))
+
+    async def set(self, data, merge=False):
+        self.db.apply(("set", self.path, data, merge))
+
+    async def delete(self):
+        self.db.apply(("delete", self.path, None, False))
+
+
+class FakeCollection:
+    """コレクション参照とクエリを兼ねる（ドキュメントID順に並べる）"""
+
+    def __init__(self, db, path, after=None, count=None, filters=()):
+        self.db, self.path, self.after, self.count, self.filters = db, path, after, count, filters
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, f"{self.path}/{doc_id}")
+
+    def select(self, fields):
+        return self
+
+    def order_by(self, field):
+        assert field == DOCUMENT_ID
+        return self
+
+    def where(self, filter):
+        return FakeCollection(self.db, self.path, self.after, self.count, (*self.filters, filter))
+
+    def limit(self, count):
+        return FakeCollection(self.db, self.path, self.after, count, self.filters)
+
+    def start_after(self, cursor):
+        after = cursor[DOCUMENT_ID] if isinstance(cursor, dict) else cursor.id
+        return FakeCollection(self.db, self.path, after, self.count, self.filters)
+
+    def _matches(self, data):
+        return all(
+            f.field_path in data and OPERATORS[f.op_string](data[f.field_path], f.value) for f in self.filters
+        )
+
+    async def stream(self):
+        self.db.streams += 1
+        paths = sorted(
+            path for path in self.db.docs
+            if path.rsplit("/", 1)[0] == self.path
+            and (self.after is None or path.rsplit("/", 1)[1] > self.after)
+            and self._matches(self.db.docs[path])
+        )
+        for path in paths[:self.count]:
+            yield FakeSnapshot(path, self.db.docs[path])
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(("set", ref.path, data, merge))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref.path, None, False))
+
+    async def commit(self):
+        # WriteBatch と同じく全件成功か全件失敗
+        assert len(self.ops) <= firestore_module.FIRESTORE_BATCH_SIZE
+        self.db.batch_sizes.append(len(self.ops))
+        failing = [path for _, path, _, _ in self.ops if self.db.failures.get(path.rsplit("/", 1)[1], 0) > 0]
+        if failing:
+            for path in failing:
+                self.db.failures[path.rsplit("/", 1)[1]] -= 1
+            raise RuntimeError("contention")
+        for op in self.ops:
+            self.db.apply(op)
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+        # ドキュメントID → 残りの失敗回数（そのドキュメントを含むバッチのコミットが失敗する）
+        self.failures: dict[str, float] = {}
+        self.batch_sizes: list[int] = []
+        self.streams = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def apply(self, op):
+        kind, path, data, merge = op
+        if kind == "delete":
+            self.docs.pop(path, None)
+            return
+        current = dict(self.docs.get(path, {})) if merge else {}
+        for key, value in data.items():
+            if isinstance(value, Increment):
+                value = current.get(key, 0) + value.value
+            elif value is firestore.SERVER_TIMESTAMP:
+                value = datetime.now(UTC)
+            current[key] = value
+        self.docs[path] = current
+
+    def collection_ids(self, user_id, name):
+        prefix = f"users/{user_id}/{name}/"
+        return sorted(path[len(prefix):] for path in self.docs if path.startswith(prefix))
@@ -0,0 +1,249 @@
+"""関係の端点の概念IDへの解決・移行と、隣接リストによる近傍探索"""
+
+import importlib.util
+import sqlite3
+from pathlib import Path
+
+import pytest
+from google.cloud.firestore_v1.transforms import Increment
+
+from api.db.adjacency import (
+    EndpointResolver,
+    ensure_relation_ids,
+    k_hop,
+    migrate_relation_ids,
+)
+from api.db.memory_store import MemoryGraphStore
+from api.db.sqlite_store import SQLiteGraphStore
+
+CONCEPTS = [
+    {"id": "c1", "name": "Transformer", "definition": "attention model"},
+    {"id": "c2", "name": "BERT", "definition": "encoder"},
+    {"id": "c3", "name": "GPT", "definition": "decoder"},
+]
+RELATIONS = [
+    {"id": "r1", "source": "BERT", "target": "Transformer", "relation_type": "uses"},
+    {"id": "r2", "source": "GPT", "target": "Transformer", "relation_type": "uses"},
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "graph.db")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, db_path):
+    return MemoryGraphStore() if request.param == "memory" else SQLiteGraphStore(db_path)
+
+
+def test_resolver_tiers_and_ambiguity():
+    resolver = EndpointResolver([
+        {"id": "c1", "name": "注意機構", "name_en": "Attention"},
+        {"id": "c2", "name": "Attention", "name_ja": "アテンション"},
+        {"id": "c3", "name": "BERT", "name_en": "BERT model"},
+        {"id": "c4", "name": "BERT", "name_en": "BERT-base"},
+    ])
+
+    assert resolver.resolve("c1") == "c1"
+    # 表示名の一致を英語名の一致より優先する
+    assert resolver.resolve("Attention") == "c2"
+    assert resolver.resolve("アテンション") == "c2"
+    assert resolver.resolve("BERT model") == "c3"
+    assert resolver.resolve("BERT") is None
+    assert resolver.is_ambiguous("BERT")
+    assert resolver.resolve("unknown") is None
+    assert not resolver.is_ambiguous("unknown")
+
+
+async def test_sync_resolves_relation_endpoints(store):
+    await store.sync_graph("u", CONCEPTS, RELATIONS)
+    relations = {r["id"]: r for r in await store.get_all_relations("u")}
+
+    assert (relations["r1"]["source_id"], relations["r1"]["target_id"]) == ("c2", "c1")
+    assert await store.get_neighbors("u", ["c1"]) == {"c1": ["c2", "c3"]}
+    assert await k_hop(store, "u", "c2", 2) == {"c1": 1, "c3": 2}
+
+
+async def test_migrates_legacy_database_and_name_only_relations(db_path):
+    # source_id / target_id 列がない古いスキーマに、名前だけの関係を保存しておく
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE relations (user_id TEXT NOT NULL, id TEXT NOT NULL, source TEXT NOT NULL, "
+            "target TEXT NOT NULL, content_hash TEXT, data TEXT NOT NULL, PRIMARY KEY (user_id, id))"
+        )
+        conn.execute(
+            "INSERT INTO relations (user_id, id, source, target, data) VALUES (?, ?, ?, ?, ?)",
+            ("u", "r1", "BERT", "Transformer", '{"id":"r1","source":"BERT","target":"Transformer"}'),
+        )
+
+    store = SQLiteGraphStore(db_path)
+    await store.add_concepts_batch("u", CONCEPTS)
+    assert await store.get_neighbors("u", ["c1"]) == {"c1": []}
+
+    result = await migrate_relation_ids(store, "u")
+    assert result["migrated"] == 1
+    assert await store.get_neighbors("u", ["c1"]) == {"c1": ["c2"]}
+    assert (await migrate_relation_ids(store, "u"))["migrated"] == 0
+
+
+async def test_ambiguous_names_are_not_resolved(store):
+    concepts = [*CONCEPTS, {"id": "c4", "name": "BERT", "definition": "another"}]
+    await store.add_concepts_batch("u", concepts)
+    await store.add_relations_batch("u", RELATIONS[:1])
+
+    result = await migrate_relation_ids(store, "u")
+    assert result["ambiguous_endpoints"] == 1
+    relation = (await store.get_all_relations("u"))[0]
+    assert relation.get("source_id") is None
+    assert relation["target_id"] == "c1"
+
+
+async def test_relation_written_before_its_concept_is_migrated_later(store):
+    await store.sync_graph("u", CONCEPTS[:2], RELATIONS)
+    await ensure_relation_ids(store, "u")
+    assert await k_hop(store, "u", "c1") == {"c2": 1}
+
+    # 未解決の端点が残っている間に概念が追加されたら移行し直す
+    await store.add_concepts_batch("u", CONCEPTS[2:])
+    await ensure_relation_ids(store, "u")
+    assert await k_hop(store, "u", "c1") == {"c2": 1, "c3": 1}
+
+
+async def test_unresolved_write_triggers_migration(store):
+    await store.sync_graph("u", CONCEPTS, RELATIONS)
+    await ensure_relation_ids(store, "u")
+    assert (await store.get_relation_ids_state("u"))["unresolved"] == 0
+
+    # 概念IDを持たない関係を書き込んだ側がカウンタを増やす（エージェントの書き込みなど）
+    await store.add_relations_batch("u", [{"id": "r3", "source": "GPT", "target": "BERT"}])
+    await store.mark_unresolved_relations("u", 1)
+    await ensure_relation_ids(store, "u")
+    assert await k_hop(store, "u", "c3") == {"c1": 1, "c2": 1}
+
+
+async def test_migration_state_is_persisted(db_path, monkeypatch):
+    store = SQLiteGraphStore(db_path)
+    await store.sync_graph("u", CONCEPTS, RELATIONS)
+    await ensure_relation_ids(store, "u")
+
+    # 再起動後（別のインスタンス）は保存した状態を見て移行しない
+    restarted = SQLiteGraphStore(db_path)
+
+    async def fail(*args):
+        raise AssertionError("移行済みのグラフを読み直した")
+
+    monkeypatch.setattr(restarted, "get_all_relations", fail)
+    await ensure_relation_ids(restarted, "u")
+    await restarted.add_concepts_batch("u", [{"id": "c4", "name": "T5"}])
+    await ensure_relation_ids(restarted, "u")
+
+
+# ---------- エージェントのツール（Firestore 同期クライアントの代替） ----------
+
+
+class FakeSnapshot:
+    def __init__(self, docs, path):
+        self.id = path.rsplit("/", 1)[1]
+        self.exists = path in docs
+        self._data = docs.get(path, {})
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    def __init__(self, docs, path, filters=(), count=None):
+        self.docs, self.path, self.filters, self.count = docs, path, filters, count
+
+    def where(self, filter):
+        return FakeQuery(self.docs, self.path, (*self.filters, filter), self.count)
+
+    def limit(self, count):
+        return FakeQuery(self.docs, self.path, self.filters, count)
+
+    def stream(self):
+        matches = [
+            FakeSnapshot(self.docs, key)
+            for key, data in self.docs.items()
+            if key.rsplit("/", 1)[0] == self.path
+            and all(data.get(f.field_path) == f.value for f in self.filters)
+        ]
+        return matches[:self.count] if self.count else matches
+
+    def document(self, doc_id):
+        return FakeDocument(self.docs, f"{self.path}/{doc_id}")
+
+
+class FakeDocument:
+    def __init__(self, docs, path):
+        self.docs, self.path = docs, path
+
+    def collection(self, name):
+        return FakeQuery(self.docs, f"{self.path}/{name}")
+
+
+class FakeBatch:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def set(self, ref, data, merge=False):
+        current = self.docs.get(ref.path, {}) if merge else {}
+        for key, value in data.items():
+            if isinstance(value, Increment):
+                value = current.get(key, 0) + value.value
+            current = {**current, key: value}
+        self.docs[ref.path] = current
+
+    def commit(self):
+        pass
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+
+    def collection(self, name):
+        return FakeQuery(self.docs, name)
+
+    def batch(self):
+        return FakeBatch(self.docs)
+
+
+@pytest.fixture
+def agent_tools(monkeypatch):
+    # google.adk を読み込まないよう、ツールのモジュールだけを読み込む
+    path = Path(__file__).resolve().parents[1] / "agents" / "graph" / "tools.py"
+    spec = importlib.util.spec_from_file_location("graph_agent_tools", path)
+    tools = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tools)
+
+    db = FakeFirestore()
+    monkeypatch.setattr(tools, "_get_firestore_db", lambda: db)
+    tools.set_current_user("u")
+    for concept in [
+        {"id": "c1", "name": "注意機構", "name_en": "Attention"},
+        {"id": "c2", "name": "BERT", "name_en": "BERT model"},
+        {"id": "c3", "name": "BERT", "name_en": "BERT-base"},
+    ]:
+        db.docs[f"users/u/concepts/{concept['id']}"] = concept
+    return tools, db
+
+
+def test_agent_resolves_endpoints_like_the_api(agent_tools):
+    tools, db = agent_tools
+    result = tools.add_relation("Attention", "BERT model", "uses")
+    relation = db.docs[f"users/u/relations/{result['relation_id']}"]
+
+    assert (relation["source_id"], relation["target_id"]) == ("c1", "c2")
+    assert "users/u/meta/relation_ids" not in db.docs
+
+
+def test_agent_marks_unresolved_relations(agent_tools):
+    tools, db = agent_tools
+    tools.add_relation("注意機構", "BERT", "uses")
+    tools.add_relation("注意機構", "GPT", "uses")
+    relations = [data for key, data in db.docs.items() if key.startswith("users/u/relations/")]
+
+    assert {r["target_id"] for r in relations} == {None}
+    assert db.docs["users/u/meta/relation_ids"]["pending"] == 2
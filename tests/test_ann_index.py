@@ -0,0 +1,77 @@
+"""IVFFlatIndex の再現率とシリアライズ"""
+
+import numpy as np
+import pytest
+
+from api.db.ann_index import IVFFlatIndex
+from api.db.vector_index import VectorIndex
+
+
+@pytest.fixture
+def dataset(clustered_vectors):
+    vectors = clustered_vectors(3000, dim=32, clusters=24)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    return ids, vectors
+
+
+def recall_at_k(ann: IVFFlatIndex, exact: VectorIndex, queries: np.ndarray, top_k: int) -> float:
+    hits = 0
+    for query in queries:
+        truth = {cid for cid, _ in exact.search(query, top_k=top_k)}
+        hits += len(truth & {cid for cid, _ in ann.search(query, top_k=top_k)})
+    return hits / (len(queries) * top_k)
+
+
+def test_recall_against_exact_search(dataset):
+    ids, vectors = dataset
+    exact = VectorIndex()
+    exact.add(ids, vectors)
+    ann = IVFFlatIndex.build(ids, vectors, nprobe=8)
+
+    assert len(ann) == len(ids)
+    assert ann.is_trained
+    assert recall_at_k(ann, exact, vectors[:50] + 0.05, top_k=10) >= 0.9
+
+
+def test_probing_every_cell_equals_exact_search(dataset):
+    ids, vectors = dataset
+    exact = VectorIndex()
+    exact.add(ids, vectors)
+    ann = IVFFlatIndex.build(ids, vectors, nlist=64, nprobe=1)
+    queries = vectors[:40] + 0.05
+
+    assert recall_at_k(ann, exact, queries, top_k=10) < 1.0
+    ann.nprobe = ann.nlist
+    assert recall_at_k(ann, exact, queries, top_k=10) == pytest.approx(1.0)
+
+
+def test_serialization_round_trip(dataset):
+    ids, vectors = dataset
+    ann = IVFFlatIndex.build(ids, vectors, nprobe=4, storage="float16")
+    restored = IVFFlatIndex.from_bytes(ann.to_bytes())
+
+    assert len(restored) == len(ann)
+    assert (restored.nlist, restored.nprobe, restored.storage) == (ann.nlist, 4, "float16")
+    np.testing.assert_array_equal(restored.centroids, ann.centroids)
+    for query in vectors[:10]:
+        assert restored.search(query, top_k=5) == ann.search(query, top_k=5)
+
+
+def test_untrained_index_cannot_be_serialized():
+    with pytest.raises(RuntimeError):
+        IVFFlatIndex().to_bytes()
+
+
+def test_sync_applies_changes_after_loading(dataset):
+    ids, vectors = dataset
+    restored = IVFFlatIndex.from_bytes(IVFFlatIndex.build(ids, vectors).to_bytes())
+
+    # c0 を削除し、c1 のベクトルを変え、new を追加した状態に合わせる
+    current_ids = ids[1:] + ["new"]
+    current = np.concatenate([vectors[1:], vectors[:1]])
+    current[0] = -vectors[1]
+    assert restored.sync(current_ids, current) == 3
+
+    assert "c0" not in restored and "new" in restored
+    assert restored.search(-vectors[1], top_k=1)[0][0] == "c1"
+    assert restored.sync(current_ids, current) == 0
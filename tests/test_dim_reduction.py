@@ -0,0 +1,101 @@
+"""DimensionReducer と、次元削減を有効にしたときのインデックス更新"""
+
+import numpy as np
+import pytest
+
+from api.db import vectors
+from api.db.dim_reduction import DimensionReducer
+from api.db.embedding_backends import LocalHashingEmbeddingBackend
+
+
+def concepts(*names: str) -> list[dict]:
+    return [{"id": name, "name": name, "definition": f"{name} の定義"} for name in names]
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    """削減方式と次元を指定して VectorSearchClient を作る（再構築の回数を数える）"""
+
+    def make(method: str, dim: int, segments: bool = False):
+        monkeypatch.setattr(vectors, "EMBEDDING_REDUCTION", method)
+        monkeypatch.setattr(vectors, "EMBEDDING_REDUCED_DIM", dim)
+        monkeypatch.setattr(vectors, "PCA_MIN_SAMPLES", 8)
+        monkeypatch.setattr(vectors, "EMBEDDING_SEGMENT_DIR", str(tmp_path) if segments else None)
+        client = vectors.VectorSearchClient(backend=LocalHashingEmbeddingBackend(dim=16))
+        client.rebuilds = 0
+        rebuild = client._rebuild_reduced_index
+
+        async def counting_rebuild(*args):
+            client.rebuilds += 1
+            return await rebuild(*args)
+
+        client._rebuild_reduced_index = counting_rebuild
+        return client
+
+    return make
+
+
+def test_truncate_keeps_leading_dimensions():
+    reducer = DimensionReducer("truncate", 2)
+    reduced = reducer.transform([[3.0, 4.0, 12.0]])
+
+    np.testing.assert_allclose(reduced, [[0.6, 0.8]], atol=1e-6)
+    assert reducer.output_dim == 2
+    assert not reducer.applies_to(reduced[0])
+
+
+def test_output_dim_is_clamped_to_input_dim():
+    reducer = DimensionReducer("truncate", 64).fit(np.ones((2, 16)))
+
+    assert reducer.output_dim == 16
+    assert not reducer.applies_to(np.ones(16))
+
+
+def test_pca_round_trip(clustered_vectors):
+    data = clustered_vectors(200)
+    reducer = DimensionReducer("pca", 8).fit(data)
+    restored = DimensionReducer.from_bytes(reducer.to_bytes())
+
+    assert restored.fitted
+    np.testing.assert_allclose(restored.transform(data), reducer.transform(data), atol=1e-6)
+
+
+def test_pca_requires_enough_samples():
+    with pytest.raises(ValueError):
+        DimensionReducer("pca", 8).fit(np.ones((4, 16)))
+
+
+@pytest.mark.parametrize("segments", [False, True])
+async def test_reduced_dim_above_embedding_dim_does_not_rebuild(make_client, segments):
+    client = make_client("truncate", 64, segments=segments)
+    await client.update_user_index("u", concepts("alpha", "beta"))
+    index = await client.update_user_index("u", concepts("gamma", "delta"))
+    index = await client.update_user_index("u", concepts("epsilon"))
+
+    assert index.dim == 16
+    assert len(index) == 5
+    assert client.rebuilds == 0
+
+
+@pytest.mark.parametrize("segments", [False, True])
+async def test_pca_fits_then_rebuilds_once(make_client, segments):
+    client = make_client("pca", 4, segments=segments)
+    index = await client.update_user_index("u", concepts("a1", "a2", "a3"))
+    # 学習に足りない間は全次元のまま保持する
+    assert index.dim == 16
+    assert client.rebuilds == 0
+
+    names = [f"concept {i}" for i in range(6)]
+    index = await client.update_user_index("u", concepts(*names))
+    assert index.dim == 4
+    assert len(index) == 9
+    assert client.rebuilds == 1
+
+    index = await client.update_user_index("u", concepts("later"))
+    assert index.dim == 4
+    assert client.rebuilds == 1
+
+    # 全次元のクエリも射影して検索できる
+    query = client._backend.embed([client.concept_embedding_text(concepts("later")[0])])[0]
+    hits = client.search_user_index("u", query, top_k=1, threshold=-1.0)
+    assert hits[0][0] == "later"
@@ -0,0 +1,61 @@
+"""埋め込みバックエンドの選択と、ローカルのハッシュ埋め込み"""
+
+import numpy as np
+import pytest
+
+from api.db.embedding_backends import (
+    EmbeddingBackend,
+    GeminiEmbeddingBackend,
+    LocalHashingEmbeddingBackend,
+    create_embedding_backend,
+)
+
+
+def cosine(a, b) -> float:
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_create_backend_by_name():
+    assert isinstance(create_embedding_backend("local"), LocalHashingEmbeddingBackend)
+    assert isinstance(create_embedding_backend("gemini"), GeminiEmbeddingBackend)
+    with pytest.raises(ValueError):
+        create_embedding_backend("openai")
+
+
+def test_backends_satisfy_protocol():
+    assert isinstance(LocalHashingEmbeddingBackend(dim=8), EmbeddingBackend)
+    assert isinstance(GeminiEmbeddingBackend(), EmbeddingBackend)
+
+
+def test_local_embeddings_are_deterministic_unit_vectors():
+    backend = LocalHashingEmbeddingBackend(dim=64)
+    first, second = backend.embed(["Transformer attention", "Transformer attention"])
+
+    assert len(first) == 64
+    np.testing.assert_array_equal(first, second)
+    assert np.linalg.norm(first) == pytest.approx(1.0, abs=1e-6)
+    assert backend.model == "local-char-ngram-hash-64"
+
+
+def test_local_embeddings_follow_surface_similarity():
+    backend = LocalHashingEmbeddingBackend(dim=256)
+    base, variant, unrelated, width = backend.embed([
+        "graph neural network", "graph neural networks", "stochastic gradient descent", "ＧＲＡＰＨ neural network",
+    ])
+
+    assert cosine(base, variant) > 0.9
+    assert cosine(base, variant) > cosine(base, unrelated)
+    # NFKC 正規化で全角・半角の違いは消える
+    np.testing.assert_allclose(base, width, atol=1e-6)
+
+
+def test_empty_text_gives_zero_vector():
+    vector = LocalHashingEmbeddingBackend(dim=16).embed(["   "])[0]
+    assert not np.any(vector)
+
+
+async def test_aembed_matches_embed():
+    backend = LocalHashingEmbeddingBackend(dim=32)
+    texts = ["BERT", "GPT"]
+    for sync_vector, async_vector in zip(backend.embed(texts), await backend.aembed(texts)):
+        np.testing.assert_array_equal(sync_vector, async_vector)
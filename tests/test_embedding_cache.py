@@ -0,0 +1,56 @@
+"""EmbeddingCache の LRU 追い出し・バイト上限・TTL"""
+
+import numpy as np
+
+from api.db import embedding_cache
+from api.db.embedding_cache import EmbeddingCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") is not None
+    cache.put("c", [3.0])
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.evictions == 1
+
+
+def test_byte_limit_and_overwrite_keep_resident_bytes_consistent():
+    vector = np.zeros(256, dtype=np.float32)
+    entry_bytes = EmbeddingCache._entry_bytes("k0", vector)
+    cache = EmbeddingCache(max_bytes=entry_bytes * 3)
+    for i in range(5):
+        cache.put(f"k{i}", vector)
+    cache.put("k4", vector)
+
+    assert len(cache) == 3
+    assert cache.stats()["resident_bytes"] == entry_bytes * 3
+    cache.clear()
+    assert cache.stats()["resident_bytes"] == 0
+
+
+def test_put_stores_float32():
+    cache = EmbeddingCache()
+    stored = cache.put("a", [0.5, 0.25])
+    assert stored.dtype == np.float32
+    np.testing.assert_array_equal(cache.get("a"), [0.5, 0.25])
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: now[0])
+    cache = EmbeddingCache(ttl=10)
+    cache.put("q", [1.0])
+
+    now[0] = 105.0
+    assert cache.get("q") is not None
+    now[0] = 110.0
+    assert cache.get("q") is None
+    assert "q" not in cache
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
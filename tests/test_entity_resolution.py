@@ -0,0 +1,122 @@
+"""概念のエンティティ解決（照合キー・クラスタ・関係の付け替え・新規概念の統合）"""
+
+import pytest
+
+from api.db import vectors
+from api.db.embedding_backends import LocalHashingEmbeddingBackend
+from api.db.entity_resolution import (
+    alias_record,
+    apply_resolution,
+    cluster_canonicals,
+    cluster_pairs,
+    name_pairs,
+    normalize_concept_name,
+    rewire_relations,
+)
+from api.db.memory_store import MemoryGraphStore
+from api.routers import graph
+
+
+@pytest.mark.parametrize("name, key", [
+    ("Transformers (Vaswani et al.)", "transformer"),
+    ("Attention-Mechanisms", "attention mechanism"),
+    ("Policies", "policy"),
+    ("Caches", "cache"),
+    ("Boxes", "box"),
+    ("Analysis", "analysis"),
+    ("Time Series", "time series"),
+    ("ＢＥＲＴ", "bert"),
+])
+def test_normalize_concept_name(name, key):
+    assert normalize_concept_name(name) == key
+
+
+def test_name_pairs_require_same_concept_type():
+    concepts = [
+        {"id": "a", "name": "Transformer", "concept_type": "method"},
+        {"id": "b", "name": "transformers", "concept_type": "method"},
+        {"id": "c", "name": "Transformer", "concept_type": "dataset"},
+    ]
+    assert name_pairs(concepts) == [(0, 1)]
+
+
+def test_clusters_pick_heaviest_canonical_and_merge_fields():
+    concepts = [
+        {"id": "a", "name": "BERT", "definition": ""},
+        {"id": "b", "name": "bert", "definition": "encoder", "name_ja": "バート"},
+        {"id": "c", "name": "GPT"},
+        {"id": "d", "name": "Bert model"},
+    ]
+    clusters = cluster_pairs(len(concepts), [(0, 1), (1, 3)])
+    assert clusters == [[0, 1, 3]]
+
+    canonical_for = cluster_canonicals(concepts, clusters, weights=[1, 3, 0, 3])
+    canonical = canonical_for[0]
+    assert canonical["id"] == "b"
+    assert canonical_for[3] is canonical
+
+    resolved, id_map, name_map, aliases = apply_resolution(concepts, canonical_for)
+    assert [c["id"] for c in resolved] == ["b", "c"]
+    assert id_map == {"a": "b", "d": "b"}
+    assert name_map == {"BERT": "bert", "Bert model": "bert"}
+    assert aliases["a"] == alias_record(concepts[0], canonical)
+
+
+def test_rewire_relations_drops_self_loops_and_duplicates():
+    relations = [
+        {"id": "r1", "source": "a", "target": "c", "relation_type": "uses"},
+        {"id": "r2", "source": "d", "target": "c", "relation_type": "uses"},
+        {"id": "r3", "source": "a", "target": "b", "relation_type": "is-a"},
+        {"id": "r4", "source": "BERT", "target": "GPT", "relation_type": "improves",
+         "source_id": "a", "target_id": "c"},
+        {"id": "r5", "source": "c", "target": "b", "relation_type": "uses"},
+    ]
+    rewired = rewire_relations(relations, {"a": "b", "d": "b"}, {"BERT": "bert"})
+
+    assert [r["id"] for r in rewired] == ["r1", "r4", "r5"]
+    assert (rewired[0]["source"], rewired[0]["target"]) == ("b", "c")
+    assert (rewired[1]["source"], rewired[1]["source_id"]) == ("bert", "b")
+    # 変更のない関係はそのまま返す
+    assert rewired[2] is relations[4]
+
+
+async def test_resolve_new_concepts_merges_into_existing_graph(monkeypatch):
+    store = MemoryGraphStore()
+    monkeypatch.setattr(graph, "_db_client", store)
+    monkeypatch.setattr(
+        vectors, "_vector_client",
+        vectors.VectorSearchClient(backend=LocalHashingEmbeddingBackend(dim=64)),
+    )
+    await store.add_concepts_batch("u", [
+        {"id": "c1", "name": "Transformer", "definition": "attention model", "concept_type": "method"},
+    ])
+    await store.set_aliases_batch("u", {
+        "old": alias_record(
+            {"id": "old", "name": "Self-Attention Network"}, {"id": "c1", "name": "Transformer"}
+        ),
+    })
+
+    concepts = [
+        {"id": "n1", "name": "Transformers", "definition": "", "concept_type": "method"},
+        {"id": "n2", "name": "self attention networks", "definition": "", "concept_type": "method"},
+        {"id": "n3", "name": "BERT", "definition": "encoder", "concept_type": "method"},
+        {"id": "n4", "name": "bert", "definition": "", "name_ja": "バート", "concept_type": "method"},
+        {"id": "n5", "name": "ImageNet", "definition": "images", "concept_type": "dataset"},
+    ]
+    relations = [
+        {"id": "r1", "source": "n3", "target": "n1", "relation_type": "uses"},
+        {"id": "r2", "source": "n4", "target": "n1", "relation_type": "uses"},
+        {"id": "r3", "source": "n1", "target": "n2", "relation_type": "is-a"},
+        {"id": "r4", "source": "BERT", "target": "ImageNet", "relation_type": "evaluates-on"},
+    ]
+    resolved, rewired, merged = await graph.resolve_new_concepts("u", concepts, relations)
+
+    assert merged == 3
+    assert [c["id"] for c in resolved] == ["c1", "n3", "n5"]
+    assert resolved[1]["name_ja"] == "バート"
+    assert [(r["id"], r["source_id"], r["target_id"]) for r in rewired] == [
+        ("r1", "n3", "c1"),
+        ("r4", "n3", "n5"),
+    ]
+    aliases = {a["alias_id"]: a["canonical_id"] for a in await store.get_all_aliases("u")}
+    assert aliases == {"old": "c1", "n1": "c1", "n2": "c1", "n4": "n3"}
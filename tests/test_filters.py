@@ -0,0 +1,120 @@
+"""属性フィルタの所属表とビットマップ（top-k 選択前のマスク）"""
+
+import numpy as np
+import pytest
+
+from api.db import vectors
+from api.db.embedding_backends import LocalHashingEmbeddingBackend
+from api.db.filters import FilterBitmaps, FilterIndex, matching_ids
+from api.db.segments import SegmentStore
+from api.db.vector_index import VectorIndex
+
+CONCEPTS = [
+    {"id": "a", "concept_type": "method", "source_paper": "p1"},
+    {"id": "b", "concept_type": "dataset", "source_paper": "p1"},
+    {"id": "c", "concept_type": "method", "source_paper": "p2"},
+    {"id": "d"},
+]
+PAPERS = [
+    {"id": "p1", "summary": {"year": 2017}, "conceptIds": ["a", "b"]},
+    {"id": "p2", "summary": {"year": 2019}, "conceptIds": ["c", "a"]},
+]
+
+
+@pytest.fixture
+def filter_index():
+    index = FilterIndex()
+    index.update_concepts(CONCEPTS)
+    index.set_papers(PAPERS)
+    return index
+
+
+def test_memberships_combine_concepts_and_papers(filter_index):
+    memberships = filter_index.memberships()
+
+    assert memberships["concept_type"] == {"method": {"a", "c"}, "dataset": {"b"}, "concept": {"d"}}
+    # 統合された概念は複数の論文に属する
+    assert memberships["source_paper"] == {"p1": {"a", "b"}, "p2": {"a", "c"}}
+    assert memberships["year"] == {"2017": {"a", "b"}, "2019": {"a", "c"}}
+
+
+def test_versions_change_only_when_memberships_change(filter_index):
+    versions = dict(filter_index.versions)
+    filter_index.update_concepts(CONCEPTS)
+    filter_index.update_papers(PAPERS)
+    assert filter_index.versions == versions
+
+    filter_index.update_concepts([{**CONCEPTS[0], "concept_type": "task"}], removed_ids=["d"])
+    assert filter_index.versions["concept_type"] > versions["concept_type"]
+    assert filter_index.versions["year"] == versions["year"]
+    assert filter_index.memberships()["concept_type"] == {"task": {"a"}, "method": {"c"}, "dataset": {"b"}}
+
+    filter_index.update_papers([], removed_ids=["p2"])
+    assert filter_index.memberships()["year"] == {"2017": {"a", "b"}}
+    assert filter_index.memberships()["source_paper"]["p2"] == {"c"}
+
+
+def test_sync_concepts_drops_missing(filter_index):
+    filter_index.sync_concepts(CONCEPTS[:2])
+    assert len(filter_index) == 2
+    assert filter_index.memberships()["concept_type"]["method"] == {"a"}
+
+
+def test_matching_ids_or_within_and_across(filter_index):
+    memberships = filter_index.memberships()
+    assert matching_ids(memberships, {"concept_type": ["method", "dataset"]}) == {"a", "b", "c"}
+    assert matching_ids(memberships, {"concept_type": ["method"], "year": ["2017"]}) == {"a"}
+    assert matching_ids(memberships, {"concept_type": []}) is None
+
+
+def test_bitmaps_follow_rows_and_reuse_masks(filter_index):
+    index = VectorIndex()
+    index.add(["a", "b", "c", "d"], np.eye(4, dtype=np.float32))
+    bitmaps = FilterBitmaps(index)
+
+    mask = bitmaps.mask(filter_index, {"concept_type": ["method"], "source_paper": ["p1", "p2"]})
+    assert [cid for cid, selected in zip(index.ids, mask) if selected] == ["a", "c"]
+    assert bitmaps.mask(filter_index, {}) is None
+
+    masks = bitmaps.field_masks("concept_type", {}, filter_index.versions["concept_type"])
+    assert bitmaps.field_masks("concept_type", {}, filter_index.versions["concept_type"]) is masks
+
+    index.remove(["b"])
+    assert not bitmaps.is_current(index)
+
+
+def test_mask_is_applied_before_top_k():
+    index = VectorIndex()
+    index.add(["a", "b", "c"], [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+    mask = np.zeros(index.row_count, dtype=bool)
+    mask[index.row_positions(["c"])] = True
+    assert [cid for cid, _ in index.search([1.0, 0.0], top_k=3, mask=mask)] == ["c"]
+
+
+def test_segment_mask_spans_segments(tmp_path):
+    store = SegmentStore(tmp_path)
+    store.append("u", ["a", "b"], [[1.0, 0.0], [0.9, 0.1]])
+    store.append("u", ["c"], [[0.0, 1.0]], deleted=["b"])
+    view = store.open("u")
+
+    mask = np.zeros(view.row_count, dtype=bool)
+    mask[view.row_positions(["b", "c"])] = True
+    assert view.search([1.0, 0.0], top_k=3, mask=mask) == [("c", pytest.approx(0.0, abs=1e-6))]
+    assert [[cid for cid, _ in hits] for hits in view.search_batch([[1.0, 0.0]], top_k=3, mask=mask)] == [["c"]]
+
+
+async def test_client_filters_search_by_concept_type():
+    client = vectors.VectorSearchClient(backend=LocalHashingEmbeddingBackend(dim=64))
+    concepts = [
+        {"id": "m1", "name": "graph neural network", "concept_type": "method"},
+        {"id": "d1", "name": "graph neural network benchmark", "concept_type": "dataset"},
+        {"id": "m2", "name": "stochastic gradient descent", "concept_type": "method"},
+    ]
+    await client.get_user_index("u", concepts)
+    selected = {"concept_type": ["dataset"]}
+    await client.filter_memberships("u", concepts, None, selected)
+    mask = client.filter_mask("u", selected)
+
+    query = client._backend.embed(["graph neural network"])[0]
+    hits = client.search_user_index("u", query, top_k=2, threshold=-1.0, mask=mask)
+    assert [cid for cid, _ in hits] == ["d1"]
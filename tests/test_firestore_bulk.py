@@ -0,0 +1,105 @@
+"""Firestore の一括書き込み（インメモリの非同期クライアントで実行）"""
+
+import pytest
+
+from api.db import firestore as firestore_module
+from api.db.firestore import TOMBSTONE_COLLECTION, FirestoreClient
+from tests.fake_firestore import FakeAsyncClient
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(firestore_module, "FIRESTORE_BACKOFF_BASE", 0.0)
+    return FakeAsyncClient()
+
+
+@pytest.fixture
+def client(db):
+    client = FirestoreClient("test-project")
+    client._client = db
+    return client
+
+
+def concepts(count: int) -> list[dict]:
+    return [{"id": f"c{i:04d}", "name": f"concept {i}"} for i in range(count)]
+
+
+async def test_bulk_write_splits_into_batches_within_the_limit(client, db):
+    result = await client.add_concepts_batch("u", concepts(1234))
+
+    assert len(result["written"]) == 1234
+    assert result["failed"] == {}
+    # 概念は削除の墓標と同じバッチに収まるよう 250 件ずつコミットする
+    assert db.batch_sizes == [250] * 4 + [234]
+    assert len(db.collection_ids("u", "concepts")) == 1234
+    # 書き込み1回につきバージョンを1つ上げる
+    assert db.docs["users/u/meta/graph"]["version"] == 1
+
+
+async def test_other_collections_use_full_batches(client, db):
+    writes = {f"c{i:04d}": {"embedding": [0.0]} for i in range(1234)}
+    result = await client.bulk_write("u", "concept_embeddings", writes)
+
+    assert len(result["written"]) == 1234
+    assert db.batch_sizes == [500, 500, 234]
+    assert "users/u/meta/graph" not in db.docs
+
+
+async def test_failed_batch_is_retried_in_smaller_chunks(client, db):
+    db.failures["c0007"] = 2
+    result = await client.add_concepts_batch("u", concepts(600))
+
+    assert result["failed"] == {}
+    assert sorted(result["written"]) == [c["id"] for c in concepts(600)]
+    # 失敗したバッチの 250 件だけを 1/8 ずつ小さくして再試行する
+    assert db.batch_sizes[:3] == [250, 250, 100]
+    assert db.batch_sizes[3:] == [31] * 8 + [2] + [3] * 10 + [1]
+    assert len(db.collection_ids("u", "concepts")) == 600
+
+
+async def test_persistent_failure_is_reported_per_document(client, db):
+    db.failures["c0042"] = float("inf")
+    result = await client.add_concepts_batch("u", concepts(300))
+
+    assert list(result["failed"]) == ["c0042"]
+    assert result["failed"]["c0042"] == "contention"
+    assert len(result["written"]) == 299
+    assert "c0042" not in db.collection_ids("u", "concepts")
+
+
+async def test_deletes_write_tombstones_within_the_batch_limit(client, db):
+    await client.add_concepts_batch("u", concepts(600))
+    db.batch_sizes.clear()
+
+    result = await client.bulk_write("u", "concepts", dict.fromkeys(c["id"] for c in concepts(300)))
+
+    assert len(result["written"]) == 300
+    # 削除1件が墓標と合わせて2操作になる
+    assert db.batch_sizes == [500, 100]
+    assert len(db.collection_ids("u", "concepts")) == 300
+    assert len(db.collection_ids("u", TOMBSTONE_COLLECTION)) == 300
+    assert db.docs[f"users/u/{TOMBSTONE_COLLECTION}/concepts:c0000"]["id"] == "c0000"
+
+
+async def test_clear_graph_deletes_in_pages_without_tombstones(client, db, monkeypatch):
+    monkeypatch.setattr(firestore_module, "FIRESTORE_DELETE_PAGE_SIZE", 100)
+    await client.add_concepts_batch("u", concepts(250))
+    await client.add_relations_batch("u", [{"id": f"r{i:04d}", "source": "a", "target": "b"} for i in range(120)])
+    await client.bulk_write("u", "concept_embeddings", {c["id"]: {"embedding": [0.0]} for c in concepts(250)})
+    await client.bulk_write("u", "concepts", {"c0000": None})
+    await client.add_concepts_batch("v", concepts(3))
+    db.docs["users/u/meta/graph_snapshot"] = {"version": 1}
+    progress: dict[str, list[int]] = {}
+    db.streams = 0
+
+    result = await client.clear_graph("u", progress=lambda name, count: progress.setdefault(name, []).append(count))
+
+    assert result == {"concepts_deleted": 249, "relations_deleted": 120}
+    assert not [path for path in db.docs if path.startswith("users/u/") and "/meta/" not in path]
+    assert "users/u/meta/graph_snapshot" not in db.docs
+    # ページごとに累計件数を通知し、最後の短いページで読み出しをやめる
+    assert progress["concepts"] == [100, 200, 249]
+    assert progress["concept_embeddings"] == [100, 200, 250]
+    assert progress[TOMBSTONE_COLLECTION] == [1]
+    assert db.streams == 3 + 2 + 3 + 1 + 1 + 1
+    assert len(db.collection_ids("v", "concepts")) == 3
@@ -0,0 +1,82 @@
+"""グラフのキャッシュと、バージョン文書による無効化"""
+
+import pytest
+
+from api.db.firestore import FirestoreClient
+from api.db.graph_cache import GraphCache, graph_nbytes
+from tests.fake_firestore import FakeAsyncClient
+
+
+def graph(*ids: str) -> dict[str, list[dict]]:
+    return {"concepts": [{"id": i, "name": f"concept {i}"} for i in ids], "relations": []}
+
+
+def test_version_mismatch_is_a_miss_and_drops_the_entry():
+    cache = GraphCache()
+    cache.put("u", 1, graph("a"))
+
+    assert cache.get("u", 1) == graph("a")
+    assert cache.get("u", 2) is None
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["resident_bytes"] == 0
+
+
+def test_returned_lists_are_copies():
+    cache = GraphCache()
+    cache.put("u", 1, graph("a"))
+    cache.get("u", 1)["concepts"].append({"id": "b"})
+
+    assert cache.get("u", 1) == graph("a")
+
+
+def test_least_recently_used_user_is_evicted():
+    size = graph_nbytes(graph("a"))
+    cache = GraphCache(max_bytes=size * 2)
+    cache.put("u1", 1, graph("a"))
+    cache.put("u2", 1, graph("b"))
+    cache.get("u1", 1)
+    cache.put("u3", 1, graph("c"))
+
+    assert cache.get("u2", 1) is None
+    assert cache.get("u1", 1) is not None and cache.get("u3", 1) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["resident_bytes"] <= size * 2
+
+
+def test_graph_larger_than_the_budget_is_not_cached():
+    cache = GraphCache(max_bytes=graph_nbytes(graph("a")) - 1)
+    cache.put("u", 1, graph("a"))
+
+    assert len(cache) == 0 and cache.stats()["resident_bytes"] == 0
+
+
+@pytest.fixture
+def db():
+    return FakeAsyncClient()
+
+
+@pytest.fixture
+def client(db):
+    client = FirestoreClient("test-project")
+    client._client = db
+    return client
+
+
+async def test_get_graph_reads_collections_only_when_the_version_changes(client, db):
+    await client.add_concepts_batch("u", [{"id": "a", "name": "A"}])
+    first = await client.get_graph("u")
+    streams = db.streams
+
+    assert await client.get_graph("u") == first
+    assert db.streams == streams
+
+    # 他のインスタンスからの書き込みもバージョン文書で検出する
+    other = FirestoreClient("test-project")
+    other._client = db
+    await other.add_concept("u", {"id": "b", "name": "B"})
+    graph_after = await client.get_graph("u")
+
+    assert [c["id"] for c in graph_after["concepts"]] == ["a", "b"]
+    assert db.streams > streams
+    assert "updated_at" not in graph_after["concepts"][0]
@@ -0,0 +1,117 @@
+"""グラフのスナップショットと差分の適用"""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from api.db import graph_snapshot
+from api.db.firestore import SNAPSHOT_CHUNK_COLLECTION, FirestoreClient
+from api.db.graph_snapshot import (
+    UPDATED_AT_FIELD,
+    apply_delta,
+    decode_snapshot,
+    encode_snapshot,
+    strip_internal_fields,
+)
+from tests.fake_firestore import FakeAsyncClient
+
+T0 = datetime(2026, 1, 1, tzinfo=UTC)
+
+
+def at(minutes: int) -> datetime:
+    return T0 + timedelta(minutes=minutes)
+
+
+def test_snapshot_round_trip_across_chunks(monkeypatch):
+    monkeypatch.setattr(graph_snapshot, "SNAPSHOT_CHUNK_BYTES", 64)
+    graph = {
+        "concepts": [{"id": f"c{i}", "name": f"概念 {i}", "definition": f"定義 {i}" * 3} for i in range(20)],
+        "relations": [{"id": "r1", "source": "c1", "target": "c2"}],
+    }
+    chunks = encode_snapshot(graph)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 64 for chunk in chunks)
+    assert decode_snapshot(chunks) == graph
+
+
+def test_strip_internal_fields():
+    document = {"id": "a", UPDATED_AT_FIELD: T0}
+
+    assert strip_internal_fields(document) == {"id": "a"}
+    plain = {"id": "a"}
+    assert strip_internal_fields(plain) is plain
+
+
+def test_apply_delta_overlays_writes_and_tombstones():
+    snapshot = {
+        "concepts": [{"id": "a", "name": "A"}, {"id": "b", "name": "B"}, {"id": "c", "name": "C"}],
+        "relations": [{"id": "r1", "source": "a", "target": "b"}],
+    }
+    changed = {
+        "concepts": [
+            {"id": "b", "name": "B2", UPDATED_AT_FIELD: at(1)},
+            {"id": "d", "name": "D", UPDATED_AT_FIELD: at(1)},
+            # 削除の後に書き直された
+            {"id": "c", "name": "C2", UPDATED_AT_FIELD: at(3)},
+        ],
+    }
+    tombstones = [
+        {"collection": "concepts", "id": "a", "deleted_at": at(2)},
+        {"collection": "concepts", "id": "c", "deleted_at": at(2)},
+        # 書き込みより後の削除
+        {"collection": "concepts", "id": "d", "deleted_at": at(2)},
+        {"collection": "relations", "id": "r1", "deleted_at": at(2)},
+    ]
+
+    merged = apply_delta(snapshot, changed, tombstones)
+
+    assert merged["concepts"] == [{"id": "b", "name": "B2"}, {"id": "c", "name": "C2"}]
+    assert merged["relations"] == []
+    assert snapshot["concepts"][0] == {"id": "a", "name": "A"}
+
+
+@pytest.fixture
+def db():
+    return FakeAsyncClient()
+
+
+def firestore_client(db) -> FirestoreClient:
+    client = FirestoreClient("test-project")
+    client._client = db
+    return client
+
+
+async def test_get_graph_reads_snapshot_and_delta(db):
+    writer = firestore_client(db)
+    await writer.add_concepts_batch("u", [{"id": f"c{i}", "name": f"concept {i}"} for i in range(5)])
+    await writer.add_relations_batch("u", [{"id": "r1", "source": "c0", "target": "c1"}])
+    header = await writer.rebuild_snapshot("u")
+    assert header["concept_count"] == 5 and header["relation_count"] == 1
+
+    await writer.add_concept("u", {"id": "c5", "name": "concept 5"})
+    await writer.delete_concept("u", "c0")
+
+    reader = firestore_client(db)
+    graph = await reader.get_graph("u")
+
+    assert sorted(c["id"] for c in graph["concepts"]) == ["c1", "c2", "c3", "c4", "c5"]
+    assert [r["id"] for r in graph["relations"]] == ["r1"]
+    stats = reader.graph_cache_stats()["snapshot"]
+    assert stats["snapshot_loads"] == 1 and stats["full_loads"] == 0
+
+
+async def test_rebuild_replaces_old_chunks(db):
+    client = firestore_client(db)
+    await client.add_concepts_batch("u", [{"id": "a", "name": "A"}])
+    first = await client.rebuild_snapshot("u")
+    second = await client.rebuild_snapshot("u")
+
+    chunk_ids = db.collection_ids("u", SNAPSHOT_CHUNK_COLLECTION)
+    assert chunk_ids == [f"{second['snapshot_id']}-0000"]
+    assert first["snapshot_id"] != second["snapshot_id"]
+
+    # チャンクが欠けていれば全件読み込みに戻る
+    db.docs.pop(f"users/u/{SNAPSHOT_CHUNK_COLLECTION}/{chunk_ids[0]}")
+    graph = await firestore_client(db).get_graph("u")
+    assert [c["id"] for c in graph["concepts"]] == ["a"]
@@ -0,0 +1,78 @@
+"""内容ハッシュによる差分同期"""
+
+from api.db.hashing import (
+    CONTENT_HASH_FIELD,
+    concept_content_changed,
+    document_hash,
+    plan_sync,
+    summarize_sync,
+    with_content_hash,
+)
+
+
+def stored(*documents: dict) -> dict[str, dict]:
+    return {d["id"]: with_content_hash(d) for d in documents}
+
+
+def test_document_hash_ignores_key_order_and_existing_hash():
+    a = {"id": "a", "name": "BERT", "definition": "model"}
+    b = {"definition": "model", "name": "BERT", "id": "a"}
+    assert document_hash(a) == document_hash(b)
+    assert document_hash(with_content_hash(a)) == document_hash(a)
+    assert document_hash({**a, "name": "GPT"}) != document_hash(a)
+
+
+def test_plan_sync_classifies_documents():
+    existing = stored({"id": "same", "name": "x"}, {"id": "changed", "name": "old"}, {"id": "gone", "name": "z"})
+    diff, writes = plan_sync(existing, [
+        {"id": "same", "name": "x"},
+        {"id": "changed", "name": "new"},
+        {"id": "added", "name": "y"},
+    ])
+
+    assert diff == {"added": ["added"], "updated": ["changed"], "unchanged": ["same"], "deleted": []}
+    assert set(writes) == {"added", "changed"}
+    assert writes["changed"][CONTENT_HASH_FIELD] == document_hash({"id": "changed", "name": "new"})
+
+
+def test_plan_sync_deletes_missing_only_when_requested():
+    existing = stored({"id": "a", "name": "x"}, {"id": "b", "name": "y"})
+    diff, writes = plan_sync(existing, [{"id": "a", "name": "x"}], delete_missing=True)
+
+    assert diff["deleted"] == ["b"]
+    assert writes == {"b": None}
+
+
+def test_plan_sync_treats_documents_without_hash_as_updated():
+    diff, writes = plan_sync({"a": {"id": "a", "name": "x"}}, [{"id": "a", "name": "x"}])
+    assert diff["updated"] == ["a"]
+    assert CONTENT_HASH_FIELD in writes["a"]
+
+
+def test_plan_sync_uses_last_duplicate():
+    diff, writes = plan_sync({}, [{"id": "a", "name": "first"}, {"id": "a", "name": "last"}])
+    assert diff["added"] == ["a"]
+    assert writes["a"]["name"] == "last"
+
+
+def test_summarize_sync_reembeds_only_content_changes():
+    existing = stored(
+        {"id": "renamed", "name": "old", "concept_type": "method"},
+        {"id": "moved", "name": "same", "source_paper": "p1"},
+    )
+    concepts = [
+        {"id": "renamed", "name": "new", "concept_type": "method"},
+        {"id": "moved", "name": "same", "source_paper": "p2"},
+        {"id": "added", "name": "fresh"},
+    ]
+    concept_diff, _ = plan_sync(existing, concepts)
+    relation_diff, _ = plan_sync({}, [])
+    summary = summarize_sync(
+        {**concept_diff, "existing": existing, "failed": {}},
+        {**relation_diff, "existing": {}, "failed": {}},
+        concepts,
+    )
+
+    assert summary["concepts"] == {"added": 1, "updated": 2, "unchanged": 0, "deleted": 0}
+    assert sorted(summary["changed_concept_ids"]) == ["added", "renamed"]
+    assert not concept_content_changed(existing["moved"], concepts[1])
@@ -0,0 +1,77 @@
+"""字句検索のトークン化と BM25 検索"""
+
+import pytest
+
+from api.db.lexical_index import (
+    LexicalIndex,
+    query_terms,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+
+@pytest.fixture
+def index():
+    lexical = LexicalIndex()
+    lexical.sync([
+        {"id": "ml", "name": "機械学習", "definition": "データから学ぶ手法"},
+        {"id": "dl", "name": "深層学習", "name_en": "Deep Learning", "definition": "多層ニューラルネット"},
+        {"id": "bert", "name": "BERT", "definition": "Transformer encoder"},
+        {"id": "b", "name": "B-spline", "definition": "曲線"},
+    ])
+    return lexical
+
+
+def test_tokenize_emits_words_bigrams_and_unigrams():
+    terms = tokenize("BERT 学習")
+    assert "w:bert" in terms and "w:学習" in terms
+    assert "g:学習" in terms and "g:be" in terms
+    assert "u:学" in terms and "u:b" in terms
+
+
+def test_tokenize_normalizes_width_and_case():
+    assert tokenize("ＢＥＲＴ") == tokenize("bert")
+
+
+def test_query_terms_drop_unigrams_covered_by_bigrams():
+    assert query_terms("学習") == {"w:学習", "g:学習"}
+    assert query_terms("学") == {"w:学", "u:学"}
+
+
+@pytest.mark.parametrize(("query", "expected"), [
+    ("学", {"ml", "dl"}),
+    ("学習", {"ml", "dl"}),
+    ("深層", {"dl"}),
+    ("bert", {"bert"}),
+    ("b", {"bert", "b"}),
+    ("習学", set()),
+])
+def test_substring_search(index, query, expected):
+    assert {cid for cid, _ in index.search(query, top_k=10, require_all=True)} == expected
+
+
+def test_name_match_ranks_above_definition_match(index):
+    index.add({"id": "other", "name": "最適化", "definition": "深層学習の学習率"})
+    ranked = [cid for cid, _ in index.search("深層学習", top_k=10)]
+    assert ranked[0] == "dl"
+    assert "other" in ranked
+
+
+def test_allowed_restricts_results(index):
+    assert [cid for cid, _ in index.search("学習", allowed={"dl"})] == ["dl"]
+
+
+def test_sync_reindexes_changes_and_drops_missing(index):
+    index.sync([
+        {"id": "ml", "name": "強化学習", "definition": ""},
+        {"id": "bert", "name": "BERT", "definition": "Transformer encoder"},
+    ])
+    assert sorted(index.ids) == ["bert", "ml"]
+    assert [cid for cid, _ in index.search("強化", require_all=True)] == ["ml"]
+    assert index.search("深層", require_all=True) == []
+
+
+def test_reciprocal_rank_fusion_prefers_items_ranked_in_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0][0] == "b"
+    assert {cid for cid, _ in fused} == {"a", "b", "c", "d"}
@@ -0,0 +1,72 @@
+"""ページトークンとフィールド射影"""
+
+import pytest
+
+from api.db.pagination import (
+    decode_page_token,
+    encode_page_token,
+    paginate_by_id,
+    paginate_ranked,
+    parse_fields,
+    project,
+    without_internal_fields,
+)
+
+
+@pytest.mark.parametrize("cursor", ["c001", "概念/1", "a=b&c", "42"])
+def test_page_token_round_trip(cursor):
+    token = encode_page_token(cursor)
+    assert "=" not in token
+    assert decode_page_token(token) == cursor
+
+
+@pytest.mark.parametrize("token", ["***", "a", "/w=="])
+def test_invalid_page_token(token):
+    with pytest.raises(ValueError):
+        decode_page_token(token)
+
+
+def test_paginate_by_id_walks_all_pages():
+    documents = [{"id": f"c{i:02d}", "name": str(i)} for i in reversed(range(7))]
+    seen, token = [], None
+    while True:
+        page, token = paginate_by_id(documents, 3, token, ["name"])
+        seen.extend(page)
+        if token is None:
+            break
+
+    assert [d["name"] for d in seen] == [str(i) for i in range(7)]
+    assert all(set(d) == {"name"} for d in seen)
+
+
+def test_paginate_by_id_last_full_page_has_no_token():
+    documents = [{"id": f"c{i}"} for i in range(4)]
+    page, token = paginate_by_id(documents, 2)
+    page, token = paginate_by_id(documents, 2, token)
+    assert [d["id"] for d in page] == ["c2", "c3"]
+    assert token is None
+
+
+def test_paginate_ranked_keeps_order_and_rejects_id_tokens():
+    documents = [{"id": cid} for cid in ["z", "a", "m"]]
+    page, token = paginate_ranked(documents, 2)
+    assert [d["id"] for d in page] == ["z", "a"]
+    page, token = paginate_ranked(documents, 2, token)
+    assert [d["id"] for d in page] == ["m"] and token is None
+
+    with pytest.raises(ValueError):
+        paginate_ranked(documents, 2, encode_page_token("c001"))
+
+
+def test_parse_fields_and_nested_projection():
+    fields = parse_fields("summary.title, name,id")
+    assert fields == ["id", "summary.title", "name"]
+    document = {"id": "p", "name": "n", "summary": {"title": "t", "body": "b"}, "extra": 1}
+    assert project(document, fields) == {"id": "p", "summary": {"title": "t"}, "name": "n"}
+    assert parse_fields("") is None
+
+
+def test_internal_fields_are_hidden_unless_requested():
+    documents = [{"id": "a", "name": "n", "content_hash": "h", "updated_at": 1}]
+    assert without_internal_fields(documents, None) == [{"id": "a", "name": "n"}]
+    assert without_internal_fields(documents, ["id", "content_hash"]) == documents
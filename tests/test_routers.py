@@ -0,0 +1,107 @@
+"""ルーターのエンドポイント（インメモリのグラフストアで実行）"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.db import vectors
+from api.db.embedding_backends import LocalHashingEmbeddingBackend
+from api.db.memory_store import MemoryGraphStore
+from api.routers import graph, papers
+
+CONCEPTS = [
+    {"id": f"c{i}", "name": f"concept {i}", "definition": f"definition {i}"} for i in range(5)
+]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryGraphStore()
+    monkeypatch.setattr(graph, "_db_client", store)
+    monkeypatch.setattr(papers, "_db_client", store)
+    return store
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+    app.include_router(graph.router, prefix="/api/graph")
+    app.include_router(papers.router, prefix="/api/papers")
+    return TestClient(app)
+
+
+async def test_concepts_without_paging_keep_list_shape(store, client):
+    await store.add_concepts_batch("u", CONCEPTS)
+    response = client.get("/api/graph/concepts", params={"limit": 3}, headers={"X-User-Id": "u"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [c["id"] for c in body] == ["c0", "c1", "c2"]
+    assert "content_hash" not in body[0]
+    assert body[0]["concept_type"] == "concept"
+
+
+async def test_concept_search_without_paging_returns_list(store, client):
+    await store.add_concepts_batch("u", [*CONCEPTS, {"id": "t", "name": "Transformer", "definition": "d"}])
+    params = {"query": "transformer", "limit": 5}
+    body = client.get("/api/graph/concepts", params=params, headers={"X-User-Id": "u"}).json()
+
+    assert [c["id"] for c in body] == ["t"]
+
+
+async def test_concepts_page_through_with_page_size(store, client):
+    await store.add_concepts_batch("u", CONCEPTS)
+    seen, token = [], None
+    while True:
+        params = {"page_size": 2, "fields": "name"}
+        if token:
+            params["page_token"] = token
+        body = client.get("/api/graph/concepts", params=params, headers={"X-User-Id": "u"}).json()
+        seen.extend(body["concepts"])
+        token = body["next_page_token"]
+        if token is None:
+            break
+
+    assert [c["id"] for c in seen] == [c["id"] for c in CONCEPTS]
+    assert set(seen[0]) == {"id", "name"}
+
+
+async def test_invalid_page_token_is_rejected(client):
+    response = client.get("/api/graph/concepts", params={"page_token": "***"})
+    assert response.status_code == 400
+
+
+async def test_stored_papers_use_the_same_page_size_parameter(store, client):
+    for i in range(3):
+        await store.add_paper("u", {"id": f"p{i}", "summary": {"title": f"title {i}"}})
+
+    body = client.get("/api/papers/stored/list", headers={"X-User-Id": "u"}).json()
+    assert len(body["papers"]) == 3 and body["next_page_token"] is None
+
+    params = {"page_size": 2, "fields": "summary.title"}
+    body = client.get("/api/papers/stored/list", params=params, headers={"X-User-Id": "u"}).json()
+    assert body["papers"] == [
+        {"id": "p0", "summary": {"title": "title 0"}},
+        {"id": "p1", "summary": {"title": "title 1"}},
+    ]
+    assert body["next_page_token"] is not None
+
+
+async def test_background_clear_job_reports_progress(store, client, monkeypatch):
+    monkeypatch.setattr(vectors, "_vector_client", vectors.VectorSearchClient(backend=LocalHashingEmbeddingBackend(dim=16)))
+    await store.add_concepts_batch("u", CONCEPTS)
+    await store.add_relations_batch("u", [{"id": "r0", "source": "c0", "target": "c1"}])
+
+    # TestClient はバックグラウンドタスクの終了後にレスポンスを返す
+    body = client.delete("/api/graph/", params={"background": True}, headers={"X-User-Id": "u"}).json()
+    assert body["concepts_deleted"] == 0 and body["job_id"]
+
+    job = client.get(f"/api/graph/clear-jobs/{body['job_id']}", headers={"X-User-Id": "u"}).json()
+    assert job["status"] == "completed"
+    assert (job["concepts_deleted"], job["relations_deleted"]) == (5, 1)
+    assert job["progress"]["concepts"] == 5
+    assert await store.get_all_concepts("u") == []
+
+    # 他のユーザーのジョブは見えない
+    response = client.get(f"/api/graph/clear-jobs/{body['job_id']}", headers={"X-User-Id": "other"})
+    assert response.status_code == 404
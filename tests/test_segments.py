@@ -0,0 +1,150 @@
+"""SegmentStore の追記・compaction・memmap ビュー"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from api.db import vectors
+from api.db.embedding_backends import LocalHashingEmbeddingBackend
+from api.db.segments import SegmentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(tmp_path, compact_threshold=2)
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_append_and_open(store):
+    store.append("u", ["a", "b"], [unit(1, 0), unit(0, 1)], ["ha", "hb"])
+    view = store.open("u")
+
+    assert sorted(view.ids) == ["a", "b"]
+    assert view.content_hash("a") == "ha"
+    np.testing.assert_allclose(view.vector("b"), unit(0, 1))
+    assert view.search(unit(1, 0.1), top_k=1)[0][0] == "a"
+
+
+def test_later_segments_override_and_delete(store):
+    store.append("u", ["a", "b"], [unit(1, 0), unit(0, 1)], ["h1", "h1"])
+    store.append("u", ["a"], [unit(0, 1)], ["h2"], deleted=["b"])
+    view = store.open("u")
+
+    assert view.ids == ["a"]
+    assert view.content_hash("a") == "h2"
+    np.testing.assert_allclose(view.vector("a"), unit(0, 1))
+    assert view.row_count == 3
+
+
+def test_open_reuses_view_until_manifest_changes(store):
+    store.append("u", ["a"], [unit(1, 0)])
+    view = store.open("u")
+    assert store.open("u") is view
+
+    store.append("u", ["b"], [unit(0, 1)])
+    assert store.open("u") is not view
+    # 既に開いたビューは古い内容のまま読める
+    assert view.ids == ["a"]
+
+
+def test_load_does_not_replace_cached_view(store):
+    store.append("u", ["a"], [unit(1, 0)])
+    view = store.open("u")
+    store.append("u", ["b"], [unit(0, 1)])
+
+    loaded = store.load("u")
+    assert store.cached("u") is view
+    assert store.publish("u", loaded) is loaded
+    # 古いビューを後から公開しても新しいビューは置き換わらない
+    assert store.publish("u", view) is loaded
+
+
+def test_compact_merges_live_rows(store):
+    store.append("u", ["a", "b"], [unit(1, 0), unit(0, 1)], ["ha", "hb"])
+    store.append("u", ["c"], [unit(1, 1)], ["hc"], deleted=["a"])
+    store.append("u", ["b"], [unit(1, 2)], ["hb2"])
+    assert store.needs_compaction("u")
+    before = store.open("u")
+
+    assert store.compact("u") == 2
+    assert not store.needs_compaction("u")
+    segment_files = sorted(p.name for p in store._user_dir("u").glob("seg-*"))
+    assert len(segment_files) == 2
+
+    view = store.open("u")
+    assert sorted(view.ids) == ["b", "c"]
+    assert view.row_count == 2
+    assert view.content_hash("b") == "hb2"
+    np.testing.assert_allclose(view.vector("b"), unit(1, 2), atol=1e-6)
+    # compaction で削除されたファイルも、開いていたビューからは読める
+    np.testing.assert_allclose(before.vector("c"), unit(1, 1), atol=1e-6)
+
+
+def test_compact_does_not_touch_cached_views(tmp_path):
+    writer, reader = SegmentStore(tmp_path), SegmentStore(tmp_path)
+    for i in range(3):
+        writer.append("u", [f"c{i}"], [unit(1, i)])
+    stale = reader.open("u")
+
+    writer.compact("u")
+    assert "u" not in writer._views
+    # 別のワーカーは新しいマニフェストを読んで開き直す
+    view = reader.open("u")
+    assert view is not stale
+    assert sorted(view.ids) == ["c0", "c1", "c2"]
+
+
+def test_dimension_mismatch_raises(store):
+    store.append("u", ["a"], [unit(1, 0)])
+    with pytest.raises(ValueError):
+        store.append("u", ["b"], [unit(1, 0, 0)])
+
+
+def test_clear_removes_segments(store):
+    store.append("u", ["a"], [unit(1, 0)])
+    store.save_ann_index("u", b"index")
+    store.clear("u")
+
+    assert len(store.open("u")) == 0
+    assert store.load_ann_index("u") is None
+
+
+async def test_append_waits_for_compaction_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(vectors, "EMBEDDING_SEGMENT_DIR", str(tmp_path))
+    client = vectors.VectorSearchClient(backend=LocalHashingEmbeddingBackend(dim=16))
+    for name in ("alpha", "beta", "gamma"):
+        await client.update_user_index("u", [{"id": name, "name": name}])
+    store = client._segments
+
+    compacting, release = threading.Event(), threading.Event()
+    write_segment = store._write_segment
+
+    def held_write_segment(*args):
+        # compaction のスレッドがロックを持ったまま止まる
+        if not compacting.is_set():
+            compacting.set()
+            release.wait(5)
+        return write_segment(*args)
+
+    monkeypatch.setattr(store, "_write_segment", held_write_segment)
+    loop = asyncio.get_running_loop()
+    compaction = asyncio.create_task(client._compact_segments("u"))
+    await loop.run_in_executor(None, compacting.wait, 5)
+
+    update = asyncio.create_task(client.update_user_index("u", [{"id": "delta", "name": "delta"}]))
+    # append がロックを待っている間もイベントループは止まらない
+    await asyncio.sleep(0.2)
+    assert not update.done()
+
+    release.set()
+    await compaction
+    index = await update
+    assert sorted(index.ids) == ["alpha", "beta", "delta", "gamma"]
+    assert client._local_index("u") is index
+    assert len(store._read_manifest(store._user_dir("u"))["segments"]) == 2
@@ -0,0 +1,91 @@
+"""SQLiteGraphStore の WAL モード・差分同期・ページング"""
+
+import sqlite3
+
+import pytest
+
+from api.db.hashing import CONTENT_HASH_FIELD
+from api.db.sqlite_store import SQLiteGraphStore
+
+CONCEPTS = [
+    {"id": "c1", "name": "Transformer", "definition": "attention model"},
+    {"id": "c2", "name": "BERT", "definition": "encoder"},
+    {"id": "c3", "name": "GPT", "definition": "decoder"},
+]
+RELATIONS = [
+    {"id": "r1", "source": "BERT", "target": "Transformer", "relation_type": "uses"},
+    {"id": "r2", "source": "GPT", "target": "Transformer", "relation_type": "uses"},
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "graph.db")
+
+
+@pytest.fixture
+def store(db_path):
+    return SQLiteGraphStore(db_path)
+
+
+async def test_uses_wal_journal(store, db_path):
+    await store.sync_graph("u", CONCEPTS, RELATIONS)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+async def test_sync_writes_only_changes(store):
+    first = await store.sync_graph("u", CONCEPTS, RELATIONS)
+    assert first["concepts"]["added"] == 3
+    assert first["relations"]["added"] == 2
+
+    edited = [{**CONCEPTS[0], "definition": "self-attention model"}, *CONCEPTS[1:]]
+    second = await store.sync_graph("u", edited, RELATIONS)
+    assert second["concepts"] == {"added": 0, "updated": 1, "unchanged": 2, "deleted": 0}
+    assert second["relations"]["unchanged"] == 2
+    assert second["changed_concept_ids"] == ["c1"]
+
+    third = await store.sync_graph("u", edited[:2], RELATIONS[:1], delete_missing=True)
+    assert third["deleted_concept_ids"] == ["c3"]
+    assert third["relations"]["deleted"] == 1
+    assert {c["id"] for c in await store.get_all_concepts("u")} == {"c1", "c2"}
+
+
+async def test_upsert_overwrites_and_keeps_users_apart(store):
+    await store.add_concepts_batch("u", CONCEPTS)
+    await store.add_concepts_batch("u", [{**CONCEPTS[1], "definition": "bidirectional encoder"}])
+    await store.add_concepts_batch("other", CONCEPTS[:1])
+
+    concepts = await store.get_all_concepts("u")
+    assert [c["id"] for c in concepts] == ["c1", "c2", "c3"]
+    bert = await store.get_concept("u", "c2")
+    assert bert["definition"] == "bidirectional encoder"
+    assert CONTENT_HASH_FIELD in bert
+    assert len(await store.get_all_concepts("other")) == 1
+
+
+async def test_list_page_and_embeddings(store):
+    await store.add_concepts_batch("u", CONCEPTS)
+    page, token = await store.list_page("u", "concepts", 2, fields=["name"])
+    assert [c["name"] for c in page] == ["Transformer", "BERT"]
+    page, token = await store.list_page("u", "concepts", 2, token)
+    assert [c["id"] for c in page] == ["c3"] and token is None
+
+    record = {"hash": "h", "model": "m", "dtype": "float32", "scale": None, "values": b"\x00" * 8}
+    await store.set_embeddings_batch("u", {"c1": record, "c2": record})
+    assert set(await store.get_embeddings("u", ["c1", "c3"])) == {"c1"}
+
+
+async def test_clear_graph_keeps_papers_and_bumps_version(store, db_path):
+    await store.sync_graph("u", CONCEPTS, RELATIONS)
+    await store.add_paper("u", {"id": "p1", "summary": {"title": "Attention"}})
+    version = await store.get_graph_version("u")
+    progress = {}
+
+    result = await store.clear_graph("u", progress=progress.__setitem__)
+
+    assert result == {"concepts_deleted": 3, "relations_deleted": 2}
+    assert progress["concepts"] == 3
+    assert await store.get_all_concepts("u") == []
+    assert [p["id"] for p in await store.get_all_papers("u")] == ["p1"]
+    assert await SQLiteGraphStore(db_path).get_graph_version("u") > version
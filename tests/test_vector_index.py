@@ -0,0 +1,122 @@
+"""VectorIndex の top-k 検索と量子化時の再スコアリング"""
+
+import numpy as np
+import pytest
+
+from api.db.vector_index import (
+    VectorIndex,
+    dequantize_rows,
+    normalize_rows,
+    quantize_rows,
+    top_k_indices,
+)
+from api.db.vectors import decode_embedding, encode_embedding
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, top_k: int) -> list[int]:
+    scores = normalize_rows(vectors) @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores)[:top_k])
+
+
+def test_top_k_indices_orders_by_score():
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3], dtype=np.float32)
+    assert list(top_k_indices(scores, 3)) == [1, 3, 2]
+    assert list(top_k_indices(scores, 10)) == [1, 3, 2, 4, 0]
+
+
+def test_search_matches_exact_top_k(clustered_vectors):
+    vectors = clustered_vectors(500)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    index = VectorIndex()
+    index.add(ids, vectors)
+
+    query = vectors[7]
+    results = index.search(query, top_k=10)
+    assert [cid for cid, _ in results] == [ids[i] for i in exact_top_k(vectors, query, 10)]
+    assert results[0] == ("c7", pytest.approx(1.0, abs=1e-5))
+    assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
+
+
+def test_search_threshold_and_exclude():
+    index = VectorIndex()
+    index.add(["a", "b", "c"], [[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]])
+
+    assert [cid for cid, _ in index.search([1.0, 0.0], top_k=3, threshold=0.5)] == ["a", "b"]
+    assert [cid for cid, _ in index.search([1.0, 0.0], top_k=3, exclude=["a"])] == ["b", "c"]
+
+
+def test_remove_keeps_remaining_rows_searchable():
+    index = VectorIndex()
+    index.add(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]])
+    assert index.remove(["a", "missing"]) == 1
+
+    assert len(index) == 2 and "a" not in index
+    assert index.search([0.0, 1.0], top_k=1)[0][0] == "b"
+    assert index.search([1.0, 0.2], top_k=1)[0][0] == "c"
+
+
+def test_add_overwrites_existing_id():
+    index = VectorIndex()
+    index.add(["a", "b"], [[1.0, 0.0], [0.0, 1.0]], ["h1", "h2"])
+    index.add(["a"], [[0.0, 1.0]], ["h3"])
+
+    assert len(index) == 2
+    assert index.content_hash("a") == "h3"
+    np.testing.assert_allclose(index.vector("a"), [0.0, 1.0], atol=1e-6)
+
+
+def test_dimension_mismatch_raises():
+    index = VectorIndex()
+    index.add(["a"], [[1.0, 0.0]])
+    with pytest.raises(ValueError):
+        index.add(["b"], [[1.0, 0.0, 0.0]])
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_rescoring_returns_exact_scores(clustered_vectors, storage):
+    vectors = clustered_vectors(1000, dim=64)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    full = dict(zip(ids, vectors))
+    index = VectorIndex(storage=storage)
+    index.add(ids, vectors)
+    assert index.quantized
+    assert index.nbytes < len(vectors) * 64 * 4
+
+    query = vectors[3] + 0.1
+    expected = exact_top_k(vectors, query, 5)
+    results = index.search(query, top_k=5, rescore=lambda cids: [full[cid] for cid in cids])
+
+    assert [cid for cid, _ in results] == [ids[i] for i in expected]
+    exact = normalize_rows(vectors[expected]) @ (query / np.linalg.norm(query))
+    np.testing.assert_allclose([score for _, score in results], exact, rtol=1e-5)
+
+
+def test_quantized_search_without_rescore_is_approximate(clustered_vectors):
+    vectors = clustered_vectors(200, dim=32)
+    index = VectorIndex(storage="int8")
+    index.add([f"c{i}" for i in range(len(vectors))], vectors)
+
+    cid, score = index.search(vectors[0], top_k=1)[0]
+    assert cid == "c0"
+    assert score == pytest.approx(1.0, abs=0.02)
+
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        VectorIndex(storage="int4")
+
+
+@pytest.mark.parametrize(("storage", "tolerance"), [("float32", 0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_quantize_round_trip(clustered_vectors, storage, tolerance):
+    rows = normalize_rows(clustered_vectors(50, dim=16))
+    codes, scales = quantize_rows(rows, storage)
+    assert codes.dtype.name == storage
+    np.testing.assert_allclose(dequantize_rows(codes, scales), rows, atol=tolerance)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_stored_embedding_round_trip(dtype):
+    vector = np.linspace(-1.0, 1.0, 32, dtype=np.float32)
+    record = encode_embedding(vector, dtype)
+    assert len(record["values"]) == 32 * np.dtype(dtype).itemsize
+    np.testing.assert_allclose(decode_embedding(record), vector, atol=1e-2)